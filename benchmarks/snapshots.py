@@ -0,0 +1,49 @@
+"""Compare the cost of reconstructing a long-lived unit with and without snapshots.
+
+Run with: python -m benchmarks.snapshots [--events 500] [--reads 200]
+"""
+
+import argparse
+import os
+import time
+
+os.environ.setdefault("PERSISTENCE_MODULE", "eventsourcing.sqlite")
+os.environ.setdefault("SQLITE_DBNAME", ":memory:")
+
+from src.domain.models import Unit  # noqa: E402
+from src.domain.repositories import UnitRepository  # noqa: E402
+
+
+def time_reads(interval: int, events: int, reads: int) -> float:
+    repo = UnitRepository(
+        env={"SNAPSHOTTING_INTERVAL": str(interval), "AGGREGATE_CACHE_MAXSIZE": ""}
+    )
+    try:
+        unit = Unit.create(address="1 Benchmark Way")
+        repo.create(unit)
+        for _ in range(events // 2):
+            unit.mark_as_leased()
+            unit.mark_as_available()
+            repo.save(unit)
+
+        started = time.perf_counter()
+        for _ in range(reads):
+            repo.get(unit.id)
+        return (time.perf_counter() - started) / reads
+    finally:
+        repo.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=500)
+    parser.add_argument("--reads", type=int, default=200)
+    args = parser.parse_args()
+
+    for label, interval in [("no snapshots", 0), ("every 50 events", 50)]:
+        seconds = time_reads(interval, args.events, args.reads)
+        print(f"{label:>16}: {seconds * 1000:.3f} ms per get ({args.events} events)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,418 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from base64 import b64encode
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, Iterator, List, Optional, Type
+from uuid import UUID
+
+from eventsourcing.domain import Aggregate, DomainEvent
+from eventsourcing.utils import TopicError, strtobool
+
+from .domain.bulk import Row, import_rows
+from .domain.migration import copy_events
+from .domain.models import Unit, Tenant, Lease
+from .domain.repositories import (
+    EventSourcingApplication,
+    RentalApplication,
+    UnitRepository,
+    TenantRepository,
+    LeaseRepository,
+)
+
+REPOSITORIES: Dict[str, Type[EventSourcingApplication]] = {
+    "unit": UnitRepository,
+    "tenant": TenantRepository,
+    "lease": LeaseRepository,
+}
+
+
+def backfill_snapshots(args: argparse.Namespace) -> None:
+    """Snapshot existing aggregates so they no longer replay their full history"""
+    for name in args.repositories:
+        repo = REPOSITORIES[name]()
+        try:
+            taken = repo.backfill_snapshots(min_events=args.min_events)
+        finally:
+            repo.close()
+        print(f"{name}: took {taken} snapshots")
+
+
+# Repositories with index logs to back-fill
+INDEXED = ["tenant", "lease"]
+
+
+def reindex(args: argparse.Namespace) -> None:
+    """Index aggregates saved before the repositories' indexes were introduced"""
+    if strtobool(os.environ.get("SINGLE_APPLICATION") or "no"):
+        # The index events are recorded in the application's event store
+        rental_app = RentalApplication()
+        try:
+            if set(args.repositories) == set(INDEXED):
+                recorded = rental_app.reindex()
+                print(f"{rental_app.name}: recorded {recorded} index events")
+            else:
+                for name in args.repositories:
+                    recorded = getattr(rental_app, f"{name}s").reindex()
+                    print(f"{name}: recorded {recorded} index events")
+        finally:
+            rental_app.close()
+        return
+    for name in args.repositories:
+        repo = REPOSITORIES[name]()
+        try:
+            recorded = repo.reindex()
+        finally:
+            repo.close()
+        print(f"{name}: recorded {recorded} index events")
+
+
+def _list(value: Any) -> List[str]:
+    # CSV cells hold lists separated by semicolons
+    if isinstance(value, str):
+        return [item.strip() for item in value.split(";") if item.strip()]
+    return list(value or [])
+
+
+def _date(value: Any) -> date:
+    return value if isinstance(value, date) else date.fromisoformat(value)
+
+
+def build_unit(row: Row) -> Unit:
+    return Unit.create(
+        address=row["address"],
+        amenities=_list(row.get("amenities")),
+        built_in=int(row["built_in"]) if row.get("built_in") else None,
+    )
+
+
+def build_tenant(row: Row) -> Tenant:
+    return Tenant.create(
+        identification_number=row["identification_number"],
+        first_name=row["first_name"],
+        last_name=row["last_name"],
+        email=row["email"],
+        phone_number=row["phone_number"],
+        dob=_date(row["dob"]),
+    )
+
+
+def build_lease(row: Row) -> Lease:
+    return Lease.create(
+        unit_id=UUID(str(row["unit_id"])),
+        tenant_ids=[UUID(tenant_id) for tenant_id in _list(row["tenant_ids"])],
+        start_date=_date(row["start_date"]),
+        end_date=_date(row["end_date"]),
+    )
+
+
+BUILDERS: Dict[str, Callable[[Row], Aggregate]] = {
+    "unit": build_unit,
+    "tenant": build_tenant,
+    "lease": build_lease,
+}
+
+
+def file_format(path: str, format: Optional[str] = None) -> str:
+    """Get the format of a file, by default chosen by extension"""
+    return format or ("csv" if path.endswith(".csv") else "ndjson")
+
+
+def read_rows(path: str, format: Optional[str] = None) -> Iterator[Any]:
+    """Stream the rows of a CSV file, or the lines of an NDJSON file. Lines are
+    parsed when imported, so a malformed line is reported against its row."""
+    with open(path, newline="") as f:
+        if file_format(path, format) == "csv":
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield line
+
+
+def import_file(args: argparse.Namespace) -> None:
+    """Import aggregates from a file in batched transactions"""
+    repo = REPOSITORIES[args.repository]()
+    try:
+        report = import_rows(
+            repo,
+            read_rows(args.file, args.format),
+            BUILDERS[args.repository],
+            batch_size=args.batch_size,
+            parse=json.loads
+            if file_format(args.file, args.format) == "ndjson"
+            else None,
+        )
+    finally:
+        repo.close()
+    print(
+        f"{args.repository}: created {report.created} in {report.seconds:.2f}s "
+        f"({report.rate:.0f}/s), {len(report.errors)} errors"
+    )
+    for number, error in report.errors:
+        print(f"row {number}: {error}", file=sys.stderr)
+
+
+def _env(pairs: List[str]) -> Dict[str, str]:
+    env = {}
+    for pair in pairs:
+        key, sep, value = pair.partition("=")
+        if not sep:
+            raise SystemExit(f"expected KEY=VALUE, got {pair!r}")
+        env[key] = value
+    return env
+
+
+def migrate_events(args: argparse.Namespace) -> None:
+    """Copy the events of a repository to a new event store, re-encoding them"""
+    source = REPOSITORIES[args.repository]()
+    target = REPOSITORIES[args.repository](env=_env(args.target))
+    try:
+        if args.start == 1 and target.recorder.max_notification_id():
+            raise SystemExit(
+                f"{args.repository}: target already has events, use --start to resume"
+            )
+        copied = copy_events(
+            source,
+            target,
+            batch_size=args.batch_size,
+            start=args.start,
+            progress=lambda position, count: print(
+                f"{args.repository}: copied {count} events up to {position}",
+                file=sys.stderr,
+            ),
+        )
+    finally:
+        source.close()
+        target.close()
+    print(f"{args.repository}: copied {copied} events")
+
+
+ENCODINGS: Dict[str, Dict[str, str]] = {
+    "json": {},
+    "orjson": {"TRANSCODER": "orjson"},
+    "compact": {"EVENT_ENCODING": "compact"},
+    "compact-orjson": {"EVENT_ENCODING": "compact", "TRANSCODER": "orjson"},
+    "compact-orjson-zlib": {
+        "EVENT_ENCODING": "compact",
+        "TRANSCODER": "orjson",
+        "COMPRESSION_THRESHOLD": "256",
+    },
+}
+
+
+def sample_events(count: int) -> List[DomainEvent]:
+    """Generate the events of count units, tenants and leases"""
+    events: List[DomainEvent] = []
+    for i in range(count):
+        unit = Unit.create(address=f"{i} Main St", amenities=["parking", "laundry"])
+        tenant = Tenant.create(
+            identification_number=f"{i:09d}",
+            first_name="Jane",
+            last_name="Smith",
+            email=f"jane.smith.{i}@example.com",
+            phone_number="555-987-6543",
+            dob=date(1985, 5, 15),
+        )
+        tenant.approve()
+        lease = Lease.create(
+            unit_id=unit.id,
+            tenant_ids=[tenant.id],
+            start_date=date(2025, 1, 1),
+            end_date=date(2025, 1, 1) + timedelta(days=365),
+        )
+        lease.sign_by_tenant()
+        unit.mark_as_leased()
+        for aggregate in (unit, tenant, lease):
+            events.extend(aggregate.collect_events())
+    return events
+
+
+def _benchmark_mappers(
+    configs: Dict[str, Dict[str, str]],
+    events: List[DomainEvent],
+    repository_class: Type[EventSourcingApplication] = UnitRepository,
+) -> None:
+    """Print the size of the events stored by the mapper of each environment,
+    with the time taken to encode and decode them"""
+    print(f"{len(events)} events")
+    print(f"{'mapper':<20} {'bytes/event':>12} {'encode us':>10} {'decode us':>10}")
+    for name, env in configs.items():
+        try:
+            repo = repository_class(env=env)
+        except (ImportError, TopicError) as e:
+            print(f"{name:<20} skipped: {e}")
+            continue
+        mapper = repo.mapper
+        started = time.perf_counter()
+        stored = [mapper.to_stored_event(event) for event in events]
+        encoded = time.perf_counter()
+        for stored_event in stored:
+            mapper.to_domain_event(stored_event)
+        decoded = time.perf_counter()
+        repo.close()
+        size = sum(len(stored_event.state) for stored_event in stored)
+        print(
+            f"{name:<20} {size / len(events):>12.1f} "
+            f"{(encoded - started) / len(events) * 1e6:>10.2f} "
+            f"{(decoded - encoded) / len(events) * 1e6:>10.2f}"
+        )
+
+
+def benchmark_encoding(args: argparse.Namespace) -> None:
+    """Compare the size and encoding latency of stored events"""
+    _benchmark_mappers(ENCODINGS, sample_events(args.aggregates))
+
+
+def benchmark_encryption(args: argparse.Namespace) -> None:
+    """Compare the latency of encrypting tenant events, without a cipher, with
+    the whole state encrypted and with only personal data encrypted"""
+    cipher = {
+        "CIPHER_KEY": b64encode(os.urandom(32)).decode(),
+        "CIPHER_TOPIC": args.cipher_topic,
+    }
+    configs = {
+        "none": {},
+        "state": cipher,
+        "fields": {**cipher, "CIPHER_MODE": "fields"},
+        "fields-compact": {
+            **cipher,
+            "CIPHER_MODE": "fields",
+            "EVENT_ENCODING": "compact",
+            "TRANSCODER": "orjson",
+        },
+    }
+    events = [
+        event
+        for event in sample_events(args.aggregates)
+        if isinstance(event, Tenant.Event)
+    ]
+    _benchmark_mappers(configs, events, TenantRepository)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m src.cli")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    backfill = commands.add_parser(
+        "backfill-snapshots", help="Take snapshots of existing aggregates"
+    )
+    backfill.add_argument(
+        "repositories",
+        nargs="*",
+        default=list(REPOSITORIES),
+        help=f"Repositories to back-fill, any of {', '.join(REPOSITORIES)} (default: all)",
+    )
+    backfill.add_argument(
+        "--min-events",
+        type=int,
+        default=2,
+        help="Only snapshot aggregates with at least this many new events",
+    )
+    backfill.set_defaults(func=backfill_snapshots)
+
+    indexer = commands.add_parser(
+        "reindex", help="Index existing tenants and leases, before cutover"
+    )
+    indexer.add_argument(
+        "repositories",
+        nargs="*",
+        default=INDEXED,
+        help=f"Repositories to index, any of {', '.join(INDEXED)} (default: all)",
+    )
+    indexer.set_defaults(func=reindex)
+
+    importer = commands.add_parser(
+        "import",
+        help="Import units, tenants or leases from a CSV or NDJSON file",
+        description="Lists in CSV cells are separated by semicolons. Lease rows "
+        "aren't checked against existing units and tenants.",
+    )
+    importer.add_argument("repository", choices=list(REPOSITORIES))
+    importer.add_argument("file")
+    importer.add_argument(
+        "--format",
+        choices=["csv", "ndjson"],
+        help="File format (default: csv for .csv files, otherwise ndjson)",
+    )
+    importer.add_argument(
+        "--batch-size",
+        type=int,
+        default=1000,
+        help="Number of rows saved per transaction",
+    )
+    importer.set_defaults(func=import_file)
+
+    migrate = commands.add_parser(
+        "migrate-events",
+        help="Copy the events of a repository to a new event store",
+        description="The target event store is configured by overriding the "
+        "environment, e.g. --target POSTGRES_SCHEMA=v2 --target "
+        "EVENT_ENCODING=compact. Snapshots aren't copied, back-fill them in the "
+        "target before switching over.",
+    )
+    migrate.add_argument("repository", choices=list(REPOSITORIES))
+    migrate.add_argument(
+        "--target",
+        action="append",
+        default=[],
+        metavar="KEY=VALUE",
+        help="Environment variable of the target event store",
+    )
+    migrate.add_argument(
+        "--batch-size",
+        type=int,
+        default=1000,
+        help="Number of events copied per transaction",
+    )
+    migrate.add_argument(
+        "--start",
+        type=int,
+        default=1,
+        help="Notification to start copying from, to resume an interrupted copy",
+    )
+    migrate.set_defaults(func=migrate_events)
+
+    benchmark = commands.add_parser(
+        "benchmark-encoding",
+        help="Compare the size and latency of the event encodings",
+    )
+    benchmark.add_argument(
+        "--aggregates",
+        type=int,
+        default=1000,
+        help="Number of units, tenants and leases to generate events for",
+    )
+    benchmark.set_defaults(func=benchmark_encoding)
+
+    benchmark = commands.add_parser(
+        "benchmark-encryption",
+        help="Compare the latency of encrypting tenant events",
+        description="The default AES cipher requires pycryptodome.",
+    )
+    benchmark.add_argument(
+        "--aggregates",
+        type=int,
+        default=1000,
+        help="Number of tenants to generate events for",
+    )
+    benchmark.add_argument(
+        "--cipher-topic",
+        default="eventsourcing.cipher:AESCipher",
+        help="Topic of the cipher class",
+    )
+    benchmark.set_defaults(func=benchmark_encryption)
+
+    args = parser.parse_args(argv)
+    known = INDEXED if args.command == "reindex" else REPOSITORIES
+    unknown = set(getattr(args, "repositories", [])) - set(known)
+    if unknown:
+        parser.error(f"unknown repositories: {', '.join(sorted(unknown))}")
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
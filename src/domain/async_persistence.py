@@ -0,0 +1,196 @@
+import asyncio
+from concurrent.futures import Executor
+from functools import partial
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence
+from uuid import UUID
+
+import psycopg
+from eventsourcing.persistence import (
+    AggregateRecorder,
+    OperationalError,
+    PersistenceError,
+    StoredEvent,
+)
+from eventsourcing.postgres import PostgresAggregateRecorder, PostgresDatastore
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool
+
+from .persistence import (
+    POSTGRES_SELECT_EVENTS_MANY,
+    POSTGRES_SELECT_LAST_EVENTS_MANY,
+    postgres_stored_event,
+    select_events_many,
+    select_last_events_many,
+)
+
+
+class AsyncConnectionPoolWithPassword(AsyncConnectionPool):
+    """Async connection pool which gets the password for each new connection,
+    like the datastore's pool, so rotated passwords are used"""
+
+    def __init__(
+        self,
+        *args: Any,
+        get_password_func: Optional[Callable[[], str]] = None,
+        **kwargs: Any,
+    ):
+        self.get_password_func = get_password_func
+        super().__init__(*args, **kwargs)
+
+    async def _connect(self, timeout: Optional[float] = None) -> Any:
+        if self.get_password_func:
+            self.kwargs["password"] = self.get_password_func()
+        return await super()._connect(timeout=timeout)
+
+
+class AsyncEventReader:
+    """Selects the stored events of many originators for async repositories.
+    The blocking select helpers run in a thread pool, which is how events are
+    read from the SQLite and POPO recorders."""
+
+    def __init__(self, executor: Optional[Executor] = None):
+        # The event loop's default executor is used if none is given
+        self.executor = executor
+
+    async def select_events_many(
+        self,
+        recorder: AggregateRecorder,
+        originator_ids: Sequence[UUID],
+        gt: Optional[Mapping[UUID, int]] = None,
+    ) -> Dict[UUID, List[StoredEvent]]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor,
+            partial(select_events_many, recorder, list(originator_ids), gt=gt),
+        )
+
+    async def select_last_events_many(
+        self, recorder: AggregateRecorder, originator_ids: Sequence[UUID]
+    ) -> Dict[UUID, StoredEvent]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor,
+            partial(select_last_events_many, recorder, list(originator_ids)),
+        )
+
+    async def close(self) -> None:
+        pass
+
+
+class PostgresAsyncEventReader(AsyncEventReader):
+    """Selects the stored events of Postgres recorders with psycopg's async
+    API, so reads don't hold a thread of the pool while waiting for the
+    database. Connections come from an async pool with the datastore's
+    connection settings and size, opened when first read from in the running
+    event loop."""
+
+    def __init__(
+        self, datastore: PostgresDatastore, executor: Optional[Executor] = None
+    ):
+        super().__init__(executor)
+        self.datastore = datastore
+        self.pool: Optional[AsyncConnectionPoolWithPassword] = None
+        self.pool_lock = asyncio.Lock()
+
+    async def select_events_many(
+        self,
+        recorder: AggregateRecorder,
+        originator_ids: Sequence[UUID],
+        gt: Optional[Mapping[UUID, int]] = None,
+    ) -> Dict[UUID, List[StoredEvent]]:
+        if not self._reads(recorder):
+            return await super().select_events_many(recorder, originator_ids, gt)
+        events: Dict[UUID, List[StoredEvent]] = {
+            originator_id: [] for originator_id in originator_ids
+        }
+        if not events:
+            return events
+        gt = {
+            originator_id: (gt or {}).get(originator_id, 0) for originator_id in events
+        }
+        rows = await self.fetch(
+            POSTGRES_SELECT_EVENTS_MANY.format(table=recorder.events_table_name),
+            [list(gt), list(gt.values())],
+        )
+        for row in rows:
+            stored_event = postgres_stored_event(row)
+            events[stored_event.originator_id].append(stored_event)
+        return events
+
+    async def select_last_events_many(
+        self, recorder: AggregateRecorder, originator_ids: Sequence[UUID]
+    ) -> Dict[UUID, StoredEvent]:
+        if not self._reads(recorder):
+            return await super().select_last_events_many(recorder, originator_ids)
+        if not originator_ids:
+            return {}
+        rows = await self.fetch(
+            POSTGRES_SELECT_LAST_EVENTS_MANY.format(table=recorder.events_table_name),
+            [list(originator_ids)],
+        )
+        stored_events = [postgres_stored_event(row) for row in rows]
+        return {
+            stored_event.originator_id: stored_event for stored_event in stored_events
+        }
+
+    def _reads(self, recorder: AggregateRecorder) -> bool:
+        return (
+            isinstance(recorder, PostgresAggregateRecorder)
+            and recorder.datastore is self.datastore
+        )
+
+    async def fetch(self, statement: str, params: List[Any]) -> List[Dict[str, Any]]:
+        """Execute a query, getting its rows as dicts"""
+        pool = await self._open_pool()
+        try:
+            async with pool.connection() as conn, conn.cursor() as curs:
+                await curs.execute(statement, params, prepare=True)
+                return await curs.fetchall()
+        except psycopg.OperationalError as e:
+            raise OperationalError(e) from e
+        except psycopg.Error as e:
+            raise PersistenceError(e) from e
+
+    async def _open_pool(self) -> AsyncConnectionPoolWithPassword:
+        async with self.pool_lock:
+            if self.pool is None:
+                pool = self.datastore.pool
+                self.pool = AsyncConnectionPoolWithPassword(
+                    kwargs={**pool.kwargs, "row_factory": dict_row},
+                    get_password_func=getattr(pool, "get_password_func", None),
+                    min_size=pool.min_size,
+                    max_size=pool.max_size,
+                    timeout=pool.timeout,
+                    max_waiting=pool.max_waiting,
+                    max_lifetime=pool.max_lifetime,
+                    max_idle=pool.max_idle,
+                    configure=self._configure,
+                    check=AsyncConnectionPool.check_connection
+                    if self.datastore.pre_ping
+                    else None,
+                    open=False,
+                )
+                await self.pool.open()
+            return self.pool
+
+    async def _configure(self, conn: psycopg.AsyncConnection) -> None:
+        await conn.set_autocommit(True)
+        if self.datastore.idle_in_transaction_session_timeout:
+            await conn.execute(
+                "SET idle_in_transaction_session_timeout = "
+                f"'{self.datastore.idle_in_transaction_session_timeout}s'"
+            )
+
+    async def close(self) -> None:
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+
+
+def construct_async_reader(
+    recorder: AggregateRecorder, executor: Optional[Executor] = None
+) -> AsyncEventReader:
+    """Construct the reader of a recorder's events for async repositories"""
+    if isinstance(recorder, PostgresAggregateRecorder):
+        return PostgresAsyncEventReader(recorder.datastore, executor)
+    return AsyncEventReader(executor)
@@ -0,0 +1,185 @@
+import asyncio
+from concurrent.futures import Executor
+from datetime import date
+from functools import partial
+from itertools import islice
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Generic,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+    Union,
+)
+from uuid import UUID
+
+from eventsourcing.application import EventSourcedLog
+from eventsourcing.domain import Aggregate, DomainEvent
+
+from .async_persistence import AsyncEventReader
+from .models import Unit, Tenant, Lease
+from .repositories import (
+    EventSourcingApplication,
+    UnitRepository,
+    TenantRepository,
+    LeaseRepository,
+    as_uuid,
+)
+
+T = TypeVar("T")
+TRepository = TypeVar("TRepository", bound=EventSourcingApplication)
+
+
+class AsyncRepository(Generic[TRepository]):
+    """Async interface to a repository. Aggregates and indexes are read with
+    the reader, which uses psycopg's async API for Postgres event stores. The
+    other, blocking, repository methods run in a thread pool, so awaiting them
+    leaves the event loop free for other requests"""
+
+    def __init__(
+        self,
+        repo: TRepository,
+        executor: Optional[Executor] = None,
+        reader: Optional[AsyncEventReader] = None,
+    ):
+        self.repo = repo
+        # The event loop's default executor is used if none is given
+        self.executor = executor
+        self.reader = reader or AsyncEventReader(executor)
+
+    async def run(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Run a blocking function in the thread pool"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(func, *args, **kwargs))
+
+    async def get(self, aggregate_id: Union[str, UUID]) -> Optional[Aggregate]:
+        return (await self.get_many([aggregate_id]))[0]
+
+    async def get_many(
+        self, aggregate_ids: Iterable[Union[str, UUID]]
+    ) -> List[Optional[Aggregate]]:
+        """Get aggregates for many IDs like the repository's get_many, awaiting
+        the selects of their snapshots and events"""
+        repo = self.repo
+        ids = [as_uuid(aggregate_id) for aggregate_id in aggregate_ids]
+        aggregates: Dict[UUID, Optional[Aggregate]] = {}
+        for i in range(0, len(ids), repo.get_many_chunk_size):
+            chunk = list(dict.fromkeys(ids[i : i + repo.get_many_chunk_size]))
+            cached = repo._get_cached(chunk)
+            uncached = [
+                aggregate_id for aggregate_id in chunk if aggregate_id not in cached
+            ]
+            stored_snapshots = (
+                await self.reader.select_last_events_many(
+                    repo.snapshots.recorder, uncached
+                )
+                if repo.snapshots
+                else {}
+            )
+            selected, gt = repo._events_to_select(chunk, cached, stored_snapshots)
+            stored_events = await self.reader.select_events_many(
+                repo.recorder, selected, gt=gt
+            )
+            aggregates.update(
+                repo._reconstruct_many(chunk, cached, stored_snapshots, stored_events)
+            )
+        return [aggregates[aggregate_id] for aggregate_id in ids]
+
+    async def get_all(self) -> List[Aggregate]:
+        return await self.run(self.repo.get_all)
+
+    async def iter_all(
+        self, chunk_size: Optional[int] = None
+    ) -> AsyncIterator[Aggregate]:
+        """Iterate over all aggregates, reconstructing a chunk at a time in the
+        thread pool"""
+        chunk_size = chunk_size or self.repo.get_many_chunk_size
+        aggregates = self.repo.iter_all(chunk_size)
+        while chunk := await self.run(lambda: list(islice(aggregates, chunk_size))):
+            for aggregate in chunk:
+                yield aggregate
+
+    async def create(self, aggregate: Aggregate) -> None:
+        await self.run(self.repo.create, aggregate)
+
+    async def create_many(self, aggregates: Iterable[Aggregate]) -> None:
+        await self.run(self.repo.create_many, list(aggregates))
+
+    async def save(self, aggregate: Aggregate, *args: Any, **kwargs: Any) -> None:
+        await self.run(self.repo.save, aggregate, *args, **kwargs)
+
+
+class AsyncUnitRepository(AsyncRepository[UnitRepository]):
+    """Async interface to UnitRepository"""
+
+    async def get_units(self, **kwargs: Any) -> List[Tuple[int, Unit]]:
+        return await self.run(lambda: list(self.repo.get_units(**kwargs)))
+
+    async def get_available_units(self) -> List[Unit]:
+        return await self.run(self.repo.get_available_units)
+
+
+class AsyncTenantRepository(AsyncRepository[TenantRepository]):
+    """Async interface to TenantRepository"""
+
+    async def get_tenants(self, **kwargs: Any) -> List[Tuple[int, Tenant]]:
+        return await self.run(lambda: list(self.repo.get_tenants(**kwargs)))
+
+    async def get_by_identification_number(
+        self, identification_number: str
+    ) -> Optional[Tenant]:
+        return await self.run(
+            self.repo.get_by_identification_number, identification_number
+        )
+
+    async def get_approved_tenants(self) -> List[Tenant]:
+        return await self.run(self.repo.get_approved_tenants)
+
+    async def get_approved_tenant_count(self) -> int:
+        return await self.run(self.repo.get_approved_tenant_count)
+
+
+class AsyncLeaseRepository(AsyncRepository[LeaseRepository]):
+    """Async interface to LeaseRepository"""
+
+    async def get_leases(self, **kwargs: Any) -> List[Tuple[int, Lease]]:
+        return await self.run(lambda: list(self.repo.get_leases(**kwargs)))
+
+    async def get_lease_ids_by_unit_ids(
+        self, unit_ids: Iterable[Union[str, UUID]]
+    ) -> List[List[UUID]]:
+        logs = [self.repo._unit_lease_log(unit_id) for unit_id in unit_ids]
+        return [
+            [logged.lease_id for logged in index_events]
+            for index_events in await self._select_index_events(logs)
+        ]
+
+    async def get_lease_ids_by_tenant_ids(
+        self, tenant_ids: Iterable[Union[str, UUID]]
+    ) -> List[List[UUID]]:
+        logs = [self.repo._tenant_lease_log(tenant_id) for tenant_id in tenant_ids]
+        return [
+            self.repo._fold_tenant_lease_ids(index_events)
+            for index_events in await self._select_index_events(logs)
+        ]
+
+    async def _select_index_events(
+        self, logs: Sequence[EventSourcedLog]
+    ) -> List[List[DomainEvent]]:
+        stored_events = await self.reader.select_events_many(
+            self.repo.recorder, [log.originator_id for log in logs]
+        )
+        return self.repo._decode_index_events(logs, stored_events)
+
+    async def get_active_lease_ids(self, as_of: Optional[date] = None) -> List[UUID]:
+        return await self.run(self.repo.active_leases.get_lease_ids, as_of)
+
+    async def get_active_leases(self, as_of: Optional[date] = None) -> List[Lease]:
+        leases = await self.get_many(await self.get_active_lease_ids(as_of))
+        return [lease for lease in leases if lease is not None]
@@ -0,0 +1,81 @@
+import time
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from eventsourcing.domain import Aggregate
+from eventsourcing.persistence import IntegrityError
+
+from .repositories import EventSourcingApplication
+
+Row = Dict[str, Any]
+
+
+@dataclass
+class ImportReport:
+    """Number of aggregates created by an import, with the errors of rows
+    which weren't imported"""
+
+    created: int = 0
+    errors: List[Tuple[int, str]] = field(default_factory=list)
+    seconds: float = 0.0
+
+    @property
+    def rate(self) -> float:
+        """Aggregates created per second"""
+        return self.created / self.seconds if self.seconds else 0.0
+
+
+def import_rows(
+    repo: EventSourcingApplication,
+    rows: Iterable[Any],
+    build: Callable[[Row], Aggregate],
+    batch_size: int = 1000,
+    parse: Optional[Callable[[Any], Row]] = None,
+) -> ImportReport:
+    """Create an aggregate from each row, saving them and their log events in
+    batches of one transaction each. Rows are first parsed with parse if given,
+    e.g. the lines of an NDJSON file with json.loads.
+
+    Rows are numbered from 1. A row which can't be parsed or built is reported
+    as an error. If a batch fails to save, its rows are saved one at a time so
+    that only the conflicting rows are reported."""
+    report = ImportReport()
+    started = time.monotonic()
+    numbered = enumerate(rows, start=1)
+    while batch := list(islice(numbered, batch_size)):
+        aggregates = []
+        built = []
+        for number, row in batch:
+            try:
+                if parse is not None:
+                    row = parse(row)
+                aggregates.append(build(row))
+            except (KeyError, TypeError, ValueError) as e:
+                report.errors.append((number, _describe(e)))
+            else:
+                built.append((number, row))
+
+        try:
+            repo.create_many(aggregates)
+        except (IntegrityError, ValueError):
+            # Saving collects the aggregates' pending events, so they're rebuilt
+            for number, row in built:
+                try:
+                    repo.create(build(row))
+                except (IntegrityError, ValueError) as e:
+                    report.errors.append((number, _describe(e)))
+                else:
+                    report.created += 1
+        else:
+            report.created += len(aggregates)
+
+    report.errors.sort()
+    report.seconds = time.monotonic() - started
+    return report
+
+
+def _describe(error: Exception) -> str:
+    if isinstance(error, KeyError):
+        return f"Missing field {error}"
+    return str(error) or type(error).__name__
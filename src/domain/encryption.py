@@ -0,0 +1,70 @@
+import hashlib
+import hmac
+from base64 import b64decode, b64encode
+from typing import Any, Dict, Iterable, Type
+from uuid import UUID
+
+from eventsourcing.application import LRUCache
+from eventsourcing.persistence import Cipher, Transcoder
+from eventsourcing.utils import Environment, resolve_topic
+
+
+class FieldCipher:
+    """Encrypts the values of some fields of events, such as personal data, with
+    a key derived for each aggregate from a master key.
+
+    The values of the fields of one event are encrypted together, in a single
+    cipher operation. Events aren't encrypted together per commit, since each
+    stored event must be decrypted on its own when it's read, e.g. after a
+    snapshot. Deriving a key and constructing its cipher is what's relatively
+    slow, so the ciphers of recently used keys are cached, and the events of an
+    aggregate saved together share one."""
+
+    ENCRYPTED = "_encrypted_"
+
+    def __init__(
+        self,
+        cipher_key: str,
+        fields: Iterable[str],
+        transcoder: Transcoder,
+        cipher_topic: str = "eventsourcing.cipher:AESCipher",
+        cache_maxsize: int = 1000,
+    ):
+        self.master_key = b64decode(cipher_key)
+        self.fields = tuple(fields)
+        # Encrypted values must keep their types, so they're encoded with
+        # tagged objects rather than relying on the event's type hints
+        self.transcoder = transcoder
+        self.cipher_class: Type[Cipher] = resolve_topic(cipher_topic)
+        self.ciphers: LRUCache[UUID, Cipher] = LRUCache(maxsize=cache_maxsize)
+
+    def cipher(self, originator_id: UUID) -> Cipher:
+        """Get the cipher of the aggregate's key"""
+        try:
+            return self.ciphers.get(originator_id)
+        except KeyError:
+            key = hmac.digest(self.master_key, originator_id.bytes, hashlib.sha256)
+            cipher = self.cipher_class(
+                Environment(env={"CIPHER_KEY": b64encode(key).decode()})
+            )
+            self.ciphers.put(originator_id, cipher)
+            return cipher
+
+    def encrypt(self, originator_id: UUID, state: Dict[str, Any]) -> None:
+        """Replace the values of the fields in state with None, adding their
+        encrypted values"""
+        values = {name: state[name] for name in self.fields if name in state}
+        if not values:
+            return
+        for name in values:
+            # Fields are kept, so they keep their positions in compact encoding
+            state[name] = None
+        ciphertext = self.cipher(originator_id).encrypt(self.transcoder.encode(values))
+        state[self.ENCRYPTED] = b64encode(ciphertext).decode()
+
+    def decrypt(self, originator_id: UUID, state: Dict[str, Any]) -> None:
+        """Restore the encrypted values of the fields in state"""
+        ciphertext = state.pop(self.ENCRYPTED, None)
+        if ciphertext is not None:
+            plaintext = self.cipher(originator_id).decrypt(b64decode(ciphertext))
+            state.update(self.transcoder.decode(plaintext))
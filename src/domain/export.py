@@ -0,0 +1,98 @@
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, Iterator, List, Optional
+from uuid import UUID
+
+from eventsourcing.domain import Aggregate
+
+from .repositories import EventSourcingApplication
+
+Record = Dict[str, Any]
+
+
+def aggregate_record(position: int, aggregate: Aggregate) -> Record:
+    """Get the current state of an aggregate with its position in the log"""
+    return {
+        "position": position,
+        "type": type(aggregate).__name__,
+        "id": aggregate.id,
+        "version": aggregate.version,
+        "created_on": aggregate.created_on,
+        "modified_on": aggregate.modified_on,
+        "state": {
+            name: value
+            for name, value in vars(aggregate).items()
+            if not name.startswith("_")
+        },
+    }
+
+
+def iter_aggregate_records(
+    repo: EventSourcingApplication,
+    from_position: int = 1,
+    chunk_size: Optional[int] = None,
+) -> Iterator[List[Record]]:
+    """Iterate over chunks of the current state of the repository's aggregates,
+    from a position in its log"""
+    chunk_size = chunk_size or repo.get_many_chunk_size
+    chunk = []
+    for position, aggregate in repo.iter_logged(from_position - 1, chunk_size):
+        chunk.append(aggregate_record(position, aggregate))
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def iter_event_records(
+    repo: EventSourcingApplication,
+    from_position: int = 1,
+    chunk_size: Optional[int] = None,
+) -> Iterator[List[Record]]:
+    """Iterate over chunks of the events in the repository's notification log,
+    from a position in the log. The events include those of the repository's
+    logs and, in single-application mode, those of the other repositories."""
+    chunk_size = chunk_size or repo.get_many_chunk_size
+    start = from_position
+    while notifications := repo.recorder.select_notifications(
+        start=start, limit=chunk_size
+    ):
+        chunk = []
+        for notification in notifications:
+            state = vars(repo.mapper.to_domain_event(notification)).copy()
+            chunk.append(
+                {
+                    "position": notification.id,
+                    "originator_id": state.pop("originator_id"),
+                    "originator_version": state.pop("originator_version"),
+                    "topic": notification.topic,
+                    "state": state,
+                }
+            )
+        yield chunk
+        start = notifications[-1].id + 1
+
+
+def to_ndjson(records: List[Record]) -> bytes:
+    """Encode records as newline-delimited JSON"""
+    return "".join(
+        json.dumps(record, default=_encode, separators=(",", ":")) + "\n"
+        for record in records
+    ).encode("utf8")
+
+
+def jsonable(value: Any) -> Any:
+    """Convert a value to plain JSON types, e.g. UUIDs and dates to strings"""
+    return json.loads(json.dumps(value, default=_encode))
+
+
+def _encode(obj: Any) -> Any:
+    if isinstance(obj, (date, datetime)):
+        return obj.isoformat()
+    if isinstance(obj, (UUID, Decimal)):
+        return str(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
@@ -0,0 +1,153 @@
+import asyncio
+import logging
+from functools import partial
+from threading import Lock
+from typing import (
+    AsyncIterator,
+    Callable,
+    Iterable,
+    List,
+    Optional,
+    Set,
+)
+
+from eventsourcing.domain import DomainEvent
+
+from .repositories import EventSourcingApplication
+from .tailer import LogTailer
+
+logger = logging.getLogger(__name__)
+
+Predicate = Callable[[DomainEvent], bool]
+
+
+class SubscriptionOverflow(Exception):
+    """Raised to a subscriber which fell too far behind the events"""
+
+
+class Subscriber:
+    def __init__(self, predicate: Optional[Predicate], max_queue_size: int):
+        self.predicate = predicate
+        self.max_queue_size = max_queue_size
+        # Unbounded, so the overflow marker can always be put
+        self.queue: asyncio.Queue = asyncio.Queue()
+
+    def matches(self, event: DomainEvent) -> bool:
+        return self.predicate is None or self.predicate(event)
+
+
+_OVERFLOW = object()
+
+
+class EventFanout:
+    """Delivers the new events of the applications to any number of
+    subscribers. A single task follows the notification log of each event store
+    with a LogTailer, so the new events are read once however many subscribers
+    there are. Tailers are woken when events are recorded, and poll the logs at
+    least every interval seconds. The task runs while there are subscribers.
+
+    A subscriber with more than max_queue_size undelivered events is dropped,
+    raising SubscriptionOverflow, rather than buffering events without bound."""
+
+    def __init__(
+        self,
+        applications: Iterable[EventSourcingApplication],
+        interval: float = 0.5,
+        max_queue_size: int = 1000,
+        batch_size: int = 500,
+    ):
+        # In single-application mode the repositories share one event store
+        self.applications = list(
+            {
+                id(application.recorder): application for application in applications
+            }.values()
+        )
+        self.interval = interval
+        self.max_queue_size = max_queue_size
+        self.batch_size = batch_size
+        self.subscribers: Set[Subscriber] = set()
+        self.task: Optional[asyncio.Task] = None
+        # Number of times the notification logs have been read, by the
+        # executor threads of the tailers
+        self.reads = 0
+        self.reads_lock = Lock()
+
+    async def subscribe(
+        self, predicate: Optional[Predicate] = None
+    ) -> AsyncIterator[DomainEvent]:
+        """Iterate over new events, those for which predicate is true if given"""
+        subscriber = Subscriber(predicate, self.max_queue_size)
+        self.subscribers.add(subscriber)
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+        try:
+            while True:
+                event = await subscriber.queue.get()
+                if event is _OVERFLOW:
+                    raise SubscriptionOverflow(
+                        f"More than {self.max_queue_size} events weren't consumed"
+                    )
+                yield event
+        finally:
+            self.subscribers.discard(subscriber)
+            if not self.subscribers and self.task is not None:
+                self.task.cancel()
+                self.task = None
+
+    async def close(self) -> None:
+        """Stop polling"""
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    async def _run(self) -> None:
+        await asyncio.gather(
+            *(self._follow(application) for application in self.applications)
+        )
+
+    async def _follow(self, application: EventSourcingApplication) -> None:
+        loop = asyncio.get_running_loop()
+        # Constructing the wakeup of the application may connect to the database
+        tailer = await loop.run_in_executor(
+            None,
+            partial(
+                LogTailer,
+                application,
+                batch_size=self.batch_size,
+                max_interval=self.interval,
+            ),
+        )
+        # Subscribers receive the events recorded after they subscribed
+        await loop.run_in_executor(None, tailer.seek_end)
+        while True:
+            try:
+                events = await loop.run_in_executor(None, self._read, tailer)
+            except Exception:
+                # Keep following, subscribers get the events once reads succeed
+                logger.exception("Failed to read new events")
+                await asyncio.sleep(self.interval)
+            else:
+                self._deliver(events)
+
+    def _read(self, tailer: LogTailer) -> List[DomainEvent]:
+        reads = tailer.reads
+        notifications = tailer.wait(timeout=self.interval)
+        with self.reads_lock:
+            self.reads += tailer.reads - reads
+        mapper = tailer.application.mapper
+        return [mapper.to_domain_event(notification) for notification in notifications]
+
+    def _deliver(self, events: List[DomainEvent]) -> None:
+        for subscriber in list(self.subscribers):
+            for event in events:
+                if not subscriber.matches(event):
+                    continue
+                if subscriber.queue.qsize() >= subscriber.max_queue_size:
+                    self.subscribers.discard(subscriber)
+                    subscriber.queue.put_nowait(_OVERFLOW)
+                    break
+                subscriber.queue.put_nowait(event)
@@ -0,0 +1,38 @@
+from typing import Callable, Optional
+
+from .repositories import EventSourcingApplication
+
+
+def copy_events(
+    source: EventSourcingApplication,
+    target: EventSourcingApplication,
+    batch_size: int = 1000,
+    start: int = 1,
+    progress: Optional[Callable[[int, int], None]] = None,
+) -> int:
+    """Copy the events of the source repository to the target repository, in
+    notification order, re-encoding them with the target's mapper.
+
+    Events are inserted in batches of one transaction each. To resume an
+    interrupted copy, start from the notification after the last one copied,
+    which is passed to progress with the number of events copied so far.
+    Snapshots aren't copied, they can be taken again in the target."""
+    copied = 0
+    while True:
+        notifications = source.recorder.select_notifications(
+            start=start, limit=batch_size
+        )
+        if not notifications:
+            return copied
+        target.recorder.insert_events(
+            [
+                target.mapper.to_stored_event(
+                    source.mapper.to_domain_event(notification)
+                )
+                for notification in notifications
+            ]
+        )
+        copied += len(notifications)
+        start = notifications[-1].id + 1
+        if progress is not None:
+            progress(notifications[-1].id, copied)
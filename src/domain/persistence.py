@@ -0,0 +1,213 @@
+from threading import Lock
+from typing import Any, ClassVar, Dict, List, Mapping, Optional, Sequence, Tuple
+from uuid import UUID
+
+from eventsourcing import postgres
+from eventsourcing.persistence import AggregateRecorder, StoredEvent
+from eventsourcing.popo import POPOAggregateRecorder
+from eventsourcing.postgres import PostgresAggregateRecorder, PostgresDatastore
+from eventsourcing.sqlite import SQLiteAggregateRecorder
+from eventsourcing.utils import Environment
+
+
+# Postgres statements selecting the events of many originators after given
+# versions, and the last event of many originators
+POSTGRES_SELECT_EVENTS_MANY = (
+    "SELECT e.* FROM {table} e "
+    "JOIN unnest(%s::uuid[], %s::bigint[]) AS s(originator_id, gt) "
+    "ON e.originator_id = s.originator_id AND e.originator_version > s.gt "
+    "ORDER BY e.originator_id, e.originator_version"
+)
+POSTGRES_SELECT_LAST_EVENTS_MANY = (
+    "SELECT DISTINCT ON (originator_id) * FROM {table} "
+    "WHERE originator_id = ANY(%s) "
+    "ORDER BY originator_id, originator_version DESC"
+)
+
+
+def select_events_many(
+    recorder: AggregateRecorder,
+    originator_ids: Sequence[UUID],
+    gt: Optional[Mapping[UUID, int]] = None,
+) -> Dict[UUID, List[StoredEvent]]:
+    """Select the stored events of many originators with a single query,
+    grouped by originator ID and ordered by originator version. Only the events
+    after the version given in gt are selected for an originator, e.g. those
+    after a snapshot."""
+    events: Dict[UUID, List[StoredEvent]] = {
+        originator_id: [] for originator_id in originator_ids
+    }
+    if not originator_ids:
+        return events
+    gt = {originator_id: (gt or {}).get(originator_id, 0) for originator_id in events}
+
+    if isinstance(recorder, SQLiteAggregateRecorder):
+        statement = (
+            "WITH selected(originator_id, gt) AS "
+            f"(VALUES {', '.join(['(?, ?)'] * len(events))}) "
+            f"SELECT e.* FROM {recorder.events_table_name} e "
+            "JOIN selected s ON e.originator_id = s.originator_id "
+            "AND e.originator_version > s.gt "
+            "ORDER BY e.originator_id, e.originator_version"
+        )
+        with recorder.datastore.transaction(commit=False) as c:
+            c.execute(
+                statement,
+                [
+                    value
+                    for originator_id, version in gt.items()
+                    for value in (originator_id.hex, version)
+                ],
+            )
+            rows = [_sqlite_stored_event(row) for row in c.fetchall()]
+    elif isinstance(recorder, PostgresAggregateRecorder):
+        statement = POSTGRES_SELECT_EVENTS_MANY.format(table=recorder.events_table_name)
+        with recorder.datastore.get_connection() as conn, conn.cursor() as curs:
+            curs.execute(statement, [list(gt), list(gt.values())], prepare=True)
+            rows = [postgres_stored_event(row) for row in curs.fetchall()]
+    elif isinstance(recorder, POPOAggregateRecorder):
+        with recorder._database_lock:
+            rows = [
+                recorder._stored_events[position]
+                for originator_id in events
+                for version, position in recorder._stored_events_index[
+                    originator_id
+                ].items()
+                if version > gt[originator_id]
+            ]
+    else:
+        rows = [
+            stored_event
+            for originator_id in events
+            for stored_event in recorder.select_events(
+                originator_id, gt=gt[originator_id]
+            )
+        ]
+
+    for stored_event in rows:
+        events[stored_event.originator_id].append(stored_event)
+    return events
+
+
+def select_last_events_many(
+    recorder: AggregateRecorder, originator_ids: Sequence[UUID]
+) -> Dict[UUID, StoredEvent]:
+    """Select the last stored event of many originators with a single query,
+    e.g. their latest snapshots. Originators without events are left out."""
+    if not originator_ids:
+        return {}
+
+    if isinstance(recorder, SQLiteAggregateRecorder):
+        statement = (
+            f"SELECT * FROM {recorder.events_table_name} e "
+            f"WHERE originator_id IN ({','.join('?' * len(originator_ids))}) "
+            "AND originator_version = (SELECT MAX(originator_version) "
+            f"FROM {recorder.events_table_name} "
+            "WHERE originator_id = e.originator_id)"
+        )
+        with recorder.datastore.transaction(commit=False) as c:
+            c.execute(
+                statement, [originator_id.hex for originator_id in originator_ids]
+            )
+            rows = [_sqlite_stored_event(row) for row in c.fetchall()]
+    elif isinstance(recorder, PostgresAggregateRecorder):
+        statement = POSTGRES_SELECT_LAST_EVENTS_MANY.format(
+            table=recorder.events_table_name
+        )
+        with recorder.datastore.get_connection() as conn, conn.cursor() as curs:
+            curs.execute(statement, [list(originator_ids)], prepare=True)
+            rows = [postgres_stored_event(row) for row in curs.fetchall()]
+    elif isinstance(recorder, POPOAggregateRecorder):
+        with recorder._database_lock:
+            rows = [
+                recorder._stored_events[index[max(index)]]
+                for originator_id in originator_ids
+                if (index := recorder._stored_events_index.get(originator_id))
+            ]
+    else:
+        rows = [
+            stored_event
+            for originator_id in originator_ids
+            for stored_event in recorder.select_events(
+                originator_id, desc=True, limit=1
+            )
+        ]
+
+    return {stored_event.originator_id: stored_event for stored_event in rows}
+
+
+def _sqlite_stored_event(row: Any) -> StoredEvent:
+    return StoredEvent(
+        originator_id=UUID(row["originator_id"]),
+        originator_version=row["originator_version"],
+        topic=row["topic"],
+        state=row["state"],
+    )
+
+
+def postgres_stored_event(row: Any) -> StoredEvent:
+    return StoredEvent(
+        originator_id=row["originator_id"],
+        originator_version=row["originator_version"],
+        topic=row["topic"],
+        state=bytes(row["state"]),
+    )
+
+
+class SharedPostgresFactory(postgres.Factory):
+    """Postgres infrastructure factory whose applications share one datastore,
+    and so one connection pool, when they connect to the same database.
+
+    Select it with PERSISTENCE_MODULE=src.domain.persistence:SharedPostgresFactory.
+    The pool holds POSTGRES_POOL_SIZE connections, grows by up to
+    POSTGRES_MAX_OVERFLOW, checks connections before use with POSTGRES_PRE_PING
+    and closes connections idle for longer than POSTGRES_POOL_MAX_IDLE seconds.
+    The settings of the first application to connect are used for the pool."""
+
+    POSTGRES_POOL_MAX_IDLE = "POSTGRES_POOL_MAX_IDLE"
+
+    # Datastores shared by the factories, with the number of factories using them
+    datastores: ClassVar[Dict[Tuple[str, ...], Tuple[PostgresDatastore, int]]] = {}
+    datastores_lock: ClassVar[Lock] = Lock()
+
+    def __init__(self, env: Environment):
+        super().__init__(env)
+        max_idle_str = self.env.get(self.POSTGRES_POOL_MAX_IDLE)
+        if max_idle_str:
+            try:
+                self.datastore.pool.max_idle = float(max_idle_str)
+            except ValueError:
+                raise OSError(
+                    f"Postgres environment value for key '{self.POSTGRES_POOL_MAX_IDLE}' "
+                    f"is invalid. If set, a float or empty string is expected: '{max_idle_str}'"
+                ) from None
+
+        # The pool of the datastore constructed above isn't opened until used,
+        # so it's simply dropped if another factory's datastore can be shared
+        self.datastore_key = (
+            self.env.get(self.POSTGRES_DBNAME),
+            self.env.get(self.POSTGRES_HOST),
+            self.env.get(self.POSTGRES_PORT) or "5432",
+            self.env.get(self.POSTGRES_USER),
+            self.datastore.schema,
+        )
+        with self.datastores_lock:
+            datastore, users = self.datastores.get(
+                self.datastore_key, (self.datastore, 0)
+            )
+            self.datastores[self.datastore_key] = (datastore, users + 1)
+        self.datastore = datastore
+        self.is_closed = False
+
+    def close(self) -> None:
+        """Close the shared datastore once no factory is using it"""
+        if getattr(self, "is_closed", True):
+            return
+        self.is_closed = True
+        with self.datastores_lock:
+            datastore, users = self.datastores[self.datastore_key]
+            if users > 1:
+                self.datastores[self.datastore_key] = (datastore, users - 1)
+                return
+            del self.datastores[self.datastore_key]
+        datastore.close()
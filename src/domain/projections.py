@@ -0,0 +1,250 @@
+from bisect import bisect_left, bisect_right, insort
+from datetime import date
+from operator import itemgetter
+from threading import RLock
+from typing import ClassVar, Dict, List, Optional, Tuple, Type
+from uuid import UUID, uuid5, NAMESPACE_URL
+
+from eventsourcing.application import Application, EventSourcedLog
+from eventsourcing.domain import Aggregate, DomainEvent
+from eventsourcing.persistence import IntegrityError
+from eventsourcing.utils import get_topic
+
+from .models import Unit, Tenant, Lease
+
+
+class Projection:
+    """Read model maintained incrementally from an application's notification log"""
+
+    # Event classes processed by the projection
+    event_classes: ClassVar[Tuple[Type[DomainEvent], ...]] = ()
+    # Number of notifications selected per query when catching up
+    batch_size = 500
+
+    def __init__(self, app: Application):
+        self.app = app
+        self.topics = [get_topic(cls) for cls in self.event_classes]
+        # Position of the last notification processed
+        self.position = 0
+        self.lock = RLock()
+
+    def catch_up(self) -> None:
+        """Process the notifications recorded since the last one processed"""
+        with self.lock:
+            stop = self.app.recorder.max_notification_id() or 0
+            while self.position < stop:
+                notifications = self.app.recorder.select_notifications(
+                    start=self.position + 1,
+                    limit=self.batch_size,
+                    stop=stop,
+                    topics=self.topics,
+                )
+                for notification in notifications:
+                    self.position = notification.id
+                    self.process_event(self.app.mapper.to_domain_event(notification))
+                if len(notifications) < self.batch_size:
+                    # Nothing else of interest up to the stop position
+                    self.position = stop
+
+    def process_event(self, event: DomainEvent) -> None:
+        raise NotImplementedError
+
+
+class AvailableUnitsProjection(Projection):
+    """IDs of units which are leasable and not leased"""
+
+    event_classes = (
+        Unit.Created,
+        Unit.MarkedAsLeased,
+        Unit.MarkedAsAvailable,
+        Unit.MarkedAsUnleasable,
+        Unit.MarkedAsLeasable,
+    )
+
+    def __init__(self, app: Application):
+        super().__init__(app)
+        # Leasable and leased flags of every unit
+        self.units: Dict[UUID, Tuple[bool, bool]] = {}
+        self.available: Dict[UUID, None] = {}
+
+    def process_event(self, event: DomainEvent) -> None:
+        unit_id = event.originator_id
+        if isinstance(event, Unit.Created):
+            is_leasable, is_leased = True, False
+        else:
+            is_leasable, is_leased = self.units[unit_id]
+            if isinstance(event, Unit.MarkedAsLeased):
+                is_leased = True
+            elif isinstance(event, Unit.MarkedAsAvailable):
+                is_leased = False
+            elif isinstance(event, Unit.MarkedAsUnleasable):
+                is_leasable = False
+            elif isinstance(event, Unit.MarkedAsLeasable):
+                is_leasable = True
+        self.units[unit_id] = (is_leasable, is_leased)
+
+        if is_leasable and not is_leased:
+            self.available[unit_id] = None
+        else:
+            self.available.pop(unit_id, None)
+
+    def get_unit_ids(self) -> List[UUID]:
+        """Get the IDs of the available units, after catching up"""
+        self.catch_up()
+        with self.lock:
+            return list(self.available)
+
+
+class ActiveLeasesProjection(Projection):
+    """Signed leases indexed by their date ranges, to find the leases active on
+    any date"""
+
+    event_classes = (Lease.Created, Lease.SignedByTenant, Lease.DateUpdated)
+
+    def __init__(self, app: Application):
+        super().__init__(app)
+        # Start date, end date and signed flag of every lease
+        self.leases: Dict[UUID, Tuple[date, date, bool]] = {}
+        # Signed leases sorted by start date, and by end date
+        self.by_start: List[Tuple[date, UUID]] = []
+        self.by_end: List[Tuple[date, UUID]] = []
+
+    def process_event(self, event: DomainEvent) -> None:
+        lease_id = event.originator_id
+        if isinstance(event, Lease.Created):
+            start_date, end_date, signed = event.start_date, event.end_date, False
+        else:
+            start_date, end_date, signed = self.leases[lease_id]
+            if signed:
+                del self.by_start[bisect_left(self.by_start, (start_date, lease_id))]
+                del self.by_end[bisect_left(self.by_end, (end_date, lease_id))]
+            if isinstance(event, Lease.SignedByTenant):
+                signed = True
+            elif isinstance(event, Lease.DateUpdated):
+                start_date = event.start_date or start_date
+                end_date = event.end_date or end_date
+        self.leases[lease_id] = (start_date, end_date, signed)
+
+        if signed:
+            insort(self.by_start, (start_date, lease_id))
+            insort(self.by_end, (end_date, lease_id))
+
+    def get_lease_ids(self, as_of: Optional[date] = None) -> List[UUID]:
+        """Get the IDs of the leases which are signed and in their date range on
+        the given date (default today), after catching up"""
+        as_of = as_of or date.today()
+        self.catch_up()
+        with self.lock:
+            # Leases started by the date, and leases not ended by the date
+            started = bisect_right(self.by_start, as_of, key=itemgetter(0))
+            not_ended = len(self.by_end) - bisect_left(
+                self.by_end, as_of, key=itemgetter(0)
+            )
+            # Check the other bound of whichever range is smaller
+            if started <= not_ended:
+                return [
+                    lease_id
+                    for _, lease_id in self.by_start[:started]
+                    if self.leases[lease_id][1] >= as_of
+                ]
+            return [
+                lease_id
+                for _, lease_id in self.by_end[len(self.by_end) - not_ended :]
+                if self.leases[lease_id][0] <= as_of
+            ]
+
+
+# Domain event for logging changes to the approved tenants, with the position
+# of the notification which made the change
+class TenantApprovalLogged(DomainEvent):
+    tenant_id: UUID
+    is_approved: bool
+    position: int
+
+
+class ApprovedTenantsProjection(Projection):
+    """IDs of approved tenants. Changes are recorded in a log, so that after a
+    restart the projection resumes from the log instead of from the start of
+    the notification log"""
+
+    event_classes = (Tenant.Approved, Tenant.Disapproved)
+
+    def __init__(self, app: Application):
+        super().__init__(app)
+        self.log: EventSourcedLog[TenantApprovalLogged] = EventSourcedLog(
+            app.events,
+            uuid5(NAMESPACE_URL, "/projection/approved_tenants"),
+            TenantApprovalLogged,
+        )
+        self.approved: Dict[UUID, None] = {}
+        # Version of the last log event applied, and log events not yet saved
+        self.log_version: Optional[int] = None
+        self.pending: List[TenantApprovalLogged] = []
+
+    def catch_up(self) -> None:
+        with self.lock:
+            while True:
+                self._resume()
+                super().catch_up()
+                if not self.pending:
+                    return
+                try:
+                    self.app.save(*self.pending)
+                except IntegrityError:
+                    # Another process logged the changes first, start over
+                    self.approved.clear()
+                    self.position = 0
+                    self.log_version = None
+                else:
+                    self.log_version = self.pending[-1].originator_version
+                    return
+                finally:
+                    self.pending = []
+
+    def _resume(self) -> None:
+        """Apply the changes logged since the last one applied"""
+        for logged in self.log.get(gt=self.log_version):
+            if logged.is_approved:
+                self.approved[logged.tenant_id] = None
+            else:
+                self.approved.pop(logged.tenant_id, None)
+            self.position = max(self.position, logged.position)
+            self.log_version = logged.originator_version
+
+    def process_event(self, event: DomainEvent) -> None:
+        tenant_id = event.originator_id
+        is_approved = isinstance(event, Tenant.Approved)
+        if is_approved == (tenant_id in self.approved):
+            return
+        if is_approved:
+            self.approved[tenant_id] = None
+        else:
+            del self.approved[tenant_id]
+
+        last_version = (
+            self.pending[-1].originator_version if self.pending else self.log_version
+        )
+        self.pending.append(
+            self.log.trigger_event(
+                next_originator_version=(
+                    Aggregate.INITIAL_VERSION
+                    if last_version is None
+                    else last_version + 1
+                ),
+                tenant_id=tenant_id,
+                is_approved=is_approved,
+                position=self.position,
+            )
+        )
+
+    def get_tenant_ids(self) -> List[UUID]:
+        """Get the IDs of the approved tenants, after catching up"""
+        self.catch_up()
+        with self.lock:
+            return list(self.approved)
+
+    def get_count(self) -> int:
+        """Get the number of approved tenants, after catching up"""
+        self.catch_up()
+        with self.lock:
+            return len(self.approved)
@@ -1,13 +1,62 @@
-from typing import List, Optional, Union, Iterator, Tuple
+import hashlib
+import hmac
+import logging
+from abc import ABC, abstractmethod
+from base64 import b64decode
+from copy import deepcopy
+from itertools import islice
+from typing import (
+    Any,
+    ClassVar,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Type,
+    Union,
+    Iterator,
+    Tuple,
+)
 from uuid import UUID, uuid5, NAMESPACE_URL
 from datetime import date
 
-from eventsourcing.application import Application, AggregateNotFoundError
-from eventsourcing.domain import DomainEvent
-from eventsourcing.persistence import Transcoding
+from eventsourcing.application import (
+    Application,
+    AggregateNotFoundError,
+    LRUCache,
+    ProcessingEvent,
+    Repository,
+    project_aggregate,
+)
+from eventsourcing.domain import Aggregate, CanMutateProtocol, DomainEvent
+from eventsourcing.persistence import (
+    ApplicationRecorder,
+    EventStore,
+    InfrastructureFactory,
+    IntegrityError,
+    Mapper,
+    Recording,
+    StoredEvent,
+    Transcoder,
+    Transcoding,
+)
 from eventsourcing.application import EventSourcedLog
+from eventsourcing.postgres import PostgresApplicationRecorder
+from eventsourcing.utils import Environment, EnvType, get_topic
 
 from .models import Unit, Tenant, Lease
+from .persistence import select_events_many, select_last_events_many
+from .projections import (
+    ActiveLeasesProjection,
+    ApprovedTenantsProjection,
+    AvailableUnitsProjection,
+)
+from .encryption import FieldCipher
+from .tailer import PostgresWakeup, Wakeup
+from .transcoders import CompactMapper, OrjsonTranscoder, TypedMapper
+
+logger = logging.getLogger(__name__)
 
 
 # Custom transcoding for date objects
@@ -26,14 +75,592 @@ class DateTranscoding(Transcoding):
         return date.fromisoformat(data)
 
 
-class EventSourcingApplication(Application):
+class CountingLRUCache(LRUCache):
+    """LRU cache of reconstructed aggregates which counts hits, misses and evictions"""
+
+    def __init__(self, maxsize: int):
+        super().__init__(maxsize)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: UUID, *, evict: bool = False) -> Any:
+        try:
+            value = super().get(key, evict=evict)
+        except KeyError:
+            self.misses += 1
+            raise
+        self.hits += 1
+        return value
+
+    def put(self, key: UUID, value: Any) -> Any:
+        evicted_key, evicted_value = super().put(key, value)
+        if evicted_key is not None:
+            self.evictions += 1
+        return evicted_key, evicted_value
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self.cache),
+            "maxsize": self.maxsize,
+        }
+
+
+class LogEvents:
+    """Log events triggered to be saved together. Several events may be
+    triggered for the same log before saving, so they're numbered in sequence."""
+
+    def __init__(self):
+        self.events: List[DomainEvent] = []
+        self.last: Dict[UUID, DomainEvent] = {}
+
+    def trigger(
+        self,
+        log: EventSourcedLog,
+        next_originator_version: Optional[int] = None,
+        **kwargs: Any,
+    ) -> DomainEvent:
+        if next_originator_version is None:
+            last = self.last.get(log.originator_id)
+            next_originator_version = last.originator_version + 1 if last else None
+        logged = log.trigger_event(
+            next_originator_version=next_originator_version, **kwargs
+        )
+        self.last[log.originator_id] = logged
+        self.events.append(logged)
+        return logged
+
+
+class EventSourcingApplication(Application, ABC):
     """Base application class for our event-sourced system"""
 
+    # Reconstructed aggregates are cached and fast-forwarded to their latest
+    # version when read again. Set AGGREGATE_CACHE_MAXSIZE to an empty value
+    # to disable the cache. Aggregates are deep-copied out of the cache unless
+    # DEEPCOPY_FROM_AGGREGATE_CACHE is disabled, so commands can't corrupt it.
+    env = {"AGGREGATE_CACHE_MAXSIZE": "1000"}
+
+    # Environment variables overriding the snapshotting policy of the
+    # application's aggregate, e.g. UNIT_SNAPSHOTTING_INTERVAL=100 or
+    # LEASE_SNAPSHOTTING_EVENTS=SignedByTenant,DateUpdated
+    SNAPSHOTTING_INTERVAL = "SNAPSHOTTING_INTERVAL"
+    SNAPSHOTTING_EVENTS = "SNAPSHOTTING_EVENTS"
+
+    # Set TRANSCODER=orjson to encode events with orjson. Events written by the
+    # default JSON transcoder can still be read, but not the other way round.
+    TRANSCODER = "TRANSCODER"
+
+    # Set EVENT_ENCODING=compact to store events without their field names,
+    # compressing encoded state larger than COMPRESSION_THRESHOLD bytes
+    EVENT_ENCODING = "EVENT_ENCODING"
+    COMPRESSION_THRESHOLD = "COMPRESSION_THRESHOLD"
+
+    # With a CIPHER_KEY, set CIPHER_MODE=fields to encrypt only the values of
+    # the encrypted fields of events, each aggregate's with a key of its own
+    CIPHER_MODE = "CIPHER_MODE"
+    ENCRYPTED_FIELDS = "ENCRYPTED_FIELDS"
+    encrypted_fields: ClassVar[Tuple[str, ...]] = ()
+
+    aggregate_class: ClassVar[Type[Aggregate]]
+    # Event types after which a snapshot is taken, in addition to intervals
+    snapshotting_events: ClassVar[
+        Dict[Type[Aggregate], Tuple[Type[DomainEvent], ...]]
+    ] = {}
+
+    def __init__(
+        self,
+        env: EnvType | None = None,
+        host: Optional["EventSourcingApplication"] = None,
+    ):
+        # In single-application mode the repository uses the infrastructure of
+        # the host application, so all aggregates share one event store,
+        # aggregate cache and notification log
+        self.host = host
+        self._wakeup: Optional[Wakeup] = None
+        super().__init__(env)
+        if host is not None:
+            self.snapshotting_intervals = {
+                **(host.snapshotting_intervals or {}),
+                **(self.snapshotting_intervals or {}),
+            }
+            self.snapshotting_events = {
+                **host.snapshotting_events,
+                **self.snapshotting_events,
+            }
+
+    def construct_env(self, name: str, env: EnvType | None = None) -> Environment:
+        """Construct environment, applying snapshotting policy overrides"""
+        _env = super().construct_env(name, env)
+
+        interval = _env.get(self.SNAPSHOTTING_INTERVAL)
+        if interval is not None:
+            intervals = dict(type(self).snapshotting_intervals or {})
+            intervals[self.aggregate_class] = int(interval)
+            # Zero or a negative interval disables interval snapshotting
+            self.snapshotting_intervals = {
+                cls: n for cls, n in intervals.items() if n > 0
+            }
+
+        event_names = _env.get(self.SNAPSHOTTING_EVENTS)
+        if event_names is not None:
+            self.snapshotting_events = {
+                **type(self).snapshotting_events,
+                self.aggregate_class: tuple(
+                    getattr(self.aggregate_class, event_name.strip())
+                    for event_name in event_names.split(",")
+                    if event_name.strip()
+                ),
+            }
+
+        if (
+            self.snapshotting_intervals or any(self.snapshotting_events.values())
+        ) and _env.get("IS_SNAPSHOTTING_ENABLED") is None:
+            _env["IS_SNAPSHOTTING_ENABLED"] = "y"
+        return _env
+
+    def construct_factory(self, env: Environment) -> InfrastructureFactory:
+        if self.host is not None:
+            return self.host.factory
+        return super().construct_factory(env)
+
+    def construct_transcoder(self) -> Transcoder:
+        name = (self.env.get(self.TRANSCODER) or "json").lower()
+        if name == "json":
+            return super().construct_transcoder()
+        if name != "orjson":
+            raise ValueError(
+                f"Environment value for key '{self.TRANSCODER}' must be "
+                f"'json' or 'orjson', not '{name}'"
+            )
+        transcoder = OrjsonTranscoder()
+        self.register_transcodings(transcoder)
+        return transcoder
+
+    def construct_mapper(self) -> Mapper:
+        if self.host is not None:
+            return self.host.mapper
+        transcoder = self.construct_transcoder()
+        encoding = (self.env.get(self.EVENT_ENCODING) or "json").lower()
+        if encoding not in ("json", "compact"):
+            raise ValueError(
+                f"Environment value for key '{self.EVENT_ENCODING}' must be "
+                f"'json' or 'compact', not '{encoding}'"
+            )
+        cipher_mode = (self.env.get(self.CIPHER_MODE) or "state").lower()
+        if cipher_mode not in ("state", "fields"):
+            raise ValueError(
+                f"Environment value for key '{self.CIPHER_MODE}' must be "
+                f"'state' or 'fields', not '{cipher_mode}'"
+            )
+        if (
+            encoding == "json"
+            and cipher_mode == "state"
+            and not isinstance(transcoder, OrjsonTranscoder)
+        ):
+            return self.factory.mapper(transcoder=transcoder)
+
+        kwargs: Dict[str, Any] = {}
+        if encoding == "compact":
+            threshold = self.env.get(self.COMPRESSION_THRESHOLD)
+            kwargs["compression_threshold"] = int(threshold) if threshold else None
+        if cipher_mode == "fields":
+            kwargs["field_cipher"] = self.construct_field_cipher(transcoder)
+            cipher = None
+        else:
+            cipher = self.factory.cipher()
+        mapper_class = CompactMapper if encoding == "compact" else TypedMapper
+        return mapper_class(
+            transcoder, compressor=self.factory.compressor(), cipher=cipher, **kwargs
+        )
+
+    def construct_field_cipher(self, transcoder: Transcoder) -> FieldCipher:
+        """Construct the cipher of the encrypted fields, by default those of
+        the application, or those listed in ENCRYPTED_FIELDS"""
+        cipher_key = self.env.get("CIPHER_KEY")
+        if not cipher_key:
+            raise ValueError(f"CIPHER_KEY must be set when {self.CIPHER_MODE}=fields")
+        field_names = self.env.get(self.ENCRYPTED_FIELDS)
+        fields = (
+            [name.strip() for name in field_names.split(",") if name.strip()]
+            if field_names is not None
+            else self.encrypted_fields
+        )
+        if isinstance(transcoder, OrjsonTranscoder):
+            transcoder = transcoder.legacy
+        return FieldCipher(
+            cipher_key,
+            fields,
+            transcoder,
+            cipher_topic=self.env.get("CIPHER_TOPIC")
+            or "eventsourcing.cipher:AESCipher",
+        )
+
+    def construct_recorder(self) -> ApplicationRecorder:
+        if self.host is not None:
+            return self.host.recorder
+        recorder = super().construct_recorder()
+        if (
+            isinstance(recorder, PostgresApplicationRecorder)
+            and self.factory.env_create_table()
+        ):
+            # Created with the table, so tailers never run DDL
+            PostgresWakeup.create_trigger(recorder)
+        return recorder
+
+    def construct_snapshot_store(self) -> EventStore:
+        if self.host is not None:
+            return self.host.snapshots
+        return super().construct_snapshot_store()
+
+    @property
+    def wakeup(self) -> Wakeup:
+        """Wakeup of tailers of the notification log, constructed when first
+        used. Hosted repositories use the wakeup of their host."""
+        if self.host is not None:
+            return self.host.wakeup
+        if self._wakeup is None:
+            self._wakeup = self.construct_wakeup()
+        return self._wakeup
+
+    def construct_wakeup(self) -> Wakeup:
+        if isinstance(self.recorder, PostgresApplicationRecorder):
+            return PostgresWakeup(self.recorder)
+        return Wakeup()
+
+    def close(self) -> None:
+        # The host application closes the shared infrastructure
+        if self.host is not None:
+            self.closing.set()
+        else:
+            if self._wakeup is not None:
+                self._wakeup.close()
+            super().close()
+
     def register_transcodings(self, transcoder):
         """Register custom transcodings"""
         super().register_transcodings(transcoder)
         transcoder.register(DateTranscoding())
 
+    def construct_repository(self) -> Repository:
+        """Construct repository, counting accesses to its aggregate cache"""
+        if self.host is not None:
+            return self.host.repository
+        repository = super().construct_repository()
+        if isinstance(repository.cache, LRUCache):
+            repository.cache = CountingLRUCache(maxsize=repository.cache.maxsize)
+        return repository
+
+    def cache_stats(self) -> Optional[Dict[str, int]]:
+        """Get the hit, miss and eviction counts of the aggregate cache"""
+        cache = self.repository.cache
+        return cache.stats() if isinstance(cache, CountingLRUCache) else None
+
+    def _record(self, processing_event: ProcessingEvent) -> List[Recording]:
+        """Record events, replacing cached aggregates with their saved versions"""
+        recordings = super()._record(processing_event)
+        if self.repository.cache is not None:
+            for aggregate_id, aggregate in processing_event.aggregates.items():
+                # Copy, so the caller's later commands can't corrupt the cache
+                self.repository.cache.put(aggregate_id, deepcopy(aggregate))
+        # Tailers in this process don't wait for their next poll
+        owner = self.host or self
+        if owner._wakeup is not None:
+            owner._wakeup.notify()
+        return recordings
+
+    def _take_snapshots(self, processing_event: ProcessingEvent) -> None:
+        """Take interval snapshots, then snapshots for configured event types"""
+        super()._take_snapshots(processing_event)
+        if not self.snapshots or not self.snapshotting_events:
+            return
+
+        versions: Dict[UUID, int] = {}
+        for event in processing_event.events:
+            aggregate = processing_event.aggregates.get(event.originator_id)
+            if aggregate is None:
+                continue
+            event_types = self.snapshotting_events.get(type(aggregate), ())
+            interval = (self.snapshotting_intervals or {}).get(type(aggregate))
+            if interval and event.originator_version % interval == 0:
+                # Already snapshotted at this version
+                continue
+            if isinstance(event, event_types):
+                versions[event.originator_id] = event.originator_version
+
+        for aggregate_id, version in versions.items():
+            self.take_snapshot(aggregate_id, version=version)
+
+    def get(self, aggregate_id: Union[str, UUID]) -> Optional[Aggregate]:
+        """Get an aggregate of the repository's type, or None if there isn't one"""
+        try:
+            aggregate = self.repository.get(as_uuid(aggregate_id))
+        except AggregateNotFoundError:
+            return None
+        # Other types of aggregate share the event store in single-application mode
+        return aggregate if isinstance(aggregate, self.aggregate_class) else None
+
+    def create(self, aggregate: Aggregate) -> None:
+        """Save a new aggregate with the log events indexing it"""
+        self.save_collected(*self.collect_created(aggregate))
+
+    def create_many(self, aggregates: Iterable[Aggregate]) -> None:
+        """Save many new aggregates with the log events indexing them, all in
+        one transaction"""
+        logged = LogEvents()
+        self.save_collected(
+            *[
+                obj
+                for aggregate in aggregates
+                for obj in self.collect_created(aggregate, logged)
+            ]
+        )
+
+    def collect_created(
+        self, aggregate: Aggregate, logged: Optional[LogEvents] = None
+    ) -> List[Any]:
+        """Get a new aggregate with the log events to save along with it. Log
+        events of aggregates saved together are collected in the same LogEvents."""
+        logged = LogEvents() if logged is None else logged
+        start = len(logged.events)
+        self._log_created(aggregate, logged)
+        self._log_changed(aggregate, logged)
+        return [aggregate, *logged.events[start:]]
+
+    def collect_changed(
+        self, aggregate: Aggregate, logged: Optional[LogEvents] = None
+    ) -> List[Any]:
+        """Get a changed aggregate with the log events to save along with it"""
+        logged = LogEvents() if logged is None else logged
+        start = len(logged.events)
+        self._log_changed(aggregate, logged)
+        return [aggregate, *logged.events[start:]]
+
+    def _log_created(self, aggregate: Aggregate, logged: LogEvents) -> None:
+        """Trigger log events for a new aggregate"""
+
+    def _log_changed(self, aggregate: Aggregate, logged: LogEvents) -> None:
+        """Trigger log events for the aggregate's pending events"""
+
+    def save_collected(self, *objs: Any) -> None:
+        """Save collected aggregates and log events in one transaction. In
+        single-application mode they may be collected by other repositories."""
+        super().save(*objs)
+
+    def get_ids(self) -> Iterator[UUID]:
+        """Get the IDs of all aggregates logged by the repository"""
+        for _, aggregate_id in self.get_logged_ids():
+            yield aggregate_id
+
+    @abstractmethod
+    def get_logged_ids(self, gt: Optional[int] = None) -> Iterator[Tuple[int, UUID]]:
+        """Get the IDs of the aggregates logged by the repository after position
+        gt, with their positions in the log"""
+
+    # Maximum number of aggregates whose events are selected in one query, and
+    # of log events selected at a time when iterating over a log
+    get_many_chunk_size = 500
+
+    def iter_log(
+        self, log: EventSourcedLog, gt: Optional[int] = None
+    ) -> Iterator[DomainEvent]:
+        """Iterate over the events of a log after position gt, selecting them in
+        chunks"""
+        while True:
+            chunk = list(log.get(gt=gt, limit=self.get_many_chunk_size))
+            yield from chunk
+            if len(chunk) < self.get_many_chunk_size:
+                return
+            gt = chunk[-1].originator_version
+
+    def iter_all(self, chunk_size: Optional[int] = None) -> Iterator[Aggregate]:
+        """Iterate over all aggregates of the repository, in the order they were
+        logged. Aggregates are reconstructed lazily, chunk_size at a time, so
+        only one chunk is held in memory."""
+        for _, aggregate in self.iter_logged(chunk_size=chunk_size):
+            yield aggregate
+
+    def iter_logged(
+        self, gt: Optional[int] = None, chunk_size: Optional[int] = None
+    ) -> Iterator[Tuple[int, Aggregate]]:
+        """Iterate over the aggregates logged after position gt, with their
+        positions in the log, reconstructing them chunk_size at a time"""
+        chunk_size = chunk_size or self.get_many_chunk_size
+        logged_ids = self.get_logged_ids(gt)
+        while chunk := list(islice(logged_ids, chunk_size)):
+            aggregates = self.get_many([aggregate_id for _, aggregate_id in chunk])
+            for (position, _), aggregate in zip(chunk, aggregates):
+                if aggregate is not None:
+                    yield position, aggregate
+
+    def get_all(self) -> List[Aggregate]:
+        """Get all aggregates of the repository. Prefer iter_all for large
+        repositories."""
+        return list(self.iter_all())
+
+    def get_many(self, ids: Iterable[Union[str, UUID]]) -> List[Optional[Aggregate]]:
+        """Get aggregates for many IDs, selecting their events (and snapshots)
+        in batched queries. The result is in the order of the given IDs, with
+        None for IDs that aren't aggregates of this repository.
+
+        Like repository.get, aggregates are taken from the aggregate cache and
+        fast-forwarded, and those reconstructed are put in the cache. The others
+        are reconstructed from their latest snapshot, and only the events after
+        the cached or snapshot version are selected."""
+        ids = [as_uuid(aggregate_id) for aggregate_id in ids]
+        aggregates: Dict[UUID, Optional[Aggregate]] = {}
+        for i in range(0, len(ids), self.get_many_chunk_size):
+            chunk = list(dict.fromkeys(ids[i : i + self.get_many_chunk_size]))
+            cached = self._get_cached(chunk)
+            uncached = [
+                aggregate_id for aggregate_id in chunk if aggregate_id not in cached
+            ]
+            stored_snapshots = (
+                select_last_events_many(self.snapshots.recorder, uncached)
+                if self.snapshots
+                else {}
+            )
+            selected, gt = self._events_to_select(chunk, cached, stored_snapshots)
+            stored_events = select_events_many(self.recorder, selected, gt=gt)
+            aggregates.update(
+                self._reconstruct_many(chunk, cached, stored_snapshots, stored_events)
+            )
+        return [aggregates[aggregate_id] for aggregate_id in ids]
+
+    def _get_cached(self, ids: List[UUID]) -> Dict[UUID, Aggregate]:
+        """Get the aggregates of the IDs which are in the aggregate cache"""
+        cached: Dict[UUID, Aggregate] = {}
+        if self.repository.cache is not None:
+            for aggregate_id in ids:
+                try:
+                    cached[aggregate_id] = self.repository.cache.get(aggregate_id)
+                except KeyError:
+                    pass
+        return cached
+
+    def _events_to_select(
+        self,
+        ids: List[UUID],
+        cached: Dict[UUID, Aggregate],
+        stored_snapshots: Dict[UUID, StoredEvent],
+    ) -> Tuple[List[UUID], Dict[UUID, int]]:
+        """Get the IDs whose events are selected, and the versions after which
+        they're selected"""
+        if self.repository.fastforward or self.repository.cache is None:
+            selected = ids
+        else:
+            selected = [
+                aggregate_id for aggregate_id in ids if aggregate_id not in cached
+            ]
+        gt = {
+            aggregate_id: snapshot.originator_version
+            for aggregate_id, snapshot in stored_snapshots.items()
+        }
+        gt.update(
+            (aggregate_id, aggregate.version)
+            for aggregate_id, aggregate in cached.items()
+        )
+        return selected, gt
+
+    def _reconstruct_many(
+        self,
+        ids: List[UUID],
+        cached: Dict[UUID, Aggregate],
+        stored_snapshots: Dict[UUID, StoredEvent],
+        stored_events: Dict[UUID, List[StoredEvent]],
+    ) -> Dict[UUID, Optional[Aggregate]]:
+        """Reconstruct aggregates from their cached version or latest snapshot
+        and the events after it, putting those reconstructed in the cache"""
+        cache = self.repository.cache
+        aggregates: Dict[UUID, Optional[Aggregate]] = {}
+        for aggregate_id in ids:
+            stored = stored_events.get(aggregate_id, [])
+            if aggregate_id in stored_snapshots:
+                stored = [stored_snapshots[aggregate_id], *stored]
+            domain_events = [self.mapper.to_domain_event(e) for e in stored]
+            aggregate = cached.get(aggregate_id)
+            if not all(isinstance(e, CanMutateProtocol) for e in domain_events):
+                # e.g. the events of a log rather than an aggregate
+                aggregate = None
+            elif aggregate is None:
+                aggregate = project_aggregate(None, domain_events)
+                if cache is not None and isinstance(aggregate, self.aggregate_class):
+                    cache.put(aggregate_id, aggregate)
+            if isinstance(aggregate, self.aggregate_class):
+                if aggregate_id in cached and domain_events:
+                    # Fast-forward a copy, so other threads reading the cached
+                    # aggregate aren't affected, and cache it so the events
+                    # aren't applied again by later reads
+                    aggregate = project_aggregate(deepcopy(aggregate), domain_events)
+                    if isinstance(aggregate, self.aggregate_class):
+                        cache.put(aggregate_id, aggregate)
+                # Copy, so the caller's commands can't corrupt the cache
+                if cache is not None and self.repository.deepcopy_from_cache:
+                    aggregate = deepcopy(aggregate)
+            if not isinstance(aggregate, self.aggregate_class):
+                aggregate = None
+            aggregates[aggregate_id] = aggregate
+        return aggregates
+
+    def reindex(self, chunk_size: Optional[int] = None) -> int:
+        """Record the index log events missing for aggregates saved before the
+        repository's indexes were introduced, returning the number recorded.
+        Aggregates which are already indexed are skipped, so it can be run
+        again, e.g. after an interrupted run."""
+        chunk_size = chunk_size or self.get_many_chunk_size
+        aggregates = self.iter_all(chunk_size)
+        recorded = 0
+        while chunk := list(islice(aggregates, chunk_size)):
+            logged = LogEvents()
+            self._log_unindexed(chunk, logged)
+            if logged.events:
+                self.save_collected(*logged.events)
+                recorded += len(logged.events)
+        return recorded
+
+    def _log_unindexed(self, aggregates: List[Aggregate], logged: LogEvents) -> None:
+        """Trigger the index log events missing for the aggregates"""
+
+    def _select_index_events(
+        self, logs: Sequence[EventSourcedLog]
+    ) -> List[List[DomainEvent]]:
+        """Get the events of many index logs in one query"""
+        stored_events = select_events_many(
+            self.recorder, [log.originator_id for log in logs]
+        )
+        return self._decode_index_events(logs, stored_events)
+
+    def _decode_index_events(
+        self,
+        logs: Sequence[EventSourcedLog],
+        stored_events: Dict[UUID, List[StoredEvent]],
+    ) -> List[List[DomainEvent]]:
+        return [
+            [
+                self.mapper.to_domain_event(stored_event)
+                for stored_event in stored_events[log.originator_id]
+            ]
+            for log in logs
+        ]
+
+    def backfill_snapshots(self, min_events: int = 2) -> int:
+        """Snapshot aggregates with at least min_events events since their last
+        snapshot, returning the number of snapshots taken"""
+        if self.snapshots is None:
+            raise ValueError(f"Snapshotting is not enabled for {self.name}")
+
+        taken = 0
+        for aggregate_id in self.get_ids():
+            aggregate = self.repository.get(aggregate_id)
+            last = next(self.snapshots.get(aggregate_id, desc=True, limit=1), None)
+            snapshot_version = last.originator_version if last else 0
+            if aggregate.version - snapshot_version >= min_events:
+                self.take_snapshot(aggregate_id, version=aggregate.version)
+                taken += 1
+        return taken
+
 
 # Domain event for logging unit operations
 class UnitLogged(DomainEvent):
@@ -45,43 +672,59 @@ class TenantLogged(DomainEvent):
     tenant_id: UUID
 
 
+# Domain event for indexing tenants by their unique identification number
+class TenantIdentified(DomainEvent):
+    tenant_id: UUID
+
+
 # Domain event for logging lease operations
 class LeaseLogged(DomainEvent):
     lease_id: UUID
 
 
+# Domain event for indexing leases by unit
+class UnitLeaseLogged(DomainEvent):
+    lease_id: UUID
+
+
+# Domain events for indexing leases by tenant
+class TenantLeaseAdded(DomainEvent):
+    lease_id: UUID
+
+
+class TenantLeaseRemoved(DomainEvent):
+    lease_id: UUID
+
+
+def as_uuid(value: Union[str, UUID]) -> UUID:
+    """Normalize IDs which may have been stored as strings by the API layer"""
+    return value if isinstance(value, UUID) else UUID(str(value))
+
+
 class UnitRepository(EventSourcingApplication):
     """Repository for Unit aggregates"""
 
     name = "unit"
+    aggregate_class = Unit
+    snapshotting_intervals = {Unit: 50}
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.unit_log: EventSourcedLog[UnitLogged] = EventSourcedLog(
             self.events, uuid5(NAMESPACE_URL, "/unit_log"), UnitLogged
         )
+        self.available_units = AvailableUnitsProjection(self)
 
-    def create(self, unit: Unit) -> None:
-        logged = self.unit_log.trigger_event(unit_id=unit.id)
-        self.save(unit, logged)
+    def _log_created(self, unit: Unit, logged: LogEvents) -> None:
+        logged.trigger(self.unit_log, unit_id=unit.id)
 
     def save(self, unit: Unit, *args, **kwargs) -> None:
         # Use save() method from the Application class to save the aggregate
         super().save(unit, *args, **kwargs)
 
-    def get(self, unit_id: UUID) -> Optional[Unit]:
-        try:
-            return self.repository.get(unit_id)
-        except AggregateNotFoundError:
-            return None
-
-    def get_all(self) -> List[Unit]:
-        units = []
-        for notification in self.unit_log.get():
-            unit = self.repository.get(notification.unit_id)
-            if isinstance(unit, Unit):
-                units.append(unit)
-        return units
+    def get_logged_ids(self, gt: Optional[int] = None) -> Iterator[Tuple[int, UUID]]:
+        for notification in self.iter_log(self.unit_log, gt):
+            yield notification.originator_version, notification.unit_id
 
     def get_units(
         self,
@@ -92,47 +735,127 @@ class UnitRepository(EventSourcingApplication):
         limit: int | None = None,
     ) -> Iterator[Tuple[int, Unit]]:
         """Get units with their notification positions for cursor-based pagination."""
-        for notification in self.unit_log.get(gt=gt, lte=lte, desc=desc, limit=limit):
-            try:
-                unit = self.repository.get(notification.unit_id)
+        notifications = list(self.unit_log.get(gt=gt, lte=lte, desc=desc, limit=limit))
+        units = self.get_many(notification.unit_id for notification in notifications)
+        for notification, unit in zip(notifications, units):
+            if unit is not None:
                 yield notification.originator_version, unit
-            except KeyError:
-                continue
 
     def get_available_units(self) -> List[Unit]:
         """Get all units that are leasable and not currently leased"""
-        units = self.get_all()
-        return [unit for unit in units if unit.is_leasable and not unit.is_leased]
+        units = self.get_many(self.available_units.get_unit_ids())
+        return [unit for unit in units if unit is not None]
 
 
 class TenantRepository(EventSourcingApplication):
     """Repository for Tenant aggregates"""
 
     name = "tenant"
+    aggregate_class = Tenant
+    snapshotting_intervals = {Tenant: 50}
+    # Personal data, encrypted when CIPHER_MODE=fields
+    encrypted_fields = (
+        "identification_number",
+        "first_name",
+        "last_name",
+        "email",
+        "phone_number",
+        "dob",
+    )
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.tenant_log: EventSourcedLog[TenantLogged] = EventSourcedLog(
             self.events, uuid5(NAMESPACE_URL, "/tenant_log"), TenantLogged
         )
+        # With a cipher key, index logs are named after a keyed hash of the
+        # identification number, so the number can't be recovered from its name
+        cipher_key = self.env.get("CIPHER_KEY")
+        self.identification_key = b64decode(cipher_key) if cipher_key else None
+        self.approved_tenants = ApprovedTenantsProjection(self)
+
+    def _log_created(self, tenant: Tenant, logged: LogEvents) -> None:
+        logged.trigger(self.tenant_log, tenant_id=tenant.id)
+        # The index log only ever has a first event, so a second tenant with
+        # the same identification number conflicts when recording the events
+        logged.trigger(
+            self._identification_log(tenant.identification_number),
+            next_originator_version=Aggregate.INITIAL_VERSION,
+            tenant_id=tenant.id,
+        )
 
     def create(self, tenant: Tenant) -> None:
-        logged = self.tenant_log.trigger_event(tenant_id=tenant.id)
-        self.save(tenant, logged)
+        try:
+            super().create(tenant)
+        except IntegrityError:
+            if self.get_tenant_id_by_identification_number(
+                tenant.identification_number
+            ):
+                raise ValueError(
+                    f"Tenant with identification number {tenant.identification_number} already exists"
+                ) from None
+            raise
 
-    def get(self, tenant_id: UUID) -> Optional[Tenant]:
+    def create_many(self, tenants: Iterable[Tenant]) -> None:
+        tenants = list(tenants)
         try:
-            return self.repository.get(tenant_id)
-        except AggregateNotFoundError:
-            return None
+            super().create_many(tenants)
+        except IntegrityError:
+            numbers = [tenant.identification_number for tenant in tenants]
+            duplicates = sorted(
+                number
+                for number in set(numbers)
+                if numbers.count(number) > 1
+                or self.get_tenant_id_by_identification_number(number)
+            )
+            if duplicates:
+                raise ValueError(
+                    f"Tenants with identification numbers {', '.join(duplicates)} already exist"
+                ) from None
+            raise
 
-    def get_all(self) -> List[Tenant]:
-        tenants = []
-        for notification in self.tenant_log.get():
-            tenant = self.repository.get(notification.tenant_id)
-            if isinstance(tenant, Tenant):
-                tenants.append(tenant)
-        return tenants
+    def _identification_log(
+        self, identification_number: str
+    ) -> EventSourcedLog[TenantIdentified]:
+        name = identification_number
+        if self.identification_key is not None:
+            name = hmac.new(
+                self.identification_key, name.encode(), hashlib.sha256
+            ).hexdigest()
+        return EventSourcedLog(
+            self.events,
+            uuid5(NAMESPACE_URL, f"/tenant/identification/{name}"),
+            TenantIdentified,
+        )
+
+    def _log_unindexed(self, tenants: List[Tenant], logged: LogEvents) -> None:
+        logs = [
+            self._identification_log(tenant.identification_number) for tenant in tenants
+        ]
+        for tenant, log, index_events in zip(
+            tenants, logs, self._select_index_events(logs)
+        ):
+            # Tenants may share a number in data saved before it was unique
+            identified = (
+                index_events[0] if index_events else logged.last.get(log.originator_id)
+            )
+            if identified is None:
+                logged.trigger(
+                    log,
+                    next_originator_version=Aggregate.INITIAL_VERSION,
+                    tenant_id=tenant.id,
+                )
+            elif identified.tenant_id != tenant.id:
+                logger.warning(
+                    "Tenant %s isn't indexed, tenant %s has the same "
+                    "identification number",
+                    tenant.id,
+                    identified.tenant_id,
+                )
+
+    def get_logged_ids(self, gt: Optional[int] = None) -> Iterator[Tuple[int, UUID]]:
+        for notification in self.iter_log(self.tenant_log, gt):
+            yield notification.originator_version, notification.tenant_id
 
     def get_tenants(
         self,
@@ -143,61 +866,123 @@ class TenantRepository(EventSourcingApplication):
         limit: int | None = None,
     ) -> Iterator[Tuple[int, Tenant]]:
         """Get tenants with their notification positions for cursor-based pagination."""
-        for notification in self.tenant_log.get(gt=gt, lte=lte, desc=desc, limit=limit):
-            try:
-                tenant = self.repository.get(notification.tenant_id)
+        notifications = list(
+            self.tenant_log.get(gt=gt, lte=lte, desc=desc, limit=limit)
+        )
+        tenants = self.get_many(
+            notification.tenant_id for notification in notifications
+        )
+        for notification, tenant in zip(notifications, tenants):
+            if tenant is not None:
                 yield notification.originator_version, tenant
-            except KeyError:
-                continue
+
+    def get_tenant_id_by_identification_number(
+        self, identification_number: str
+    ) -> Optional[UUID]:
+        """Get the ID of the tenant with a unique identification number"""
+        identified = self._identification_log(identification_number).get_first()
+        return identified.tenant_id if identified else None
 
     def get_by_identification_number(
         self, identification_number: str
     ) -> Optional[Tenant]:
         """Find a tenant by their unique identification number"""
-        tenants = self.get_all()
-        for tenant in tenants:
-            if tenant.identification_number == identification_number:
-                return tenant
-        return None
+        tenant_id = self.get_tenant_id_by_identification_number(identification_number)
+        return self.get(tenant_id) if tenant_id else None
 
     def get_approved_tenants(self) -> List[Tenant]:
         """Get all tenants that have been approved"""
-        tenants = self.get_all()
-        return [tenant for tenant in tenants if tenant.is_approved]
+        tenants = self.get_many(self.approved_tenants.get_tenant_ids())
+        return [tenant for tenant in tenants if tenant is not None]
+
+    def get_approved_tenant_count(self) -> int:
+        """Get the number of tenants that have been approved"""
+        return self.approved_tenants.get_count()
 
 
 class LeaseRepository(EventSourcingApplication):
     """Repository for Lease aggregates"""
 
     name = "lease"
+    aggregate_class = Lease
+    snapshotting_intervals = {Lease: 50}
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.lease_log: EventSourcedLog[LeaseLogged] = EventSourcedLog(
             self.events, uuid5(NAMESPACE_URL, "/lease_log"), LeaseLogged
         )
+        self.active_leases = ActiveLeasesProjection(self)
 
-    def create(self, lease: Lease) -> None:
-        logged = self.lease_log.trigger_event(lease_id=lease.id)
-        self.save(lease, logged)
+    def _log_created(self, lease: Lease, logged: LogEvents) -> None:
+        logged.trigger(self.lease_log, lease_id=lease.id)
 
     def save(self, lease: Lease, *args, **kwargs) -> None:
-        # Use save() method from the Application class to save the aggregate
-        super().save(lease, *args, **kwargs)
+        # Index events are saved in the same transaction as the lease events
+        super().save(*self.collect_changed(lease), *args, **kwargs)
 
-    def get(self, lease_id: Union[str, UUID]) -> Optional[Lease]:
-        try:
-            return self.repository.get(lease_id)
-        except AggregateNotFoundError:
-            return None
+    def _unit_lease_log(
+        self, unit_id: Union[str, UUID]
+    ) -> EventSourcedLog[UnitLeaseLogged]:
+        return EventSourcedLog(
+            self.events,
+            uuid5(NAMESPACE_URL, f"/unit/{as_uuid(unit_id)}/lease_log"),
+            UnitLeaseLogged,
+        )
 
-    def get_all(self) -> List[Lease]:
-        leases = []
-        for notification in self.lease_log.get():
-            lease = self.repository.get(notification.lease_id)
-            if isinstance(lease, Lease):
-                leases.append(lease)
-        return leases
+    def _tenant_lease_log(
+        self,
+        tenant_id: Union[str, UUID],
+        logged_cls: Type[DomainEvent] = TenantLeaseAdded,
+    ) -> EventSourcedLog[DomainEvent]:
+        # Additions and removals share one log so they can be folded in order
+        return EventSourcedLog(
+            self.events,
+            uuid5(NAMESPACE_URL, f"/tenant/{as_uuid(tenant_id)}/lease_log"),
+            logged_cls,
+        )
+
+    def _log_changed(self, lease: Lease, logged: LogEvents) -> None:
+        """Trigger index log events for the lease's pending events"""
+        for event in lease.pending_events:
+            if isinstance(event, Lease.Created):
+                logged.trigger(self._unit_lease_log(event.unit_id), lease_id=lease.id)
+                for tenant_id in event.tenant_ids:
+                    logged.trigger(self._tenant_lease_log(tenant_id), lease_id=lease.id)
+            elif isinstance(event, Lease.TenantAdded):
+                logged.trigger(
+                    self._tenant_lease_log(event.tenant_id), lease_id=lease.id
+                )
+            elif isinstance(event, Lease.TenantRemoved):
+                logged.trigger(
+                    self._tenant_lease_log(event.tenant_id, TenantLeaseRemoved),
+                    lease_id=lease.id,
+                )
+
+    def _log_unindexed(self, leases: List[Lease], logged: LogEvents) -> None:
+        unit_lease_ids = self.get_lease_ids_by_unit_ids(
+            [lease.unit_id for lease in leases]
+        )
+        tenant_ids = list(
+            {
+                as_uuid(tenant_id): None
+                for lease in leases
+                for tenant_id in lease.tenant_ids
+            }
+        )
+        tenant_lease_ids = dict(
+            zip(tenant_ids, self.get_lease_ids_by_tenant_ids(tenant_ids))
+        )
+        for lease, lease_ids in zip(leases, unit_lease_ids):
+            if lease.id not in lease_ids:
+                logged.trigger(self._unit_lease_log(lease.unit_id), lease_id=lease.id)
+            for tenant_id in lease.tenant_ids:
+                if lease.id not in tenant_lease_ids[as_uuid(tenant_id)]:
+                    logged.trigger(self._tenant_lease_log(tenant_id), lease_id=lease.id)
+
+    def get_logged_ids(self, gt: Optional[int] = None) -> Iterator[Tuple[int, UUID]]:
+        for notification in self.iter_log(self.lease_log, gt):
+            yield notification.originator_version, notification.lease_id
 
     def get_leases(
         self,
@@ -208,35 +993,114 @@ class LeaseRepository(EventSourcingApplication):
         limit: int | None = None,
     ) -> Iterator[Tuple[int, Lease]]:
         """Get leases with their notification positions for cursor-based pagination."""
-        for notification in self.lease_log.get(gt=gt, lte=lte, desc=desc, limit=limit):
-            try:
-                lease = self.repository.get(notification.lease_id)
+        notifications = list(self.lease_log.get(gt=gt, lte=lte, desc=desc, limit=limit))
+        leases = self.get_many(notification.lease_id for notification in notifications)
+        for notification, lease in zip(notifications, leases):
+            if lease is not None:
                 yield notification.originator_version, lease
-            except KeyError:
-                continue
 
-    def get_by_unit_id(self, unit_id: UUID) -> List[Lease]:
-        """Find all leases for a specific unit"""
-        leases = self.get_all()
-        return [lease for lease in leases if str(lease.unit_id) == str(unit_id)]
+    def get_lease_ids_by_unit_id(self, unit_id: Union[str, UUID]) -> List[UUID]:
+        """Get the IDs of all leases for a specific unit from the unit's lease index"""
+        return self.get_lease_ids_by_unit_ids([unit_id])[0]
 
-    def get_by_tenant_id(self, tenant_id: UUID) -> List[Lease]:
-        """Find all leases for a specific tenant"""
-        leases = self.get_all()
+    def get_lease_ids_by_unit_ids(
+        self, unit_ids: Sequence[Union[str, UUID]]
+    ) -> List[List[UUID]]:
+        """Get the lease IDs of many units, reading their indexes in one query"""
+        logs = [self._unit_lease_log(unit_id) for unit_id in unit_ids]
         return [
-            lease
-            for lease in leases
-            if str(tenant_id) in [str(tid) for tid in lease.tenant_ids]
+            [logged.lease_id for logged in index_events]
+            for index_events in self._select_index_events(logs)
         ]
 
-    def get_active_leases(self) -> List[Lease]:
-        """Get all leases that are currently active (signed and within date range)"""
-        from datetime import date
+    def get_by_unit_id(self, unit_id: UUID) -> List[Lease]:
+        """Find all leases for a specific unit"""
+        leases = self.get_many(self.get_lease_ids_by_unit_id(unit_id))
+        return [lease for lease in leases if lease is not None]
+
+    def get_lease_ids_by_tenant_id(self, tenant_id: Union[str, UUID]) -> List[UUID]:
+        """Get the IDs of all leases for a specific tenant from the tenant's lease index"""
+        return self.get_lease_ids_by_tenant_ids([tenant_id])[0]
 
-        today = date.today()
-        leases = self.get_all()
+    def get_lease_ids_by_tenant_ids(
+        self, tenant_ids: Sequence[Union[str, UUID]]
+    ) -> List[List[UUID]]:
+        """Get the lease IDs of many tenants, reading their indexes in one query"""
+        logs = [self._tenant_lease_log(tenant_id) for tenant_id in tenant_ids]
         return [
-            lease
-            for lease in leases
-            if lease.signed_by_tenant and lease.start_date <= today <= lease.end_date
+            self._fold_tenant_lease_ids(index_events)
+            for index_events in self._select_index_events(logs)
         ]
+
+    @staticmethod
+    def _fold_tenant_lease_ids(index_events: List[DomainEvent]) -> List[UUID]:
+        """Get the IDs of the leases a tenant's index events leave the tenant on"""
+        lease_ids: Dict[UUID, None] = {}
+        for logged in index_events:
+            if isinstance(logged, TenantLeaseRemoved):
+                lease_ids.pop(logged.lease_id, None)
+            else:
+                lease_ids[logged.lease_id] = None
+        return list(lease_ids)
+
+    def get_by_tenant_id(self, tenant_id: UUID) -> List[Lease]:
+        """Find all leases for a specific tenant"""
+        leases = self.get_many(self.get_lease_ids_by_tenant_id(tenant_id))
+        return [lease for lease in leases if lease is not None]
+
+    def get_active_leases(self, as_of: Optional[date] = None) -> List[Lease]:
+        """Get all leases that are active (signed and within date range) on the
+        given date, by default today"""
+        leases = self.get_many(self.active_leases.get_lease_ids(as_of))
+        return [lease for lease in leases if lease is not None]
+
+
+class RentalApplication(EventSourcingApplication):
+    """Application hosting the unit, tenant and lease repositories in
+    single-application mode. All aggregates are recorded in one event store
+    with a single notification log, so aggregates of different types can be
+    saved together in one transaction."""
+
+    name = "rental"
+    aggregate_class = Aggregate
+    snapshotting_intervals = {Unit: 50, Tenant: 50, Lease: 50}
+    encrypted_fields = TenantRepository.encrypted_fields
+
+    def __init__(self, env: EnvType | None = None):
+        super().__init__(env)
+        self.units = UnitRepository(env, host=self)
+        self.tenants = TenantRepository(env, host=self)
+        self.leases = LeaseRepository(env, host=self)
+
+    # Attributes of the log events of the hosted repositories with the IDs of
+    # the logged aggregates
+    logged_id_names: ClassVar[Dict[Type[DomainEvent], str]] = {
+        UnitLogged: "unit_id",
+        TenantLogged: "tenant_id",
+        LeaseLogged: "lease_id",
+    }
+
+    def get_logged_ids(self, gt: Optional[int] = None) -> Iterator[Tuple[int, UUID]]:
+        """Get the IDs of the aggregates logged by the hosted repositories after
+        position gt, with the positions of their log events in the notification
+        log, which orders the logs of the repositories together"""
+        topics = [get_topic(logged_cls) for logged_cls in self.logged_id_names]
+        start = (gt or 0) + 1
+        while notifications := self.recorder.select_notifications(
+            start=start, limit=self.get_many_chunk_size, topics=topics
+        ):
+            for notification in notifications:
+                logged = self.mapper.to_domain_event(notification)
+                yield (
+                    notification.id,
+                    getattr(logged, self.logged_id_names[type(logged)]),
+                )
+            start = notifications[-1].id + 1
+
+    def reindex(self, chunk_size: Optional[int] = None) -> int:
+        return sum(repo.reindex(chunk_size) for repo in (self.tenants, self.leases))
+
+    def close(self) -> None:
+        for repo in (self.units, self.tenants, self.leases):
+            repo.close()
+        super().close()
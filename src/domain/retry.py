@@ -0,0 +1,62 @@
+import asyncio
+import random
+from threading import Lock
+from typing import Awaitable, Callable, Dict, TypeVar, Union
+
+from eventsourcing.persistence import IntegrityError
+
+T = TypeVar("T")
+
+
+class RetryOnConflict:
+    """Runs commands which load aggregates, change them and save them. When a
+    save conflicts with a concurrent write, the command is run again after a
+    jittered backoff, reloading the aggregates and reapplying the change."""
+
+    def __init__(
+        self,
+        max_attempts: int = 5,
+        backoff: float = 0.01,
+        max_backoff: float = 0.5,
+    ):
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.lock = Lock()
+        self.commands = 0
+        self.conflicts = 0
+        self.failures = 0
+
+    async def run(self, command: Callable[[], Awaitable[T]]) -> T:
+        """Run the command, retrying it on conflicts up to max_attempts times"""
+        with self.lock:
+            self.commands += 1
+        attempt = 1
+        while True:
+            try:
+                return await command()
+            except IntegrityError:
+                with self.lock:
+                    self.conflicts += 1
+                    exhausted = attempt >= self.max_attempts
+                    if exhausted:
+                        self.failures += 1
+                if exhausted:
+                    raise
+            # Full jitter, so concurrent retries of the same aggregate spread out
+            delay = min(self.max_backoff, self.backoff * 2 ** (attempt - 1))
+            await asyncio.sleep(random.uniform(0, delay))
+            attempt += 1
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+        """Get the number of commands, conflicts and commands that failed after
+        max_attempts, with the rate of conflicts per command"""
+        with self.lock:
+            return {
+                "commands": self.commands,
+                "conflicts": self.conflicts,
+                "failures": self.failures,
+                "conflict_rate": self.conflicts / self.commands
+                if self.commands
+                else 0.0,
+            }
@@ -0,0 +1,165 @@
+import logging
+import time
+from threading import Condition, Event, Thread
+from typing import Iterator, List, Optional
+
+import psycopg
+from eventsourcing.application import Application
+from eventsourcing.persistence import Notification
+from eventsourcing.postgres import PostgresApplicationRecorder
+
+logger = logging.getLogger(__name__)
+
+
+class Wakeup:
+    """Wakes up tailers waiting for new notifications, when events are recorded
+    in this process"""
+
+    def __init__(self):
+        self.condition = Condition()
+        self.count = 0
+
+    def notify(self) -> None:
+        with self.condition:
+            self.count += 1
+            self.condition.notify_all()
+
+    def wait(self, seen: int, timeout: float) -> bool:
+        """Wait until notified after the count was seen, returning False if the
+        timeout expired first"""
+        with self.condition:
+            return self.condition.wait_for(lambda: self.count != seen, timeout)
+
+    def close(self) -> None:
+        pass
+
+
+class PostgresWakeup(Wakeup):
+    """Also wakes up tailers when events are recorded by other processes. A
+    trigger on the events table, created with the table, notifies a channel,
+    which a thread listens to on a dedicated connection once a tailer first
+    waits."""
+
+    def __init__(self, recorder: PostgresApplicationRecorder):
+        super().__init__()
+        self.datastore = recorder.datastore
+        self.channel = self.channel_name(recorder)
+        self.closed = Event()
+        self.thread: Optional[Thread] = None
+
+    @staticmethod
+    def channel_name(recorder: PostgresApplicationRecorder) -> str:
+        return f"{recorder.events_table_name.replace('.', '_')}_recorded"
+
+    @classmethod
+    def create_trigger(cls, recorder: PostgresApplicationRecorder) -> None:
+        """Create the trigger notifying the channel when events are inserted"""
+        channel = cls.channel_name(recorder)
+        with recorder.datastore.transaction(commit=True) as curs:
+            curs.execute(
+                f"CREATE OR REPLACE FUNCTION {channel}() RETURNS trigger AS $$ "
+                f"BEGIN PERFORM pg_notify('{channel}', ''); RETURN NULL; END; "
+                "$$ LANGUAGE plpgsql"
+            )
+            curs.execute(
+                f"CREATE OR REPLACE TRIGGER {channel} AFTER INSERT ON "
+                f"{recorder.events_table_name} FOR EACH STATEMENT EXECUTE FUNCTION "
+                f"{channel}()"
+            )
+
+    def wait(self, seen: int, timeout: float) -> bool:
+        if self.thread is None:
+            self.thread = Thread(target=self.listen, daemon=True)
+            self.thread.start()
+        return super().wait(seen, timeout)
+
+    def listen(self) -> None:
+        while not self.closed.is_set():
+            try:
+                kwargs = dict(self.datastore.pool.kwargs)
+                kwargs.pop("row_factory", None)
+                get_password = getattr(self.datastore.pool, "get_password_func", None)
+                if get_password is not None:
+                    kwargs["password"] = get_password()
+                with psycopg.connect(autocommit=True, **kwargs) as conn:
+                    conn.execute(f"LISTEN {self.channel}")
+                    # Events may have been recorded while (re)connecting
+                    self.notify()
+                    while not self.closed.is_set():
+                        for _ in conn.notifies(timeout=1.0):
+                            self.notify()
+            except Exception:
+                # Tailers fall back to polling until listening again
+                logger.exception("Failed to listen on %s", self.channel)
+                self.closed.wait(1.0)
+
+    def close(self) -> None:
+        self.closed.set()
+
+
+class LogTailer:
+    """Follows the notification log of an application, getting new
+    notifications in batches as soon as they're recorded.
+
+    Rather than polling at a fixed rate, the tailer waits for the application's
+    wakeup, which is notified when events are recorded. In case a wakeup is
+    missed, e.g. for events recorded by another process without LISTEN/NOTIFY,
+    the log is also polled, every min_interval while there are new
+    notifications, backing off to every max_interval while there aren't."""
+
+    def __init__(
+        self,
+        application: Application,
+        position: int = 0,
+        batch_size: int = 500,
+        min_interval: float = 0.05,
+        max_interval: float = 1.0,
+    ):
+        self.application = application
+        self.wakeup: Wakeup = application.wakeup
+        self.position = position
+        self.batch_size = batch_size
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = min_interval
+        self.reads = 0
+
+    def seek_end(self) -> None:
+        """Skip the notifications recorded so far"""
+        self.position = self.application.recorder.max_notification_id() or 0
+
+    def read(self) -> List[Notification]:
+        """Get the next batch of notifications without waiting"""
+        self.reads += 1
+        notifications = self.application.recorder.select_notifications(
+            start=self.position + 1, limit=self.batch_size
+        )
+        if notifications:
+            self.position = notifications[-1].id
+        return notifications
+
+    def wait(self, timeout: Optional[float] = None) -> List[Notification]:
+        """Get the next batch of notifications, waiting up to timeout seconds
+        for one to be recorded, or returning an empty batch"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            seen = self.wakeup.count
+            notifications = self.read()
+            if notifications:
+                self.interval = self.min_interval
+                return notifications
+            wait = self.interval
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return notifications
+                wait = min(wait, remaining)
+            if not self.wakeup.wait(seen, wait):
+                self.interval = min(self.interval * 2, self.max_interval)
+
+    def follow(self, stop: Optional[Event] = None) -> Iterator[List[Notification]]:
+        """Iterate over batches of new notifications until stopped"""
+        while stop is None or not stop.is_set():
+            notifications = self.wait(timeout=self.max_interval)
+            if notifications:
+                yield notifications
@@ -0,0 +1,325 @@
+import hashlib
+import zlib
+from datetime import date, datetime
+from functools import partial
+from types import NoneType, UnionType
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+    Union,
+    get_args,
+    get_origin,
+)
+from typing import get_type_hints
+from uuid import UUID
+
+from eventsourcing.domain import DomainEventProtocol, Snapshot
+from eventsourcing.persistence import (
+    Cipher,
+    Compressor,
+    JSONTranscoder,
+    Mapper,
+    StoredEvent,
+    Transcoder,
+    Transcoding,
+)
+from eventsourcing.utils import get_topic, resolve_topic
+
+from .encryption import FieldCipher
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+Converter = Callable[[Any], Any]
+
+
+class OrjsonTranscoder(Transcoder):
+    """Transcoder using orjson, which encodes dates, datetimes and UUIDs
+    natively as ISO strings instead of tagged objects.
+
+    Decoded values are plain JSON, so they're converted back by TypedMapper
+    using the type hints of the events. Objects of other registered types are
+    still encoded as tagged objects, and state containing tagged objects (such
+    as events written by JSONTranscoder) is decoded by the legacy transcoder."""
+
+    def __init__(self):
+        if orjson is None:
+            raise ImportError("The orjson transcoder requires the orjson package")
+        super().__init__()
+        self.legacy = JSONTranscoder()
+
+    def register(self, transcoding: Transcoding) -> None:
+        super().register(transcoding)
+        self.legacy.register(transcoding)
+
+    def encode(self, obj: Any) -> bytes:
+        return orjson.dumps(obj, default=self._encode_obj)
+
+    def decode(self, data: bytes) -> Any:
+        if b'"_type_"' in data:
+            return self.legacy.decode(data)
+        return orjson.loads(data)
+
+    def _encode_obj(self, o: Any) -> Dict[str, Any]:
+        try:
+            transcoding = self.types[type(o)]
+        except KeyError:
+            msg = (
+                f"Object of type {type(o)} is not serializable. Please define "
+                "and register a custom transcoding for this type."
+            )
+            raise TypeError(msg) from None
+        return {"_type_": transcoding.name, "_data_": transcoding.encode(o)}
+
+
+class TypedMapper(Mapper):
+    """Mapper converting decoded ISO strings back to the dates, datetimes and
+    UUIDs declared by the type hints of the event classes.
+
+    Snapshots hold the untyped state of aggregates, so they're encoded with
+    tagged objects by the legacy transcoder of an OrjsonTranscoder. With a
+    field cipher, only the values of its fields are encrypted, rather than the
+    whole encoded state by the cipher."""
+
+    def __init__(
+        self,
+        transcoder: Transcoder,
+        compressor: Optional[Compressor] = None,
+        cipher: Optional[Cipher] = None,
+        field_cipher: Optional[FieldCipher] = None,
+    ):
+        super().__init__(transcoder, compressor=compressor, cipher=cipher)
+        self.field_cipher = field_cipher
+        self.snapshot_transcoder = (
+            transcoder.legacy
+            if isinstance(transcoder, OrjsonTranscoder)
+            else transcoder
+        )
+        self.converters: Dict[type, Dict[str, Converter]] = {}
+
+    def to_stored_event(self, domain_event: DomainEventProtocol) -> StoredEvent:
+        event_state = domain_event.__dict__.copy()
+        originator_id = event_state.pop("originator_id")
+        originator_version = event_state.pop("originator_version")
+        class_version = getattr(type(domain_event), "class_version", 1)
+        if class_version > 1:
+            event_state["class_version"] = class_version
+        if self.field_cipher is not None:
+            if isinstance(domain_event, Snapshot):
+                # Snapshots hold the fields in the state of the aggregate
+                event_state["state"] = dict(event_state["state"])
+                self.field_cipher.encrypt(originator_id, event_state["state"])
+            else:
+                self.field_cipher.encrypt(originator_id, event_state)
+        stored_state = self.encode_state(type(domain_event), event_state)
+        if self.compressor:
+            stored_state = self.compressor.compress(stored_state)
+        if self.cipher:
+            stored_state = self.cipher.encrypt(stored_state)
+        return StoredEvent(
+            originator_id=originator_id,
+            originator_version=originator_version,
+            topic=get_topic(type(domain_event)),
+            state=stored_state,
+        )
+
+    def to_domain_event(self, stored_event: StoredEvent) -> DomainEventProtocol:
+        stored_state = stored_event.state
+        if self.cipher:
+            stored_state = self.cipher.decrypt(stored_state)
+        if self.compressor:
+            stored_state = self.compressor.decompress(stored_state)
+        cls = resolve_topic(stored_event.topic)
+        event_state = self.decode_state(cls, stored_state)
+        if self.field_cipher is not None:
+            originator_id = stored_event.originator_id
+            if issubclass(cls, Snapshot):
+                self.field_cipher.decrypt(originator_id, event_state["state"])
+            else:
+                self.field_cipher.decrypt(originator_id, event_state)
+        for name, convert in self._converters(cls).items():
+            if name in event_state:
+                event_state[name] = convert(event_state[name])
+        event_state["originator_id"] = stored_event.originator_id
+        event_state["originator_version"] = stored_event.originator_version
+        class_version = getattr(cls, "class_version", 1)
+        from_version = event_state.pop("class_version", 1)
+        while from_version < class_version:
+            getattr(cls, f"upcast_v{from_version}_v{from_version + 1}")(event_state)
+            from_version += 1
+
+        domain_event = object.__new__(cls)
+        domain_event.__dict__.update(event_state)
+        return domain_event
+
+    def encode_state(self, cls: type, event_state: Dict[str, Any]) -> bytes:
+        """Encode the state of an event of the given class"""
+        if issubclass(cls, Snapshot):
+            return self.snapshot_transcoder.encode(event_state)
+        return self.transcoder.encode(event_state)
+
+    def decode_state(self, cls: type, data: bytes) -> Dict[str, Any]:
+        """Decode the state of an event of the given class"""
+        return self.transcoder.decode(data)
+
+    def _hints(self, cls: type) -> Dict[str, Any]:
+        try:
+            hints = get_type_hints(cls)
+        except NameError as e:
+            # Without the hints, values couldn't be converted or positioned
+            raise TypeError(
+                f"Can't resolve the type hints of {cls.__qualname__}: {e}"
+            ) from e
+        hints.pop("originator_id", None)
+        hints.pop("originator_version", None)
+        return hints
+
+    def _converters(self, cls: type) -> Dict[str, Converter]:
+        try:
+            return self.converters[cls]
+        except KeyError:
+            pass
+        converters = {}
+        for name, hint in self._hints(cls).items():
+            converter = _converter(hint)
+            if converter is not None:
+                converters[name] = converter
+        self.converters[cls] = converters
+        return converters
+
+
+class CompactMapper(TypedMapper):
+    """Mapper encoding the state of events as a list of values in the order of
+    the event class's fields, so field names aren't repeated in every stored
+    event. Encoded state larger than compression_threshold bytes is compressed
+    with zlib, if that makes it smaller.
+
+    The encoded state is prefixed with a marker, so state without one (written
+    by the default mapper) can still be read, followed by a fingerprint of the
+    names of the encoded fields. Fields may be added at the end of an event
+    class, whose older events are decoded without them. Decoding an event whose
+    fields were since renamed, reordered or inserted fails, rather than
+    assigning values to the wrong fields. Snapshots are encoded as by
+    TypedMapper."""
+
+    COMPACT = b"\x00C"
+    COMPRESSED = b"\x00Z"
+    FINGERPRINT_SIZE = 4
+
+    def __init__(
+        self,
+        transcoder: Transcoder,
+        compressor: Optional[Compressor] = None,
+        cipher: Optional[Cipher] = None,
+        field_cipher: Optional[FieldCipher] = None,
+        compression_threshold: Optional[int] = None,
+    ):
+        super().__init__(
+            transcoder, compressor=compressor, cipher=cipher, field_cipher=field_cipher
+        )
+        self.compression_threshold = compression_threshold
+        self.field_names: Dict[type, List[str]] = {}
+        self.fingerprints: Dict[Tuple[type, int], bytes] = {}
+
+    def encode_state(self, cls: type, event_state: Dict[str, Any]) -> bytes:
+        if issubclass(cls, Snapshot):
+            return super().encode_state(cls, event_state)
+        values = []
+        for name in self._field_names(cls):
+            if name not in event_state:
+                break
+            values.append(event_state.pop(name))
+        fingerprint = self._fingerprint(cls, len(values))
+        if event_state:
+            # Keys which aren't fields, such as class_version, follow the values
+            values.append(event_state)
+        data = self.transcoder.encode(values)
+        if self.compression_threshold is not None:
+            if len(data) > self.compression_threshold:
+                compressed = zlib.compress(data)
+                if len(compressed) < len(data):
+                    return self.COMPRESSED + fingerprint + compressed
+        return self.COMPACT + fingerprint + data
+
+    def decode_state(self, cls: type, data: bytes) -> Dict[str, Any]:
+        marker, fingerprint, data = (
+            data[: len(self.COMPACT)],
+            data[len(self.COMPACT) : len(self.COMPACT) + self.FINGERPRINT_SIZE],
+            data[len(self.COMPACT) + self.FINGERPRINT_SIZE :],
+        )
+        if marker == self.COMPRESSED:
+            data = zlib.decompress(data)
+        elif marker != self.COMPACT:
+            return super().decode_state(cls, marker + fingerprint + data)
+        values = self.transcoder.decode(data)
+        names = self._field_names(cls)
+        extra = {}
+        if fingerprint != self._fingerprint(cls, len(values)):
+            # The last value may be the keys which aren't fields
+            if not (
+                values
+                and isinstance(values[-1], dict)
+                and fingerprint == self._fingerprint(cls, len(values) - 1)
+            ):
+                raise ValueError(
+                    f"Fields of {cls.__qualname__} don't match those its event "
+                    f"was encoded with: {', '.join(names)}"
+                )
+            extra = values.pop()
+        return {**dict(zip(names, values)), **extra}
+
+    def _field_names(self, cls: type) -> List[str]:
+        try:
+            return self.field_names[cls]
+        except KeyError:
+            names = self.field_names[cls] = list(self._hints(cls))
+            return names
+
+    def _fingerprint(self, cls: type, count: int) -> bytes:
+        """Get the fingerprint of the names of the first count fields"""
+        try:
+            return self.fingerprints[cls, count]
+        except KeyError:
+            names = self._field_names(cls)
+            if count > len(names):
+                fingerprint = b""
+            else:
+                fingerprint = hashlib.sha256(",".join(names[:count]).encode()).digest()[
+                    : self.FINGERPRINT_SIZE
+                ]
+            self.fingerprints[cls, count] = fingerprint
+            return fingerprint
+
+
+def _converter(hint: Any) -> Optional[Converter]:
+    """Get a function converting a decoded value to the hinted type, or None if
+    decoded values are already of the hinted type"""
+    origin = get_origin(hint)
+    if origin in (Union, UnionType):
+        args = [arg for arg in get_args(hint) if arg is not NoneType]
+        return _converter(args[0]) if len(args) == 1 else None
+    if origin in (list, List):
+        args = get_args(hint)
+        item_converter = _converter(args[0]) if args else None
+        return partial(_convert_list, item_converter) if item_converter else None
+    if hint is datetime:
+        return _convert(datetime.fromisoformat)
+    if hint is date:
+        return _convert(date.fromisoformat)
+    if hint is UUID:
+        return _convert(UUID)
+    return None
+
+
+def _convert(parse: Callable[[str], Any]) -> Converter:
+    return lambda value: parse(value) if isinstance(value, str) else value
+
+
+def _convert_list(convert: Converter, values: Any) -> Any:
+    return [convert(value) for value in values] if isinstance(values, list) else values
@@ -0,0 +1,44 @@
+from typing import Any, Dict, List, Tuple
+
+from eventsourcing.domain import Aggregate
+
+from .repositories import EventSourcingApplication, LogEvents
+
+
+class UnitOfWork:
+    """Aggregates changed by one command, saved together on commit.
+
+    The pending events of the aggregates (and the log events indexing them)
+    are recorded in one transaction per event store. In single-application
+    mode the repositories share one event store, so all the changes are
+    recorded atomically. Otherwise each repository records its own changes,
+    in the order they were added."""
+
+    def __init__(self):
+        self.pending: List[Tuple[EventSourcingApplication, Aggregate, bool]] = []
+
+    def create(self, repo: EventSourcingApplication, aggregate: Aggregate) -> None:
+        """Add a new aggregate to be created by the repository"""
+        self.pending.append((repo, aggregate, True))
+
+    def save(self, repo: EventSourcingApplication, aggregate: Aggregate) -> None:
+        """Add a changed aggregate to be saved by the repository"""
+        self.pending.append((repo, aggregate, False))
+
+    def commit(self) -> None:
+        """Save the added aggregates, grouped by event store"""
+        groups: Dict[int, Tuple[EventSourcingApplication, List[Any]]] = {}
+        logged: Dict[int, LogEvents] = {}
+        for repo, aggregate, created in self.pending:
+            # Log events of the same repository are numbered in sequence
+            repo_logged = logged.setdefault(id(repo), LogEvents())
+            objs = (
+                repo.collect_created(aggregate, repo_logged)
+                if created
+                else repo.collect_changed(aggregate, repo_logged)
+            )
+            groups.setdefault(id(repo.recorder), (repo, []))[1].extend(objs)
+
+        for repo, objs in groups.values():
+            repo.save_collected(*objs)
+        self.pending = []
@@ -0,0 +1,65 @@
+from datetime import date
+from typing import Dict, List, Optional, Set
+from uuid import UUID
+
+from strawberry.dataloader import DataLoader
+
+from ..domain.models import Unit, Tenant, Lease
+from ..domain.async_repositories import (
+    AsyncUnitRepository,
+    AsyncTenantRepository,
+    AsyncLeaseRepository,
+)
+from ..domain.repositories import as_uuid
+
+
+def create_loaders(
+    unit_repo: AsyncUnitRepository,
+    tenant_repo: AsyncTenantRepository,
+    lease_repo: AsyncLeaseRepository,
+) -> Dict[str, DataLoader]:
+    """Create per-request DataLoaders which batch and dedupe repository reads"""
+
+    async def load_units(ids: List[str]) -> List[Optional[Unit]]:
+        return await unit_repo.get_many(ids)
+
+    async def load_tenants(ids: List[str]) -> List[Optional[Tenant]]:
+        return await tenant_repo.get_many(ids)
+
+    async def load_leases_by_unit(unit_ids: List[str]) -> List[List[Lease]]:
+        return await _load_leases(await lease_repo.get_lease_ids_by_unit_ids(unit_ids))
+
+    async def load_leases_by_tenant(tenant_ids: List[str]) -> List[List[Lease]]:
+        return await _load_leases(
+            await lease_repo.get_lease_ids_by_tenant_ids(tenant_ids)
+        )
+
+    async def load_active_lease_ids(dates: List[date]) -> List[Set[UUID]]:
+        return [set(await lease_repo.get_active_lease_ids(as_of)) for as_of in dates]
+
+    async def _load_leases(lease_ids_per_key: List[List]) -> List[List[Lease]]:
+        # Get the leases of all keys at once
+        lease_ids = list(
+            dict.fromkeys(
+                lease_id for lease_ids in lease_ids_per_key for lease_id in lease_ids
+            )
+        )
+        leases = dict(zip(lease_ids, await lease_repo.get_many(lease_ids)))
+        return [
+            [leases[lease_id] for lease_id in lease_ids if leases[lease_id]]
+            for lease_ids in lease_ids_per_key
+        ]
+
+    # IDs may be given as strings or UUIDs
+    return {
+        "unit_loader": DataLoader(load_fn=load_units, cache_key_fn=as_uuid),
+        "tenant_loader": DataLoader(load_fn=load_tenants, cache_key_fn=as_uuid),
+        "leases_by_unit_loader": DataLoader(
+            load_fn=load_leases_by_unit, cache_key_fn=as_uuid
+        ),
+        "leases_by_tenant_loader": DataLoader(
+            load_fn=load_leases_by_tenant, cache_key_fn=as_uuid
+        ),
+        # Active lease IDs on a date, computed once per request and date
+        "active_lease_ids_loader": DataLoader(load_fn=load_active_lease_ids),
+    }
@@ -1,10 +1,25 @@
 import strawberry
-from typing import List, Optional
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from typing import (
+    AsyncGenerator,
+    Awaitable,
+    Callable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    TypeVar,
+)
 from datetime import datetime, date
 from uuid import UUID
 
 # Import our domain models and repositories
 from ..domain.models import Unit, Tenant, Lease
+from ..domain.repositories import as_uuid
+from ..domain.export import jsonable
+from ..domain.unit_of_work import UnitOfWork
+from eventsourcing.domain import DomainEvent
+from strawberry.scalars import JSON
 from strawberry.types import Info
 
 
@@ -20,20 +35,18 @@ class UnitType:
     created_at: datetime
 
     @strawberry.field
-    def leases(self, info: Info) -> List["LeaseType"]:
-        repo = info.context["lease_repo"]
-        return repo.get_by_unit_id(UUID(self.id))
+    async def leases(self, info: Info) -> List["LeaseType"]:
+        return await info.context["leases_by_unit_loader"].load(self.id)
 
     @strawberry.field
-    def active_lease(self, info: Info) -> Optional["LeaseType"]:
-        repo = info.context["lease_repo"]
-        leases = repo.get_by_unit_id(UUID(self.id))
-        today = date.today()
-        active_leases = [
-            lease
-            for lease in leases
-            if lease.signed_by_tenant and lease.start_date <= today <= lease.end_date
-        ]
+    async def active_lease(
+        self, info: Info, as_of: Optional[date] = None
+    ) -> Optional["LeaseType"]:
+        leases = await info.context["leases_by_unit_loader"].load(self.id)
+        active_lease_ids = await info.context["active_lease_ids_loader"].load(
+            as_of or date.today()
+        )
+        active_leases = [lease for lease in leases if lease.id in active_lease_ids]
         return active_leases[0] if active_leases else None
 
 
@@ -54,20 +67,18 @@ class TenantType:
         return f"{self.first_name} {self.last_name}"
 
     @strawberry.field
-    def leases(self, info: Info) -> List["LeaseType"]:
-        repo = info.context["lease_repo"]
-        return repo.get_by_tenant_id(UUID(self.id))
+    async def leases(self, info: Info) -> List["LeaseType"]:
+        return await info.context["leases_by_tenant_loader"].load(self.id)
 
     @strawberry.field
-    def active_leases(self, info: Info) -> List["LeaseType"]:
-        repo = info.context["lease_repo"]
-        all_tenant_leases = repo.get_by_tenant_id(UUID(self.id))
-        today = date.today()
-        return [
-            lease
-            for lease in all_tenant_leases
-            if lease.signed_by_tenant and lease.start_date <= today <= lease.end_date
-        ]
+    async def active_leases(
+        self, info: Info, as_of: Optional[date] = None
+    ) -> List["LeaseType"]:
+        all_tenant_leases = await info.context["leases_by_tenant_loader"].load(self.id)
+        active_lease_ids = await info.context["active_lease_ids_loader"].load(
+            as_of or date.today()
+        )
+        return [lease for lease in all_tenant_leases if lease.id in active_lease_ids]
 
 
 @strawberry.type
@@ -82,18 +93,14 @@ class LeaseType:
     tenant_ids: List[strawberry.ID]
 
     @strawberry.field
-    def unit(self, info: Info) -> Optional[UnitType]:
-        repo = info.context["unit_repo"]
-        return repo.get(UUID(self.unit_id))
+    async def unit(self, info: Info) -> Optional[UnitType]:
+        return await info.context["unit_loader"].load(self.unit_id)
 
     @strawberry.field
-    def tenants(self, info: Info) -> List[TenantType]:
-        repo = info.context["tenant_repo"]
-        return [
-            repo.get(UUID(tenant_id))
-            for tenant_id in self.tenant_ids
-            if repo.get(UUID(tenant_id))
-        ]
+    async def tenants(self, info: Info) -> List[TenantType]:
+        # All tenants are fetched in one batch, skipping any that don't exist
+        tenants = await info.context["tenant_loader"].load_many(self.tenant_ids)
+        return [tenant for tenant in tenants if tenant]
 
     @strawberry.field
     def is_active(self) -> bool:
@@ -101,6 +108,134 @@ class LeaseType:
         return self.signed_by_tenant and self.start_date <= today <= self.end_date
 
 
+@strawberry.type
+class DomainEventType:
+    aggregate_id: strawberry.ID
+    version: int
+    type: str
+    timestamp: datetime
+    data: JSON
+
+    @classmethod
+    def from_event(cls, event: DomainEvent) -> "DomainEventType":
+        data = dict(vars(event))
+        for name in ("originator_id", "originator_version", "timestamp"):
+            data.pop(name, None)
+        return cls(
+            aggregate_id=strawberry.ID(str(event.originator_id)),
+            version=event.originator_version,
+            type=type(event).__qualname__,
+            timestamp=event.timestamp,
+            data=jsonable(data),
+        )
+
+
+# Connection types for cursor-based pagination
+@strawberry.type
+class PageInfo:
+    has_next_page: bool
+    has_previous_page: bool
+    start_cursor: Optional[str]
+    end_cursor: Optional[str]
+
+
+@strawberry.type
+class UnitEdge:
+    cursor: str
+    node: UnitType
+
+
+@strawberry.type
+class UnitConnection:
+    edges: List[UnitEdge]
+    page_info: PageInfo
+
+
+@strawberry.type
+class TenantEdge:
+    cursor: str
+    node: TenantType
+
+
+@strawberry.type
+class TenantConnection:
+    edges: List[TenantEdge]
+    page_info: PageInfo
+
+
+@strawberry.type
+class LeaseEdge:
+    cursor: str
+    node: LeaseType
+
+
+@strawberry.type
+class LeaseConnection:
+    edges: List[LeaseEdge]
+    page_info: PageInfo
+
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+T = TypeVar("T")
+
+
+def encode_cursor(kind: str, position: int) -> str:
+    """Encode a log position as an opaque cursor"""
+    return urlsafe_b64encode(f"{kind}:{position}".encode()).decode()
+
+
+def decode_cursor(kind: str, cursor: str) -> int:
+    """Decode an opaque cursor back to a log position"""
+    try:
+        cursor_kind, position = urlsafe_b64decode(cursor.encode()).decode().split(":")
+        if cursor_kind != kind:
+            raise ValueError
+        return int(position)
+    except ValueError:
+        raise ValueError(f"Invalid cursor: {cursor}") from None
+
+
+async def paginate(
+    kind: str,
+    get_page: Callable[..., Awaitable[List[Tuple[int, T]]]],
+    first: Optional[int],
+    after: Optional[str],
+    last: Optional[int],
+    before: Optional[str],
+) -> Tuple[List[Tuple[str, T]], PageInfo]:
+    """Select a page of (cursor, item) pairs from a repository's log positions"""
+    if first is not None and last is not None:
+        raise ValueError("Use either first or last, not both")
+    size = last if last is not None else first
+    if size is None:
+        size = DEFAULT_PAGE_SIZE
+    if not 0 <= size <= MAX_PAGE_SIZE:
+        raise ValueError(f"Page size must be between 0 and {MAX_PAGE_SIZE}")
+
+    gt = decode_cursor(kind, after) if after else None
+    lte = decode_cursor(kind, before) - 1 if before else None
+
+    # Select one more item than requested to tell whether there are more
+    backwards = last is not None
+    items = await get_page(gt=gt, lte=lte, desc=backwards, limit=size + 1)
+    has_more = len(items) > size
+    items = items[:size]
+    if backwards:
+        items.reverse()
+
+    edges = [(encode_cursor(kind, position), item) for position, item in items]
+    page_info = PageInfo(
+        # Log positions start at 1, so there are items before any position above 0
+        has_next_page=has_more if not backwards else lte is not None,
+        has_previous_page=has_more if backwards else bool(gt),
+        start_cursor=edges[0][0] if edges else None,
+        end_cursor=edges[-1][0] if edges else None,
+    )
+    return edges, page_info
+
+
 # Input types for mutations - Rental Management
 @strawberry.input
 class UnitInput:
@@ -132,56 +267,144 @@ class LeaseInput:
 class Query:
     # Rental Management Queries
     @strawberry.field
-    def unit(self, info: Info, id: strawberry.ID) -> Optional[UnitType]:
+    async def unit(self, info: Info, id: strawberry.ID) -> Optional[UnitType]:
+        repo = info.context["unit_repo"]
+        return await repo.get(UUID(id))
+
+    @strawberry.field
+    async def units(self, info: Info) -> List[UnitType]:
         repo = info.context["unit_repo"]
-        return repo.get(UUID(id))
+        return await repo.get_all()
 
     @strawberry.field
-    def units(self, info: Info) -> List[UnitType]:
+    async def units_connection(
+        self,
+        info: Info,
+        first: Optional[int] = None,
+        after: Optional[str] = None,
+        last: Optional[int] = None,
+        before: Optional[str] = None,
+    ) -> UnitConnection:
         repo = info.context["unit_repo"]
-        return repo.get_all()
+        edges, page_info = await paginate(
+            "unit", repo.get_units, first, after, last, before
+        )
+        return UnitConnection(
+            edges=[UnitEdge(cursor=cursor, node=unit) for cursor, unit in edges],
+            page_info=page_info,
+        )
 
     @strawberry.field
-    def available_units(self, info: Info) -> List[UnitType]:
+    async def available_units(self, info: Info) -> List[UnitType]:
         repo = info.context["unit_repo"]
-        return repo.get_available_units()
+        return await repo.get_available_units()
 
     @strawberry.field
-    def tenant(self, info: Info, id: strawberry.ID) -> Optional[TenantType]:
+    async def tenant(self, info: Info, id: strawberry.ID) -> Optional[TenantType]:
         repo = info.context["tenant_repo"]
-        return repo.get(UUID(id))
+        return await repo.get(UUID(id))
 
     @strawberry.field
-    def tenant_by_identification(
+    async def tenant_by_identification(
         self, info: Info, identification_number: str
     ) -> Optional[TenantType]:
         repo = info.context["tenant_repo"]
-        return repo.get_by_identification_number(identification_number)
+        return await repo.get_by_identification_number(identification_number)
+
+    @strawberry.field
+    async def tenants(self, info: Info) -> List[TenantType]:
+        repo = info.context["tenant_repo"]
+        return await repo.get_all()
+
+    @strawberry.field
+    async def tenants_connection(
+        self,
+        info: Info,
+        first: Optional[int] = None,
+        after: Optional[str] = None,
+        last: Optional[int] = None,
+        before: Optional[str] = None,
+    ) -> TenantConnection:
+        repo = info.context["tenant_repo"]
+        edges, page_info = await paginate(
+            "tenant", repo.get_tenants, first, after, last, before
+        )
+        return TenantConnection(
+            edges=[TenantEdge(cursor=cursor, node=tenant) for cursor, tenant in edges],
+            page_info=page_info,
+        )
 
     @strawberry.field
-    def tenants(self, info: Info) -> List[TenantType]:
+    async def approved_tenants(self, info: Info) -> List[TenantType]:
         repo = info.context["tenant_repo"]
-        return repo.get_all()
+        return await repo.get_approved_tenants()
 
     @strawberry.field
-    def approved_tenants(self, info: Info) -> List[TenantType]:
+    async def approved_tenants_count(self, info: Info) -> int:
         repo = info.context["tenant_repo"]
-        return repo.get_approved_tenants()
+        return await repo.get_approved_tenant_count()
 
     @strawberry.field
-    def lease(self, info: Info, id: strawberry.ID) -> Optional[LeaseType]:
+    async def lease(self, info: Info, id: strawberry.ID) -> Optional[LeaseType]:
         repo = info.context["lease_repo"]
-        return repo.get(UUID(id))
+        return await repo.get(UUID(id))
 
     @strawberry.field
-    def leases(self, info: Info) -> List[LeaseType]:
+    async def leases(self, info: Info) -> List[LeaseType]:
         repo = info.context["lease_repo"]
-        return repo.get_all()
+        return await repo.get_all()
 
     @strawberry.field
-    def active_leases(self, info: Info) -> List[LeaseType]:
+    async def leases_connection(
+        self,
+        info: Info,
+        first: Optional[int] = None,
+        after: Optional[str] = None,
+        last: Optional[int] = None,
+        before: Optional[str] = None,
+    ) -> LeaseConnection:
         repo = info.context["lease_repo"]
-        return repo.get_active_leases()
+        edges, page_info = await paginate(
+            "lease", repo.get_leases, first, after, last, before
+        )
+        return LeaseConnection(
+            edges=[LeaseEdge(cursor=cursor, node=lease) for cursor, lease in edges],
+            page_info=page_info,
+        )
+
+    @strawberry.field
+    async def active_leases(
+        self, info: Info, as_of: Optional[date] = None
+    ) -> List[LeaseType]:
+        repo = info.context["lease_repo"]
+        return await repo.get_active_leases(as_of)
+
+
+async def validate_lease_inputs(info: Info, inputs: List[LeaseInput]) -> None:
+    """Check that the units of the leases exist and are leasable, and that
+    their tenants exist and are approved"""
+    unit_ids = list(dict.fromkeys(input.unit_id for input in inputs))
+    units = dict(zip(unit_ids, await info.context["unit_repo"].get_many(unit_ids)))
+    tenant_ids = list(
+        dict.fromkeys(tenant_id for input in inputs for tenant_id in input.tenant_ids)
+    )
+    tenants = dict(
+        zip(tenant_ids, await info.context["tenant_repo"].get_many(tenant_ids))
+    )
+
+    for input in inputs:
+        unit = units[input.unit_id]
+        if not unit:
+            raise ValueError(f"Unit with ID {input.unit_id} not found")
+        if not unit.is_leasable:
+            raise ValueError(f"Unit with ID {input.unit_id} is not leasable")
+
+        for tenant_id in input.tenant_ids:
+            tenant = tenants[tenant_id]
+            if not tenant:
+                raise ValueError(f"Tenant with ID {tenant_id} not found")
+            if not tenant.is_approved:
+                raise ValueError(f"Tenant with ID {tenant_id} is not approved")
 
 
 # Mutation resolvers
@@ -189,95 +412,162 @@ class Query:
 class Mutation:
     # Rental Management Mutations
     @strawberry.mutation
-    def create_unit(self, info: Info, input: UnitInput) -> UnitType:
+    async def create_unit(self, info: Info, input: UnitInput) -> UnitType:
         repo = info.context["unit_repo"]
-        unit = Unit.create(
-            address=input.address, amenities=input.amenities, built_in=input.built_in
-        )
-        repo.create(unit)
-        return unit
+
+        async def command() -> Unit:
+            unit = Unit.create(
+                address=input.address,
+                amenities=input.amenities,
+                built_in=input.built_in,
+            )
+            await repo.create(unit)
+            return unit
+
+        return await info.context["retry"].run(command)
+
+    @strawberry.mutation
+    async def create_units(self, info: Info, inputs: List[UnitInput]) -> List[UnitType]:
+        repo = info.context["unit_repo"]
+
+        async def command() -> List[Unit]:
+            # All units are saved in one transaction
+            units = [
+                Unit.create(
+                    address=input.address,
+                    amenities=input.amenities,
+                    built_in=input.built_in,
+                )
+                for input in inputs
+            ]
+            await repo.create_many(units)
+            return units
+
+        return await info.context["retry"].run(command)
 
     @strawberry.mutation
-    def update_unit_amenities(
+    async def update_unit_amenities(
         self, info: Info, id: strawberry.ID, amenities: List[str]
     ) -> UnitType:
         repo = info.context["unit_repo"]
-        unit = repo.get(UUID(id))
-        if not unit:
-            raise ValueError(f"Unit with ID {id} not found")
 
-        unit.update_amenities(amenities)
-        repo.save(unit)
-        return unit
+        async def command() -> Unit:
+            unit = await repo.get(UUID(id))
+            if not unit:
+                raise ValueError(f"Unit with ID {id} not found")
+
+            unit.update_amenities(amenities)
+            await repo.save(unit)
+            return unit
+
+        return await info.context["retry"].run(command)
 
     @strawberry.mutation
-    def mark_unit_as_leased(self, info: Info, id: strawberry.ID) -> UnitType:
+    async def mark_unit_as_leased(self, info: Info, id: strawberry.ID) -> UnitType:
         repo = info.context["unit_repo"]
-        unit = repo.get(UUID(id))
-        if not unit:
-            raise ValueError(f"Unit with ID {id} not found")
 
-        unit.mark_as_leased()
-        repo.save(unit)
-        return unit
+        async def command() -> Unit:
+            unit = await repo.get(UUID(id))
+            if not unit:
+                raise ValueError(f"Unit with ID {id} not found")
+
+            unit.mark_as_leased()
+            await repo.save(unit)
+            return unit
+
+        return await info.context["retry"].run(command)
 
     @strawberry.mutation
-    def mark_unit_as_available(self, info: Info, id: strawberry.ID) -> UnitType:
+    async def mark_unit_as_available(self, info: Info, id: strawberry.ID) -> UnitType:
         repo = info.context["unit_repo"]
-        unit = repo.get(UUID(id))
-        if not unit:
-            raise ValueError(f"Unit with ID {id} not found")
 
-        unit.mark_as_available()
-        repo.save(unit)
-        return unit
+        async def command() -> Unit:
+            unit = await repo.get(UUID(id))
+            if not unit:
+                raise ValueError(f"Unit with ID {id} not found")
+
+            unit.mark_as_available()
+            await repo.save(unit)
+            return unit
+
+        return await info.context["retry"].run(command)
 
     @strawberry.mutation
-    def create_tenant(self, info: Info, input: TenantInput) -> TenantType:
+    async def create_tenant(self, info: Info, input: TenantInput) -> TenantType:
         repo = info.context["tenant_repo"]
 
-        # Check if tenant with same identification number already exists
-        existing_tenant = repo.get_by_identification_number(input.identification_number)
-        if existing_tenant:
-            raise ValueError(
-                f"Tenant with identification number {input.identification_number} already exists"
+        async def command() -> Tenant:
+            tenant = Tenant.create(
+                identification_number=input.identification_number,
+                first_name=input.first_name,
+                last_name=input.last_name,
+                email=input.email,
+                phone_number=input.phone_number,
+                dob=input.dob,
             )
+            # Raises if a tenant with the same identification number already exists
+            await repo.create(tenant)
+            return tenant
 
-        tenant = Tenant.create(
-            identification_number=input.identification_number,
-            first_name=input.first_name,
-            last_name=input.last_name,
-            email=input.email,
-            phone_number=input.phone_number,
-            dob=input.dob,
-        )
-        repo.create(tenant)
-        return tenant
+        return await info.context["retry"].run(command)
 
     @strawberry.mutation
-    def approve_tenant(self, info: Info, id: strawberry.ID) -> TenantType:
+    async def create_tenants(
+        self, info: Info, inputs: List[TenantInput]
+    ) -> List[TenantType]:
         repo = info.context["tenant_repo"]
-        tenant = repo.get(UUID(id))
-        if not tenant:
-            raise ValueError(f"Tenant with ID {id} not found")
 
-        tenant.approve()
-        repo.save(tenant)
-        return tenant
+        async def command() -> List[Tenant]:
+            # All tenants are saved in one transaction, or none if any
+            # identification number is already taken
+            tenants = [
+                Tenant.create(
+                    identification_number=input.identification_number,
+                    first_name=input.first_name,
+                    last_name=input.last_name,
+                    email=input.email,
+                    phone_number=input.phone_number,
+                    dob=input.dob,
+                )
+                for input in inputs
+            ]
+            await repo.create_many(tenants)
+            return tenants
+
+        return await info.context["retry"].run(command)
 
     @strawberry.mutation
-    def disapprove_tenant(self, info: Info, id: strawberry.ID) -> TenantType:
+    async def approve_tenant(self, info: Info, id: strawberry.ID) -> TenantType:
         repo = info.context["tenant_repo"]
-        tenant = repo.get(UUID(id))
-        if not tenant:
-            raise ValueError(f"Tenant with ID {id} not found")
 
-        tenant.disapprove()
-        repo.save(tenant)
-        return tenant
+        async def command() -> Tenant:
+            tenant = await repo.get(UUID(id))
+            if not tenant:
+                raise ValueError(f"Tenant with ID {id} not found")
+
+            tenant.approve()
+            await repo.save(tenant)
+            return tenant
+
+        return await info.context["retry"].run(command)
 
     @strawberry.mutation
-    def update_tenant_contact(
+    async def disapprove_tenant(self, info: Info, id: strawberry.ID) -> TenantType:
+        repo = info.context["tenant_repo"]
+
+        async def command() -> Tenant:
+            tenant = await repo.get(UUID(id))
+            if not tenant:
+                raise ValueError(f"Tenant with ID {id} not found")
+
+            tenant.disapprove()
+            await repo.save(tenant)
+            return tenant
+
+        return await info.context["retry"].run(command)
+
+    @strawberry.mutation
+    async def update_tenant_contact(
         self,
         info: Info,
         id: strawberry.ID,
@@ -285,73 +575,148 @@ class Mutation:
         phone_number: Optional[str] = None,
     ) -> TenantType:
         repo = info.context["tenant_repo"]
-        tenant = repo.get(UUID(id))
-        if not tenant:
-            raise ValueError(f"Tenant with ID {id} not found")
 
-        tenant.update_contact_info(email=email, phone_number=phone_number)
-        repo.save(tenant)
-        return tenant
+        async def command() -> Tenant:
+            tenant = await repo.get(UUID(id))
+            if not tenant:
+                raise ValueError(f"Tenant with ID {id} not found")
 
-    @strawberry.mutation
-    def create_lease(self, info: Info, input: LeaseInput) -> LeaseType:
-        # Validate unit exists
-        unit_repo = info.context["unit_repo"]
-        unit = unit_repo.get(UUID(input.unit_id))
-        if not unit:
-            raise ValueError(f"Unit with ID {input.unit_id} not found")
+            tenant.update_contact_info(email=email, phone_number=phone_number)
+            await repo.save(tenant)
+            return tenant
 
-        if not unit.is_leasable:
-            raise ValueError(f"Unit with ID {input.unit_id} is not leasable")
+        return await info.context["retry"].run(command)
 
-        # Validate all tenants exist and are approved
-        tenant_repo = info.context["tenant_repo"]
-        for tenant_id in input.tenant_ids:
-            tenant = tenant_repo.get(UUID(tenant_id))
-            if not tenant:
-                raise ValueError(f"Tenant with ID {tenant_id} not found")
-            if not tenant.is_approved:
-                raise ValueError(f"Tenant with ID {tenant_id} is not approved")
+    @strawberry.mutation
+    async def create_lease(self, info: Info, input: LeaseInput) -> LeaseType:
+        async def command() -> Lease:
+            await validate_lease_inputs(info, [input])
+
+            # Create the lease, with its index log events, in one transaction
+            lease_repo = info.context["lease_repo"]
+            lease = Lease.create(
+                unit_id=input.unit_id,
+                tenant_ids=input.tenant_ids,
+                start_date=input.start_date,
+                end_date=input.end_date,
+            )
+            unit_of_work = UnitOfWork()
+            unit_of_work.create(lease_repo.repo, lease)
+            await lease_repo.run(unit_of_work.commit)
+            return lease
 
-        # Create the lease
-        lease_repo = info.context["lease_repo"]
-        lease = Lease.create(
-            unit_id=input.unit_id,
-            tenant_ids=input.tenant_ids,
-            start_date=input.start_date,
-            end_date=input.end_date,
-        )
-        lease_repo.create(lease)
-        return lease
+        return await info.context["retry"].run(command)
 
     @strawberry.mutation
-    def sign_lease(self, info: Info, id: strawberry.ID) -> LeaseType:
-        lease_repo = info.context["lease_repo"]
-        lease = lease_repo.get(UUID(id))
-        if not lease:
-            raise ValueError(f"Lease with ID {id} not found")
-
-        lease.sign_by_tenant()
-        lease_repo.save(lease)
-
-        # When lease is signed, mark the unit as leased
-        unit_repo = info.context["unit_repo"]
-        unit = unit_repo.get(UUID(lease.unit_id))
-        if unit:
-            unit.mark_as_leased()
-            unit_repo.save(unit)
+    async def create_leases(
+        self, info: Info, inputs: List[LeaseInput]
+    ) -> List[LeaseType]:
+        repo = info.context["lease_repo"]
+
+        async def command() -> List[Lease]:
+            await validate_lease_inputs(info, inputs)
+
+            # All leases are saved with their index log events in one transaction
+            leases = [
+                Lease.create(
+                    unit_id=input.unit_id,
+                    tenant_ids=input.tenant_ids,
+                    start_date=input.start_date,
+                    end_date=input.end_date,
+                )
+                for input in inputs
+            ]
+            await repo.create_many(leases)
+            return leases
 
-        return lease
+        return await info.context["retry"].run(command)
 
     @strawberry.mutation
-    def update_unit_built_in(
+    async def sign_lease(self, info: Info, id: strawberry.ID) -> LeaseType:
+        async def command() -> Lease:
+            lease_repo = info.context["lease_repo"]
+            lease = await lease_repo.get(UUID(id))
+            if not lease:
+                raise ValueError(f"Lease with ID {id} not found")
+
+            # Changes already recorded by a retried attempt aren't applied again,
+            # since without a shared event store the lease may be saved before
+            # the unit's save conflicts
+            unit_of_work = UnitOfWork()
+            if not lease.signed_by_tenant:
+                lease.sign_by_tenant()
+                unit_of_work.save(lease_repo.repo, lease)
+
+            # When lease is signed, mark the unit as leased. In single-application
+            # mode both are recorded in one transaction.
+            unit_repo = info.context["unit_repo"]
+            unit = await unit_repo.get(as_uuid(lease.unit_id))
+            if unit and not unit.is_leased:
+                unit.mark_as_leased()
+                unit_of_work.save(unit_repo.repo, unit)
+
+            await lease_repo.run(unit_of_work.commit)
+            return lease
+
+        return await info.context["retry"].run(command)
+
+    @strawberry.mutation
+    async def update_unit_built_in(
         self, info: Info, id: strawberry.ID, year: int
     ) -> UnitType:
         repo = info.context["unit_repo"]
-        unit = repo.get(UUID(id))
-        if not unit:
-            raise ValueError(f"Unit with ID {id} not found")
 
-        unit.update_built_in_year(year)
-        repo.save(unit)
-        return unit
+        async def command() -> Unit:
+            unit = await repo.get(UUID(id))
+            if not unit:
+                raise ValueError(f"Unit with ID {id} not found")
+
+            unit.update_built_in_year(year)
+            await repo.save(unit)
+            return unit
+
+        return await info.context["retry"].run(command)
+
+
+# Subscription resolvers, streaming new events from the shared event fan-out
+@strawberry.type
+class Subscription:
+    @strawberry.subscription
+    async def unit_events(
+        self, info: Info, unit_id: Optional[strawberry.ID] = None
+    ) -> AsyncGenerator[DomainEventType, None]:
+        aggregate_id = UUID(unit_id) if unit_id else None
+
+        def matches(event: DomainEvent) -> bool:
+            return isinstance(event, Unit.Event) and (
+                aggregate_id is None or event.originator_id == aggregate_id
+            )
+
+        async for event in info.context["events"].subscribe(matches):
+            yield DomainEventType.from_event(event)
+
+    @strawberry.subscription
+    async def lease_events(
+        self, info: Info, unit_id: Optional[strawberry.ID] = None
+    ) -> AsyncGenerator[DomainEventType, None]:
+        # Only the created events of leases have the unit, so the leases of the
+        # unit are tracked
+        lease_ids: Set[UUID] = set()
+        if unit_id:
+            unit_uuid = UUID(unit_id)
+            (existing,) = await info.context["lease_repo"].get_lease_ids_by_unit_ids(
+                [unit_uuid]
+            )
+            lease_ids.update(existing)
+
+        def matches(event: DomainEvent) -> bool:
+            if not isinstance(event, Lease.Event):
+                return False
+            if not unit_id:
+                return True
+            if isinstance(event, Lease.Created) and as_uuid(event.unit_id) == unit_uuid:
+                lease_ids.add(event.originator_id)
+            return event.originator_id in lease_ids
+
+        async for event in info.context["events"].subscribe(matches):
+            yield DomainEventType.from_event(event)
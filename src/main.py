@@ -1,10 +1,31 @@
+import os
+import zlib
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from typing import Literal
+from eventsourcing.utils import strtobool
+from fastapi import FastAPI, Query as QueryParam
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 import strawberry
 from strawberry.fastapi import GraphQLRouter
-from .graphql.schema import Query, Mutation
-from .domain.repositories import UnitRepository, TenantRepository, LeaseRepository
+from .graphql.loaders import create_loaders
+from .graphql.schema import Query, Mutation, Subscription
+from .domain.async_persistence import construct_async_reader
+from .domain.async_repositories import (
+    AsyncRepository,
+    AsyncUnitRepository,
+    AsyncTenantRepository,
+    AsyncLeaseRepository,
+)
+from .domain.export import iter_aggregate_records, iter_event_records, to_ndjson
+from .domain.fanout import EventFanout
+from .domain.repositories import (
+    RentalApplication,
+    UnitRepository,
+    TenantRepository,
+    LeaseRepository,
+)
+from .domain.retry import RetryOnConflict
 
 # Application state
 app_state = {}
@@ -13,16 +34,51 @@ app_state = {}
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Initialize repositories
-    app_state["unit_repo"] = UnitRepository()
-    app_state["tenant_repo"] = TenantRepository()
-    app_state["lease_repo"] = LeaseRepository()
+    if strtobool(os.environ.get("SINGLE_APPLICATION") or "no"):
+        # One application records all aggregates with a single notification log
+        rental_app = RentalApplication()
+        app_state["unit_repo"] = rental_app.units
+        app_state["tenant_repo"] = rental_app.tenants
+        app_state["lease_repo"] = rental_app.leases
+        applications = [rental_app]
+    else:
+        app_state["unit_repo"] = UnitRepository()
+        app_state["tenant_repo"] = TenantRepository()
+        app_state["lease_repo"] = LeaseRepository()
+        applications = [
+            app_state["unit_repo"],
+            app_state["tenant_repo"],
+            app_state["lease_repo"],
+        ]
+
+    # Aggregates are read with one async reader per datastore, e.g. one pool
+    # of async connections to a Postgres database shared by the repositories
+    readers = {}
+    for name in ("unit", "tenant", "lease"):
+        recorder = app_state[f"{name}_repo"].recorder
+        datastore = getattr(recorder, "datastore", recorder)
+        if id(datastore) not in readers:
+            readers[id(datastore)] = construct_async_reader(recorder)
+        app_state[f"{name}_reader"] = readers[id(datastore)]
+
+    # Mutations are retried when they conflict with concurrent writes
+    app_state["retry"] = RetryOnConflict()
+
+    # Subscriptions share one poller of the notification logs
+    app_state["events"] = EventFanout(
+        applications,
+        interval=float(os.environ.get("SUBSCRIPTION_POLL_INTERVAL") or "0.5"),
+    )
 
     yield
 
+    await app_state["events"].close()
+    for reader in readers.values():
+        await reader.close()
+
     # Clean up repositories
-    app_state["unit_repo"].close()
-    app_state["tenant_repo"].close()
-    app_state["lease_repo"].close()
+    for application in applications:
+        application.close()
 
 
 # Initialize FastAPI app with lifespan management
@@ -38,16 +94,29 @@ app.add_middleware(
 )
 
 # Create GraphQL schema with Strawberry
-schema = strawberry.Schema(query=Query, mutation=Mutation)
+schema = strawberry.Schema(query=Query, mutation=Mutation, subscription=Subscription)
 
 
 # Create a GraphQL route with custom context
 async def get_context():
-    # Use repositories from app state
+    # Use repositories from app state through their async interfaces, with
+    # DataLoaders batching reads per request
+    unit_repo = AsyncUnitRepository(
+        app_state["unit_repo"], reader=app_state["unit_reader"]
+    )
+    tenant_repo = AsyncTenantRepository(
+        app_state["tenant_repo"], reader=app_state["tenant_reader"]
+    )
+    lease_repo = AsyncLeaseRepository(
+        app_state["lease_repo"], reader=app_state["lease_reader"]
+    )
     return {
-        "unit_repo": app_state["unit_repo"],
-        "tenant_repo": app_state["tenant_repo"],
-        "lease_repo": app_state["lease_repo"],
+        "unit_repo": unit_repo,
+        "tenant_repo": tenant_repo,
+        "lease_repo": lease_repo,
+        "retry": app_state["retry"],
+        "events": app_state["events"],
+        **create_loaders(unit_repo, tenant_repo, lease_repo),
     }
 
 
@@ -63,6 +132,55 @@ def health_check():
     return {"status": "healthy"}
 
 
+@app.get("/metrics")
+def metrics():
+    return {
+        "cache": {
+            name: app_state[f"{name}_repo"].cache_stats()
+            for name in ("unit", "tenant", "lease")
+        },
+        "conflicts": app_state["retry"].stats(),
+    }
+
+
+@app.get("/export/{repository}")
+async def export(
+    repository: Literal["unit", "tenant", "lease"],
+    kind: Literal["aggregates", "events"] = "aggregates",
+    from_position: int = QueryParam(1, ge=1),
+    gzip: bool = False,
+):
+    """Stream the current state of a repository's aggregates, or the events of
+    its notification log, as newline-delimited JSON. Each line has the position
+    to resume from after an interrupted export."""
+    repo = AsyncRepository(app_state[f"{repository}_repo"])
+    iter_records = (
+        iter_aggregate_records if kind == "aggregates" else iter_event_records
+    )
+    chunks = iter_records(repo.repo, from_position)
+
+    def next_chunk() -> bytes:
+        chunk = next(chunks, None)
+        return to_ndjson(chunk) if chunk is not None else b""
+
+    async def body():
+        # The next chunk is only read once the previous one has been sent
+        compressor = zlib.compressobj(wbits=31) if gzip else None
+        while data := await repo.run(next_chunk):
+            if compressor is not None:
+                data = compressor.compress(data)
+            if data:
+                yield data
+        if compressor is not None:
+            yield compressor.flush()
+
+    return StreamingResponse(
+        body(),
+        media_type="application/x-ndjson",
+        headers={"Content-Encoding": "gzip"} if gzip else None,
+    )
+
+
 @app.get("/")
 def root():
     return {
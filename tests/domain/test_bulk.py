@@ -0,0 +1,85 @@
+import json
+
+from src.cli import build_tenant, build_unit, main
+from src.domain.bulk import import_rows
+
+
+def _tenant_row(identification_number: str, **row) -> dict:
+    return {
+        "identification_number": identification_number,
+        "first_name": "Jane",
+        "last_name": "Smith",
+        "email": "jane.smith@example.com",
+        "phone_number": "555-987-6543",
+        "dob": "1985-05-15",
+        **row,
+    }
+
+
+def test_import_units_in_batches(monkeypatch, unit_repository):
+    """Test that rows are saved in one transaction per batch"""
+    inserts = []
+    insert_events = unit_repository.recorder.insert_events
+
+    def counting_insert_events(stored_events, **kwargs):
+        inserts.append(stored_events)
+        return insert_events(stored_events, **kwargs)
+
+    monkeypatch.setattr(
+        unit_repository.recorder, "insert_events", counting_insert_events
+    )
+    rows = [{"address": f"{i} Bulk St", "amenities": "Pool;Gym"} for i in range(5)]
+
+    report = import_rows(unit_repository, rows, build_unit, batch_size=2)
+
+    assert (report.created, report.errors) == (5, [])
+    assert len(inserts) == 3
+    units = unit_repository.get_all()
+    assert [unit.address for unit in units] == [row["address"] for row in rows]
+    assert units[0].amenities == ["Pool", "Gym"]
+
+
+def test_import_reports_row_errors(tenant_repository):
+    """Test that invalid and conflicting rows are reported without failing the
+    rest of their batch"""
+    tenant_repository.create(build_tenant(_tenant_row("000-00-0000")))
+    rows = [
+        _tenant_row("111-11-1111"),
+        _tenant_row("000-00-0000"),
+        _tenant_row("222-22-2222", dob="not a date"),
+        {"identification_number": "333-33-3333"},
+        _tenant_row("111-11-1111"),
+        _tenant_row("444-44-4444"),
+    ]
+
+    report = import_rows(tenant_repository, rows, build_tenant, batch_size=10)
+
+    assert report.created == 2
+    assert [number for number, _ in report.errors] == [2, 3, 4, 5]
+    assert "already exists" in report.errors[0][1]
+    assert report.errors[2][1] == "Missing field 'first_name'"
+    assert len(tenant_repository.get_all()) == 3
+
+
+def test_import_command(tmp_path, capsys):
+    """Test importing an NDJSON file from the command line"""
+    path = tmp_path / "tenants.ndjson"
+    lines = [
+        json.dumps(_tenant_row("111-11-1111")),
+        json.dumps(_tenant_row("111-11-1111")),
+        '{"identification_number": "222-22-2222", ',
+        json.dumps(_tenant_row("333-33-3333")),
+    ]
+    path.write_text("\n".join(lines))
+
+    main(["import", "tenant", str(path), "--batch-size", "10"])
+
+    captured = capsys.readouterr()
+    assert captured.out.startswith("tenant: created 2 in ")
+    errors = captured.err.splitlines()
+    assert errors[0] == (
+        "row 2: Tenant with identification number 111-11-1111 already exists"
+    )
+    # A malformed line doesn't abort the import of the rest of its batch
+    assert errors[1].startswith("row 3: Expecting property name")
+    assert len(errors) == 2
@@ -0,0 +1,118 @@
+from base64 import b64decode, b64encode
+from datetime import date
+from uuid import uuid4
+
+import pytest
+from eventsourcing.persistence import Cipher
+from eventsourcing.utils import Environment
+
+from src.domain.models import Tenant
+from src.domain.repositories import TenantRepository
+
+
+class XorCipher(Cipher):
+    """Reversible cipher, so tests don't depend on an AES library"""
+
+    def __init__(self, environment: Environment):
+        self.key = b64decode(environment["CIPHER_KEY"])
+
+    def encrypt(self, plaintext: bytes) -> bytes:
+        return bytes(b ^ self.key[i % len(self.key)] for i, b in enumerate(plaintext))
+
+    def decrypt(self, ciphertext: bytes) -> bytes:
+        return self.encrypt(ciphertext)
+
+
+CIPHER_KEY = "a2V5LWZvci1maWVsZC1lbmNyeXB0aW9uLXRlc3RzIQ=="
+
+ENV = {
+    "CIPHER_MODE": "fields",
+    "CIPHER_KEY": CIPHER_KEY,
+    "CIPHER_TOPIC": f"{__name__}:XorCipher",
+}
+
+
+def create_tenant() -> Tenant:
+    return Tenant.create(
+        identification_number="123-45-6789",
+        first_name="Jane",
+        last_name="Smith",
+        email="jane.smith@example.com",
+        phone_number="555-987-6543",
+        dob=date(1985, 5, 15),
+    )
+
+
+@pytest.mark.parametrize(
+    "env",
+    [ENV, {**ENV, "EVENT_ENCODING": "compact", "TRANSCODER": "orjson"}],
+)
+def test_personal_data_is_encrypted(env):
+    """Test that only the personal data of tenants is stored encrypted"""
+    repo = TenantRepository(env={**env, "SNAPSHOTTING_INTERVAL": "2"})
+    tenant = create_tenant()
+    tenant.update_contact_info(email="jane@example.com")
+    repo.create(tenant)
+
+    stored = repo.recorder.select_events(tenant.id)
+    snapshots = repo.snapshots.recorder.select_events(tenant.id)
+    for stored_event in [*stored, *snapshots]:
+        for value in (b"Smith", b"jane", b"123-45-6789", b"1985"):
+            assert value not in stored_event.state
+    assert snapshots
+
+    repo.repository.cache = None
+    saved = repo.get(tenant.id)
+    assert saved.email == "jane@example.com"
+    assert saved.dob == date(1985, 5, 15)
+    assert repo.get_by_identification_number("123-45-6789").id == tenant.id
+    repo.repository.snapshot_store = None
+    assert repo.get(tenant.id).last_name == "Smith"
+    repo.close()
+
+
+def test_keys_are_derived_per_aggregate_and_cached():
+    repo = TenantRepository(env=ENV)
+    field_cipher = repo.mapper.field_cipher
+    tenant_id = uuid4()
+    cipher = field_cipher.cipher(tenant_id)
+    assert field_cipher.cipher(tenant_id) is cipher
+    assert field_cipher.cipher(uuid4()).key != cipher.key
+    repo.close()
+
+
+def test_fields_mode_requires_a_key():
+    with pytest.raises(ValueError):
+        TenantRepository(env={"CIPHER_MODE": "fields"})
+
+
+def test_aes_cipher():
+    pytest.importorskip("Crypto")
+    repo = TenantRepository(env={"CIPHER_MODE": "fields", "CIPHER_KEY": CIPHER_KEY})
+    tenant = create_tenant()
+    repo.create(tenant)
+    repo.repository.cache = None
+    assert repo.get(tenant.id).first_name == "Jane"
+    repo.close()
+
+
+def test_identification_index_is_keyed():
+    """Test that the identification number index can't be found by hashing
+    candidate numbers without the key"""
+    unkeyed = TenantRepository()
+    keyed = TenantRepository(env=ENV)
+    other_key = TenantRepository(
+        env={**ENV, "CIPHER_KEY": b64encode(b"k" * 16).decode()}
+    )
+    logs = [
+        repo._identification_log("123-45-6789").originator_id
+        for repo in (unkeyed, keyed, other_key)
+    ]
+    assert len(set(logs)) == 3
+
+    tenant = create_tenant()
+    keyed.create(tenant)
+    assert keyed.get_tenant_id_by_identification_number("123-45-6789") == tenant.id
+    assert not keyed.recorder.select_events(logs[0])
+    for repo in (unkeyed, keyed, other_key):
+        repo.close()
@@ -0,0 +1,71 @@
+import json
+from datetime import date
+from decimal import Decimal
+from uuid import uuid4
+
+from src.domain.export import (
+    iter_aggregate_records,
+    iter_event_records,
+    jsonable,
+    to_ndjson,
+)
+from src.domain.models import Unit
+
+
+def test_iter_aggregate_records(unit_repository):
+    """Test iterating over the current state of units in chunks, resuming from
+    a position in the log"""
+    units = [Unit.create(address=f"{i} Export St") for i in range(5)]
+    unit_repository.create_many(units)
+    units[0].mark_as_leased()
+    unit_repository.save(units[0])
+
+    chunks = list(iter_aggregate_records(unit_repository, chunk_size=2))
+
+    assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+    records = [record for chunk in chunks for record in chunk]
+    assert [record["id"] for record in records] == [unit.id for unit in units]
+    assert records[0]["type"] == "Unit"
+    assert records[0]["version"] == 2
+    assert records[0]["state"]["is_leased"] is True
+    assert not any(name.startswith("_") for name in records[0]["state"])
+
+    resumed = iter_aggregate_records(unit_repository, records[2]["position"] + 1)
+    assert [record["id"] for chunk in resumed for record in chunk] == [
+        unit.id for unit in units[3:]
+    ]
+
+
+def test_iter_event_records(unit_repository):
+    """Test iterating over the events of the notification log in chunks"""
+    units = [Unit.create(address=f"{i} Export St") for i in range(2)]
+    unit_repository.create_many(units)
+
+    chunks = list(iter_event_records(unit_repository, from_position=2, chunk_size=2))
+
+    records = [record for chunk in chunks for record in chunk]
+    assert [len(chunk) for chunk in chunks] == [2, 1]
+    assert [record["position"] for record in records] == [2, 3, 4]
+    created = [record for record in records if record["topic"].endswith("Created")]
+    assert [record["originator_id"] for record in created] == [units[1].id]
+    assert created[0]["originator_version"] == 1
+    assert created[0]["state"]["address"] == "1 Export St"
+
+
+def test_to_ndjson():
+    """Test encoding records as JSON lines, with values JSON doesn't support"""
+    record_id = uuid4()
+    records = [
+        {"id": record_id, "on": date(2025, 1, 2), "rent": Decimal("1.50")},
+        {"tags": {"Pool"}},
+    ]
+
+    lines = to_ndjson(records).decode().splitlines()
+
+    assert [json.loads(line) for line in lines] == jsonable(records)
+    assert json.loads(lines[0]) == {
+        "id": str(record_id),
+        "on": "2025-01-02",
+        "rent": "1.50",
+    }
+    assert json.loads(lines[1]) == {"tags": ["Pool"]}
@@ -0,0 +1,71 @@
+import asyncio
+
+import pytest
+
+from src.domain.fanout import EventFanout, SubscriptionOverflow
+from src.domain.models import Unit
+
+
+def test_subscribers_share_one_read_per_batch(unit_repository):
+    """Test that new events are read once and delivered to each matching
+    subscriber"""
+    reads = []
+    select_notifications = unit_repository.recorder.select_notifications
+
+    def counting_select_notifications(*args, **kwargs):
+        reads.append(kwargs["start"])
+        return select_notifications(*args, **kwargs)
+
+    unit_repository.recorder.select_notifications = counting_select_notifications
+    unit_repository.create(Unit.create(address="1 Old St"))
+
+    async def run():
+        fanout = EventFanout([unit_repository, unit_repository], interval=0.5)
+        unit = Unit.create(address="1 Fanout St")
+
+        async def receive(predicate, count):
+            events = []
+            async for event in fanout.subscribe(predicate):
+                events.append(event)
+                if len(events) == count:
+                    return events
+
+        subscribers = [asyncio.create_task(receive(None, 2)) for _ in range(50)] + [
+            asyncio.create_task(receive(lambda e: isinstance(e, Unit.Event), 2))
+        ]
+        await asyncio.sleep(0.05)
+        reads.clear()
+        unit.mark_as_leased()
+        unit_repository.create(unit)
+        received = await asyncio.wait_for(asyncio.gather(*subscribers), 1)
+        reads_per_batch = len(reads)
+        await fanout.close()
+        return unit, received, reads_per_batch
+
+    unit, received, reads_per_batch = asyncio.run(run())
+
+    # Each subscriber received the new events, not those recorded before
+    assert received[0][0].originator_id == unit.id
+    assert [type(e) for e in received[-1]] == [Unit.Created, Unit.MarkedAsLeased]
+    assert all(events[0] is received[0][0] for events in received)
+    # The tailer was woken to read the batch once, however many subscribers
+    # and repositories sharing the event store, then found nothing more
+    assert 1 <= reads_per_batch <= 3
+
+
+def test_slow_subscriber_overflows(unit_repository):
+    async def run():
+        fanout = EventFanout([unit_repository], interval=0.01, max_queue_size=2)
+        subscription = fanout.subscribe()
+        first = asyncio.create_task(subscription.__anext__())
+        await asyncio.sleep(0.05)
+        for i in range(4):
+            unit_repository.create(Unit.create(address=f"{i} Slow St"))
+        await first
+        await asyncio.sleep(0.05)
+        with pytest.raises(SubscriptionOverflow):
+            while True:
+                await subscription.__anext__()
+        await fanout.close()
+
+    asyncio.run(run())
@@ -0,0 +1,199 @@
+from datetime import date, timedelta
+from uuid import uuid4
+
+import pytest
+
+from src import cli
+from src.domain.models import Lease
+from src.domain.repositories import LogEvents, RentalApplication
+
+
+def test_get_by_unit_id(lease_repository, sample_unit, sample_tenant):
+    """Test retrieving the leases of a unit through the unit's lease index"""
+    start_date = date.today()
+    other_unit_id = uuid4()
+
+    unit_leases = [
+        Lease.create(
+            unit_id=sample_unit.id,
+            tenant_ids=[sample_tenant.id],
+            start_date=start_date + timedelta(days=365 * i),
+            end_date=start_date + timedelta(days=365 * (i + 1)),
+        )
+        for i in range(2)
+    ]
+    for lease in unit_leases:
+        lease_repository.create(lease)
+
+    lease_repository.create(
+        Lease.create(
+            unit_id=other_unit_id,
+            tenant_ids=[sample_tenant.id],
+            start_date=start_date,
+            end_date=start_date + timedelta(days=365),
+        )
+    )
+
+    leases = lease_repository.get_by_unit_id(sample_unit.id)
+
+    assert [lease.id for lease in leases] == [lease.id for lease in unit_leases]
+    assert len(lease_repository.get_by_unit_id(other_unit_id)) == 1
+    assert lease_repository.get_by_unit_id(uuid4()) == []
+
+
+def test_get_by_unit_id_with_string_unit_id(lease_repository, sample_tenant):
+    """Test that leases created with string unit IDs (as the API does) are indexed"""
+    unit_id = uuid4()
+    lease = Lease.create(
+        unit_id=str(unit_id),
+        tenant_ids=[str(sample_tenant.id)],
+        start_date=date.today(),
+        end_date=date.today() + timedelta(days=365),
+    )
+    lease_repository.save(lease)
+
+    assert lease_repository.get_lease_ids_by_unit_id(unit_id) == [lease.id]
+    assert lease_repository.get_lease_ids_by_unit_id(str(unit_id)) == [lease.id]
+
+
+def test_get_by_tenant_id(lease_repository, sample_unit, sample_tenant):
+    """Test that the tenant's lease index follows tenants being added and removed"""
+    other_tenant_id = uuid4()
+    lease = Lease.create(
+        unit_id=sample_unit.id,
+        tenant_ids=[sample_tenant.id],
+        start_date=date.today(),
+        end_date=date.today() + timedelta(days=365),
+    )
+    lease_repository.create(lease)
+
+    tenant_leases = lease_repository.get_by_tenant_id(sample_tenant.id)
+    assert [tenant_lease.id for tenant_lease in tenant_leases] == [lease.id]
+    assert lease_repository.get_by_tenant_id(other_tenant_id) == []
+
+    lease.add_tenant(other_tenant_id)
+    lease.remove_tenant(sample_tenant.id)
+    lease_repository.save(lease)
+
+    assert lease_repository.get_by_tenant_id(sample_tenant.id) == []
+    assert lease_repository.get_lease_ids_by_tenant_id(other_tenant_id) == [lease.id]
+
+    # Adding and removing a tenant within a single save leaves no index entry
+    lease.add_tenant(sample_tenant.id)
+    lease.remove_tenant(sample_tenant.id)
+    lease_repository.save(lease)
+
+    assert lease_repository.get_lease_ids_by_tenant_id(sample_tenant.id) == []
+
+
+def test_get_active_leases(lease_repository, sample_unit, sample_tenant):
+    """Test that the active leases projection follows signing and date updates"""
+    today = date.today()
+    leases = [
+        Lease.create(
+            unit_id=sample_unit.id,
+            tenant_ids=[sample_tenant.id],
+            start_date=today + timedelta(days=365 * i - 10),
+            end_date=today + timedelta(days=365 * i + 300),
+        )
+        for i in range(-1, 2)
+    ]
+    for lease in leases:
+        lease_repository.create(lease)
+
+    # Unsigned leases are never active
+    assert lease_repository.get_active_leases() == []
+
+    for lease in leases:
+        lease.sign_by_tenant()
+        lease_repository.save(lease)
+
+    active_ids = [lease.id for lease in lease_repository.get_active_leases()]
+    assert active_ids == [leases[1].id]
+    next_year = today + timedelta(days=400)
+    active_ids = [lease.id for lease in lease_repository.get_active_leases(next_year)]
+    assert active_ids == [leases[2].id]
+
+    # Moving the start date of a lease moves it in the index
+    leases[2].update_dates(start_date=today - timedelta(days=1))
+    lease_repository.save(leases[2])
+
+    active_ids = {lease.id for lease in lease_repository.get_active_leases()}
+    assert active_ids == {leases[1].id, leases[2].id}
+    past = today - timedelta(days=100)
+    active_ids = [lease.id for lease in lease_repository.get_active_leases(past)]
+    assert active_ids == [leases[0].id]
+
+
+def test_reindex_leases_saved_before_the_indexes(lease_repository, sample_tenant):
+    """Test back-filling the unit and tenant indexes of existing leases"""
+    unit_id = uuid4()
+    leases = [
+        Lease.create(
+            unit_id=unit_id,
+            tenant_ids=[sample_tenant.id, uuid4()],
+            start_date=date.today() + timedelta(days=365 * i),
+            end_date=date.today() + timedelta(days=365 * (i + 1)),
+        )
+        for i in range(3)
+    ]
+    # Leases were only logged before the indexes were introduced
+    for lease in leases:
+        logged = LogEvents()
+        logged.trigger(lease_repository.lease_log, lease_id=lease.id)
+        lease_repository.save_collected(lease, *logged.events)
+    lease_repository.create(
+        Lease.create(
+            unit_id=unit_id,
+            tenant_ids=[sample_tenant.id],
+            start_date=date.today(),
+            end_date=date.today() + timedelta(days=30),
+        )
+    )
+    assert len(lease_repository.get_by_unit_id(unit_id)) == 1
+
+    assert lease_repository.reindex(chunk_size=2) == 9
+
+    assert len(lease_repository.get_by_unit_id(unit_id)) == 4
+    assert len(lease_repository.get_by_tenant_id(sample_tenant.id)) == 4
+    assert lease_repository.get_lease_ids_by_tenant_id(leases[0].tenant_ids[1]) == [
+        leases[0].id
+    ]
+    assert lease_repository.reindex() == 0
+
+
+def test_reindex_command(capsys):
+    """Test indexing all the indexed repositories by default"""
+    cli.main(["reindex"])
+
+    assert capsys.readouterr().out.splitlines() == [
+        "tenant: recorded 0 index events",
+        "lease: recorded 0 index events",
+    ]
+    with pytest.raises(SystemExit):
+        cli.main(["reindex", "unit"])
+
+
+def test_reindex_command_in_single_application_mode(monkeypatch, capsys):
+    """Test that the indexes are back-filled in the application's event store"""
+    rental_app = RentalApplication()
+    lease = Lease.create(
+        unit_id=uuid4(),
+        tenant_ids=[uuid4()],
+        start_date=date.today(),
+        end_date=date.today() + timedelta(days=365),
+    )
+    logged = LogEvents()
+    logged.trigger(rental_app.leases.lease_log, lease_id=lease.id)
+    rental_app.leases.save_collected(lease, *logged.events)
+    monkeypatch.setenv("SINGLE_APPLICATION", "y")
+    monkeypatch.setattr(cli, "RentalApplication", lambda: rental_app)
+
+    cli.main(["reindex"])
+
+    assert capsys.readouterr().out == "rental: recorded 2 index events\n"
+    assert rental_app.leases.get_lease_ids_by_unit_id(lease.unit_id) == [lease.id]
+
+    cli.main(["reindex", "lease"])
+
+    assert capsys.readouterr().out == "lease: recorded 0 index events\n"
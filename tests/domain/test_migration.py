@@ -0,0 +1,36 @@
+from src.domain.migration import copy_events
+from src.domain.models import Unit
+from src.domain.repositories import UnitRepository
+from src.domain.transcoders import CompactMapper
+
+
+def test_copy_events():
+    """Test that events are copied in batches and re-encoded by the target"""
+    source = UnitRepository()
+    target = UnitRepository(env={"EVENT_ENCODING": "compact"})
+    units = [Unit.create(address=f"{i} Copy St") for i in range(5)]
+    for unit in units:
+        unit.mark_as_leased()
+    source.create_many(units)
+
+    positions = []
+    copied = copy_events(
+        source,
+        target,
+        batch_size=3,
+        progress=lambda position, count: positions.append(position),
+    )
+
+    assert copied == source.recorder.max_notification_id()
+    assert positions[-1] == copied
+    stored = target.recorder.select_events(units[0].id)
+    assert all(e.state.startswith(CompactMapper.COMPACT) for e in stored)
+    assert [unit.id for _, unit in target.get_units(desc=False)] == [
+        unit.id for unit in units
+    ]
+    assert target.get(units[0].id).is_leased
+
+    # Resuming from the end copies nothing
+    assert copy_events(source, target, start=copied + 1) == 0
+    source.close()
+    target.close()
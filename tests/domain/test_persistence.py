@@ -0,0 +1,257 @@
+import asyncio
+import re
+from itertools import count
+from types import SimpleNamespace
+from datetime import date
+from uuid import uuid4
+
+import psycopg
+import pytest
+from eventsourcing.persistence import StoredEvent
+from eventsourcing.popo import POPOAggregateRecorder
+from eventsourcing.sqlite import SQLiteAggregateRecorder, SQLiteDatastore
+from psycopg.pq import TransactionStatus
+from psycopg.rows import dict_row
+
+from src.domain.async_persistence import (
+    AsyncEventReader,
+    PostgresAsyncEventReader,
+    construct_async_reader,
+)
+from src.domain.async_repositories import AsyncLeaseRepository, AsyncUnitRepository
+from src.domain.models import Lease, Unit
+from src.domain.persistence import select_events_many, select_last_events_many
+from src.domain.repositories import UnitRepository, TenantRepository, LeaseRepository
+
+POSTGRES_ENV = {
+    "PERSISTENCE_MODULE": "src.domain.persistence:SharedPostgresFactory",
+    "POSTGRES_DBNAME": "fastapi_eventsourcing",
+    "POSTGRES_HOST": "localhost",
+    "POSTGRES_USER": "postgres",
+    "POSTGRES_PASSWORD": "postgres",
+    "POSTGRES_POOL_MAX_IDLE": "30",
+    # Don't connect, pools are only opened when used
+    "CREATE_TABLE": "no",
+}
+
+
+def test_shared_postgres_factory():
+    """Test that the repositories share one connection pool"""
+    repos = [
+        repo_class(env=POSTGRES_ENV)
+        for repo_class in (UnitRepository, TenantRepository, LeaseRepository)
+    ]
+    datastore = repos[0].factory.datastore
+    other = UnitRepository(env={**POSTGRES_ENV, "POSTGRES_DBNAME": "other"})
+
+    assert all(repo.factory.datastore is datastore for repo in repos)
+    assert repos[0].recorder.datastore is datastore
+    assert other.factory.datastore is not datastore
+    assert datastore.pool.max_idle == 30
+
+    closed = []
+    datastore.close = lambda: closed.append(datastore)
+    other.close()
+    for repo in repos:
+        assert closed == []
+        repo.close()
+    # The shared datastore is closed with the last repository
+    assert closed == [datastore]
+
+
+def popo_recorder():
+    return POPOAggregateRecorder()
+
+
+def sqlite_recorder():
+    recorder = SQLiteAggregateRecorder(SQLiteDatastore(":memory:"))
+    recorder.create_table()
+    return recorder
+
+
+@pytest.mark.parametrize("construct_recorder", [popo_recorder, sqlite_recorder])
+def test_select_events_many(construct_recorder):
+    """Test selecting the events of many originators, after given versions"""
+    recorder = construct_recorder()
+    first, second, missing = uuid4(), uuid4(), uuid4()
+    recorder.insert_events(
+        [
+            StoredEvent(originator_id, version, "topic", f"{version}".encode())
+            for originator_id in (first, second)
+            for version in (1, 2, 3)
+        ]
+    )
+
+    def versions(stored_events):
+        return [stored_event.originator_version for stored_event in stored_events]
+
+    selected = select_events_many(recorder, [second, first, missing], gt={first: 1})
+    assert list(selected) == [second, first, missing]
+    assert [versions(selected[id]) for id in selected] == [[1, 2, 3], [2, 3], []]
+
+    last = select_last_events_many(recorder, [first, missing, second])
+    assert {id: event.originator_version for id, event in last.items()} == {
+        first: 3,
+        second: 3,
+    }
+    assert select_last_events_many(recorder, []) == {}
+
+
+def test_postgres_async_reads(monkeypatch):
+    """Test that async repositories select the events of Postgres event stores
+    with async queries, rather than in the thread pool"""
+    unit = Unit.create(address="1 Async St")
+    lease = Lease.create(
+        unit_id=unit.id,
+        tenant_ids=[uuid4()],
+        start_date=date(2025, 1, 1),
+        end_date=date(2025, 12, 31),
+    )
+    # The events are stored in memory and returned as rows of the queries
+    stored = LeaseRepository()
+    stored.create(unit)
+    stored.create(lease)
+
+    unit_repo = UnitRepository(env=POSTGRES_ENV)
+    lease_repo = LeaseRepository(env=POSTGRES_ENV)
+    reader = construct_async_reader(unit_repo.recorder)
+    assert isinstance(reader, PostgresAsyncEventReader)
+    assert type(construct_async_reader(stored.recorder)) is AsyncEventReader
+
+    statements = []
+
+    async def fetch(statement, params):
+        statements.append(statement)
+        if "DISTINCT ON" in statement:
+            return []
+        selected = select_events_many(stored.recorder, params[0])
+        return [
+            vars(stored_event)
+            for originator_id in params[0]
+            for stored_event in selected[originator_id]
+        ]
+
+    monkeypatch.setattr(reader, "fetch", fetch)
+
+    def blocking_select(*args, **kwargs):
+        raise AssertionError("Selected in the thread pool")
+
+    monkeypatch.setattr(
+        "src.domain.async_persistence.select_events_many", blocking_select
+    )
+
+    async def read():
+        units = AsyncUnitRepository(unit_repo, reader=reader)
+        leases = AsyncLeaseRepository(lease_repo, reader=reader)
+        return (
+            await units.get(unit.id),
+            await leases.get_lease_ids_by_unit_ids([unit.id]),
+        )
+
+    saved, lease_ids = asyncio.run(read())
+
+    assert saved.address == "1 Async St"
+    assert lease_ids == [[lease.id]]
+    assert [re.search(r"FROM (\w+)", statement)[1] for statement in statements] == [
+        "unit_snapshots",
+        "unit_events",
+        "lease_events",
+    ]
+    for repo in (unit_repo, lease_repo, stored):
+        repo.close()
+
+
+class FakeAsyncConnection:
+    """Connection returned by psycopg, recording the statements executed"""
+
+    def __init__(self, rows, **kwargs):
+        self.rows = rows
+        self.kwargs = kwargs
+        self.statements = []
+        self.autocommit = False
+        self.closed = False
+        self.pgconn = SimpleNamespace(transaction_status=TransactionStatus.IDLE)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    async def set_autocommit(self, value):
+        self.autocommit = value
+
+    async def execute(self, statement, params=None, prepare=None):
+        self.statements.append(statement)
+
+    def cursor(self):
+        return FakeAsyncCursor(self)
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeAsyncCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    async def execute(self, statement, params=None, prepare=None):
+        self.conn.statements.append(statement)
+
+    async def fetchall(self):
+        return self.conn.rows
+
+
+def test_postgres_async_reader_connects(monkeypatch):
+    """Test that the reader's pool connects with the datastore's settings and
+    a fresh password, and selects rows through the pool's connections"""
+    repo = UnitRepository(
+        env={**POSTGRES_ENV, "POSTGRES_IDLE_IN_TRANSACTION_SESSION_TIMEOUT": "5"}
+    )
+    unit = Unit.create(address="1 Pool St")
+    stored_events = [repo.mapper.to_stored_event(e) for e in unit.collect_events()]
+    rows = [vars(stored_event) for stored_event in stored_events]
+    connections = []
+
+    async def connect(conninfo="", **kwargs):
+        connections.append(FakeAsyncConnection(rows, **kwargs))
+        return connections[-1]
+
+    monkeypatch.setattr(psycopg.AsyncConnection, "connect", connect)
+    passwords = count(1)
+    repo.factory.datastore.pool.get_password_func = lambda: f"rotated-{next(passwords)}"
+    reader = construct_async_reader(repo.recorder)
+
+    async def read():
+        try:
+            selected = await reader.select_events_many(repo.recorder, [unit.id])
+            # psycopg-pool < 3.3 only accepts a mapping of connection kwargs
+            assert isinstance(reader.pool.kwargs, dict)
+            return selected
+        finally:
+            await reader.close()
+
+    selected = asyncio.run(read())
+
+    assert [e.originator_version for e in selected[unit.id]] == [1]
+    conn = connections[0]
+    assert conn.kwargs["dbname"] == "fastapi_eventsourcing"
+    assert conn.kwargs["row_factory"] is dict_row
+    assert conn.autocommit
+    assert "idle_in_transaction_session_timeout" in conn.statements[0]
+    # Each connection gets a fresh password
+    assert len({c.kwargs["password"] for c in connections}) == len(connections)
+    assert all(c.kwargs["password"].startswith("rotated-") for c in connections)
+    assert any(
+        "FROM unit_events" in statement
+        for c in connections
+        for statement in c.statements
+    )
+    assert all(c.closed for c in connections)
+    repo.close()
@@ -0,0 +1,106 @@
+from datetime import date, timedelta
+
+import pytest
+
+from src.domain.models import Unit, Tenant, Lease
+from src.domain.repositories import EventSourcingApplication, RentalApplication
+
+
+@pytest.fixture
+def rental_app():
+    app = RentalApplication()
+    yield app
+    app.close()
+
+
+def test_repositories_share_one_notification_log(rental_app):
+    """Test that all aggregates are recorded in one event store and log"""
+    unit = Unit.create(address="1 Single St", amenities=[])
+    rental_app.units.create(unit)
+    tenant = Tenant.create(
+        identification_number="123-45-6789",
+        first_name="Jane",
+        last_name="Smith",
+        email="jane.smith@example.com",
+        phone_number="555-987-6543",
+        dob=date(1985, 5, 15),
+    )
+    tenant.approve()
+    rental_app.tenants.create(tenant)
+    lease = Lease.create(
+        unit_id=unit.id,
+        tenant_ids=[tenant.id],
+        start_date=date.today(),
+        end_date=date.today() + timedelta(days=365),
+    )
+    rental_app.leases.create(lease)
+
+    topics = [
+        n.topic for n in rental_app.recorder.select_notifications(start=1, limit=100)
+    ]
+    assert topics[0].endswith("Unit.Created")
+    assert any(topic.endswith("Tenant.Approved") for topic in topics)
+    assert topics[-1].endswith("TenantLeaseAdded")
+
+    assert rental_app.units.get(unit.id).id == unit.id
+    assert rental_app.leases.get(unit.id) is None
+    assert [t.id for t in rental_app.tenants.get_approved_tenants()] == [tenant.id]
+    assert [u.id for u in rental_app.units.get_all()] == [unit.id]
+
+    # Aggregates of different types are saved in one transaction
+    lease.sign_by_tenant()
+    unit.mark_as_leased()
+    rental_app.leases.save(lease, unit)
+
+    assert rental_app.units.get(unit.id).is_leased
+    assert [lease.id for lease in rental_app.leases.get_active_leases()] == [lease.id]
+    assert rental_app.units.get_available_units() == []
+
+
+def test_iterate_over_all_aggregates(rental_app):
+    """Test that the aggregates of all the hosted repositories are iterated
+    over in the order they were logged, and can be snapshotted"""
+    rental_app.get_many_chunk_size = 2
+    units = [Unit.create(address=f"{i} Host St", amenities=[]) for i in range(2)]
+    rental_app.units.create_many(units)
+    tenant = Tenant.create(
+        identification_number="123-45-6789",
+        first_name="Jane",
+        last_name="Smith",
+        email="jane.smith@example.com",
+        phone_number="555-987-6543",
+        dob=date(1985, 5, 15),
+    )
+    rental_app.tenants.create(tenant)
+    lease = Lease.create(
+        unit_id=units[0].id,
+        tenant_ids=[tenant.id],
+        start_date=date.today(),
+        end_date=date.today() + timedelta(days=365),
+    )
+    rental_app.leases.create(lease)
+    tenant.approve()
+    rental_app.tenants.save(tenant)
+
+    ids = [units[0].id, units[1].id, tenant.id, lease.id]
+    assert [aggregate.id for aggregate in rental_app.get_all()] == ids
+    logged = list(rental_app.get_logged_ids())
+    assert [aggregate_id for _, aggregate_id in logged] == ids
+    assert [aggregate.id for aggregate in rental_app.iter_all(chunk_size=3)] == ids
+    assert [
+        aggregate.id for _, aggregate in rental_app.iter_logged(gt=logged[1][0])
+    ] == ids[2:]
+
+    assert rental_app.backfill_snapshots() == 1
+    snapshot = next(rental_app.snapshots.get(tenant.id, desc=True, limit=1))
+    assert snapshot.originator_version == tenant.version
+
+
+def test_repositories_must_list_their_aggregates():
+    """Test that a repository which doesn't log its aggregates can't be made"""
+
+    class UnloggedRepository(EventSourcingApplication):
+        pass
+
+    with pytest.raises(TypeError):
+        UnloggedRepository()
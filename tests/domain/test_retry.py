@@ -0,0 +1,52 @@
+import asyncio
+
+import pytest
+from eventsourcing.persistence import IntegrityError
+
+from src.domain.models import Unit
+from src.domain.retry import RetryOnConflict
+
+
+def test_retry_reapplies_command_after_conflict(unit_repository, sample_unit):
+    """Test that a conflicting command reloads the aggregate and is reapplied"""
+    retry = RetryOnConflict(backoff=0)
+
+    # A concurrent write after the command has loaded the unit
+    stale = unit_repository.get(sample_unit.id)
+    concurrent = unit_repository.get(sample_unit.id)
+    concurrent.update_amenities(["Gym"])
+    unit_repository.save(concurrent)
+
+    loaded = [stale]
+
+    async def command() -> Unit:
+        unit = loaded.pop() if loaded else unit_repository.get(sample_unit.id)
+        unit.mark_as_leased()
+        unit_repository.save(unit)
+        return unit
+
+    unit = asyncio.run(retry.run(command))
+
+    assert unit.is_leased and unit.amenities == ["Gym"]
+    assert retry.stats() == {
+        "commands": 1,
+        "conflicts": 1,
+        "failures": 0,
+        "conflict_rate": 1.0,
+    }
+
+
+def test_retry_gives_up_after_max_attempts():
+    """Test that the conflict is raised once the attempts are exhausted"""
+    retry = RetryOnConflict(max_attempts=3, backoff=0)
+    attempts = []
+
+    async def command() -> None:
+        attempts.append(None)
+        raise IntegrityError("conflict")
+
+    with pytest.raises(IntegrityError):
+        asyncio.run(retry.run(command))
+
+    assert len(attempts) == 3
+    assert retry.stats()["failures"] == 1
@@ -0,0 +1,119 @@
+import time
+from threading import Event, Thread
+
+from eventsourcing.postgres import PostgresDatastore
+
+from src.domain.models import Unit
+from src.domain.repositories import RentalApplication, UnitRepository
+from src.domain.tailer import LogTailer, PostgresWakeup
+from tests.domain.test_persistence import POSTGRES_ENV
+
+
+def test_tailer_is_woken_when_events_are_recorded(unit_repository):
+    """Test that new notifications are received without waiting to poll"""
+    tailer = LogTailer(unit_repository, min_interval=5.0, max_interval=5.0)
+    received = []
+
+    def wait():
+        notifications = tailer.wait(timeout=5.0)
+        received.append((time.monotonic(), notifications))
+
+    thread = Thread(target=wait)
+    thread.start()
+    time.sleep(0.05)
+    unit = Unit.create(address="1 Tail St")
+    recorded = time.monotonic()
+    unit_repository.create(unit)
+    thread.join()
+
+    received_at, notifications = received[0]
+    assert received_at - recorded < 0.1
+    assert notifications[0].originator_id == unit.id
+    assert tailer.position == notifications[-1].id
+
+
+def test_tailer_reads_batches_and_backs_off(unit_repository):
+    unit_repository.create_many(
+        [Unit.create(address=f"{i} Batch St") for i in range(3)]
+    )
+    tailer = LogTailer(
+        unit_repository, batch_size=4, min_interval=0.01, max_interval=0.04
+    )
+
+    assert len(tailer.wait()) == 4
+    assert len(tailer.wait()) == 2
+    assert tailer.wait(timeout=0.2) == []
+    # Polling backed off while there were no new notifications
+    assert tailer.interval == 0.04
+    assert tailer.reads <= 12
+
+    unit_repository.create(Unit.create(address="4 Batch St"))
+    stop = Event()
+    batches = []
+    for batch in tailer.follow(stop):
+        batches.append(batch)
+        stop.set()
+    assert [len(batch) for batch in batches] == [2]
+    assert tailer.interval == 0.01
+
+
+def test_hosted_repositories_share_a_wakeup():
+    rental_app = RentalApplication()
+    tailer = LogTailer(rental_app, min_interval=5.0, max_interval=5.0)
+    tailer.seek_end()
+    assert rental_app.units.wakeup is rental_app.wakeup
+
+    seen = rental_app.wakeup.count
+    rental_app.units.create(Unit.create(address="1 Hosted St"))
+    assert rental_app.wakeup.count > seen
+    assert tailer.wait(timeout=1.0)[0].topic.endswith("Unit.Created")
+    rental_app.close()
+
+
+class RecordingTransaction:
+    def __init__(self, statements):
+        self.statements = statements
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def execute(self, statement, *args, **kwargs):
+        self.statements.append(statement)
+
+
+def test_postgres_trigger_is_created_with_the_table(monkeypatch):
+    """Test that the trigger notifying tailers is created once, with the table,
+    and that tailers don't run DDL"""
+    statements = []
+    monkeypatch.setattr(
+        PostgresDatastore,
+        "transaction",
+        lambda self, commit: RecordingTransaction(statements),
+    )
+    repo = UnitRepository(env={**POSTGRES_ENV, "CREATE_TABLE": "yes"})
+    created = len(statements)
+    assert any(
+        "CREATE OR REPLACE TRIGGER unit_events_recorded AFTER INSERT ON "
+        "unit_events" in statement
+        for statement in statements
+    )
+    assert any("pg_notify('unit_events_recorded'" in s for s in statements)
+
+    wakeup = repo.wakeup
+    assert isinstance(wakeup, PostgresWakeup)
+    assert wakeup.channel == "unit_events_recorded"
+    assert len(statements) == created
+    repo.close()
+    assert wakeup.closed.is_set()
+
+
+def test_postgres_trigger_is_not_created_without_the_table(monkeypatch):
+    created = []
+    monkeypatch.setattr(PostgresWakeup, "create_trigger", created.append)
+    repo = UnitRepository(env=POSTGRES_ENV)
+    assert isinstance(repo.wakeup, PostgresWakeup)
+    assert created == []
+    repo.close()
@@ -0,0 +1,96 @@
+from datetime import date
+
+import pytest
+
+from src.domain.models import Tenant
+from src.domain.projections import ApprovedTenantsProjection
+from src.domain.repositories import LogEvents
+
+
+def _tenant(identification_number: str, first_name: str = "Jane") -> Tenant:
+    return Tenant.create(
+        identification_number=identification_number,
+        first_name=first_name,
+        last_name="Smith",
+        email="jane.smith@example.com",
+        phone_number="555-987-6543",
+        dob=date(1985, 5, 15),
+    )
+
+
+def test_get_by_identification_number(tenant_repository):
+    """Test finding a tenant through the identification number index"""
+    tenant = _tenant("111-22-3333")
+    tenant_repository.create(tenant)
+    tenant_repository.create(_tenant("444-55-6666"))
+
+    found = tenant_repository.get_by_identification_number("111-22-3333")
+
+    assert found.id == tenant.id
+    assert tenant_repository.get_by_identification_number("000-00-0000") is None
+
+
+def test_create_duplicate_identification_number(tenant_repository):
+    """Test that the index rejects a second tenant with the same identification number"""
+    original = _tenant("111-22-3333", first_name="Original")
+    tenant_repository.create(original)
+
+    duplicate = _tenant("111-22-3333", first_name="Duplicate")
+    with pytest.raises(ValueError):
+        tenant_repository.create(duplicate)
+
+    # Nothing of the duplicate was recorded
+    assert tenant_repository.get(duplicate.id) is None
+    assert [tenant.id for tenant in tenant_repository.get_all()] == [original.id]
+    assert tenant_repository.get_by_identification_number("111-22-3333").id == (
+        original.id
+    )
+
+
+def test_get_approved_tenants(tenant_repository):
+    """Test that the approved tenants projection follows approvals and resumes
+    from its log"""
+    tenants = [_tenant(f"{i}00-00-0000") for i in range(3)]
+    for tenant in tenants:
+        tenant.approve()
+        tenant_repository.create(tenant)
+    tenants[1].disapprove()
+    tenant_repository.save(tenants[1])
+
+    approved = tenant_repository.get_approved_tenants()
+
+    assert [tenant.id for tenant in approved] == [tenants[0].id, tenants[2].id]
+    assert tenant_repository.get_approved_tenant_count() == 2
+
+    # A new projection resumes from the log without processing the tenant events
+    projection = ApprovedTenantsProjection(tenant_repository)
+    projection.process_event = None
+    assert projection.get_tenant_ids() == [tenants[0].id, tenants[2].id]
+    assert projection.position == tenant_repository.approved_tenants.position
+
+    tenants[1].approve()
+    tenant_repository.save(tenants[1])
+
+    assert tenant_repository.get_approved_tenant_count() == 3
+    assert len(projection.approved) == 2
+    assert len(ApprovedTenantsProjection(tenant_repository).get_tenant_ids()) == 3
+
+
+def test_reindex_tenants_saved_before_the_index(tenant_repository):
+    """Test back-filling the identification number index of existing tenants"""
+    tenants = [_tenant("111-11-1111"), _tenant("222-22-2222"), _tenant("111-11-1111")]
+    # Tenants were only logged before the index was introduced
+    for tenant in tenants:
+        logged = LogEvents()
+        logged.trigger(tenant_repository.tenant_log, tenant_id=tenant.id)
+        tenant_repository.save_collected(tenant, *logged.events)
+    assert tenant_repository.get_by_identification_number("111-11-1111") is None
+
+    # The first of the tenants sharing a number is indexed
+    assert tenant_repository.reindex() == 2
+    assert tenant_repository.get_by_identification_number("111-11-1111").id == (
+        tenants[0].id
+    )
+    assert tenant_repository.reindex() == 0
+    with pytest.raises(ValueError):
+        tenant_repository.create(_tenant("222-22-2222"))
@@ -0,0 +1,179 @@
+from datetime import date, timedelta
+from uuid import uuid4
+
+import pytest
+from eventsourcing.domain import DomainEvent
+from eventsourcing.persistence import JSONTranscoder
+
+from src.domain.models import Lease, Tenant
+from src.domain.repositories import LeaseRepository, TenantRepository
+from src.domain.transcoders import CompactMapper, OrjsonTranscoder, TypedMapper
+
+
+def create_lease() -> Lease:
+    return Lease.create(
+        unit_id=uuid4(),
+        tenant_ids=[uuid4(), uuid4()],
+        start_date=date.today(),
+        end_date=date.today() + timedelta(days=365),
+    )
+
+
+def test_orjson_mapper_round_trip():
+    """Test that dates, datetimes and UUIDs are encoded natively and decoded"""
+    repo = LeaseRepository(env={"TRANSCODER": "orjson"})
+    assert isinstance(repo.mapper, TypedMapper)
+    assert isinstance(repo.mapper.transcoder, OrjsonTranscoder)
+
+    lease = create_lease()
+    lease.update_dates(end_date=date.today() + timedelta(days=30))
+    for event in lease.collect_events():
+        stored = repo.mapper.to_stored_event(event)
+        assert b"_type_" not in stored.state
+        decoded = repo.mapper.to_domain_event(stored)
+        assert decoded.__dict__ == event.__dict__
+    repo.close()
+
+
+def test_orjson_repository_with_snapshots():
+    """Test that aggregates are reconstructed from events and snapshots"""
+    repo = LeaseRepository(env={"TRANSCODER": "orjson", "SNAPSHOTTING_INTERVAL": "2"})
+    lease = create_lease()
+    lease.sign_by_tenant()
+    repo.create(lease)
+
+    assert repo.snapshots is not None
+    assert list(repo.snapshots.get(lease.id))
+    repo.repository.cache = None
+    saved = repo.get(lease.id)
+    assert saved.unit_id == lease.unit_id
+    assert saved.tenant_ids == lease.tenant_ids
+    assert saved.start_date == lease.start_date
+    assert saved.signed_by_tenant
+    assert repo.get_lease_ids_by_unit_ids([lease.unit_id]) == [[lease.id]]
+    repo.close()
+
+
+def test_orjson_reads_events_written_by_json_transcoder(monkeypatch):
+    """Test that events written by the default transcoder can still be read"""
+    monkeypatch.delenv("TRANSCODER", raising=False)
+    monkeypatch.delenv("EVENT_ENCODING", raising=False)
+    json_repo = TenantRepository()
+    orjson_repo = TenantRepository(env={"TRANSCODER": "orjson"})
+    tenant = Tenant.create(
+        identification_number="123-45-6789",
+        first_name="Jane",
+        last_name="Smith",
+        email="jane.smith@example.com",
+        phone_number="555-987-6543",
+        dob=date(1985, 5, 15),
+    )
+    events = tenant.collect_events()
+    for event in events:
+        stored = json_repo.mapper.to_stored_event(event)
+        assert b"_type_" in stored.state
+        assert orjson_repo.mapper.to_domain_event(stored).__dict__ == event.__dict__
+    json_repo.close()
+    orjson_repo.close()
+
+
+def test_unknown_transcoder():
+    with pytest.raises(ValueError):
+        LeaseRepository(env={"TRANSCODER": "yaml"})
+
+
+def test_compact_mapper_round_trip(monkeypatch):
+    """Test that events are stored without field names, and compressed"""
+    monkeypatch.delenv("TRANSCODER", raising=False)
+    monkeypatch.delenv("EVENT_ENCODING", raising=False)
+    repo = LeaseRepository(
+        env={"EVENT_ENCODING": "compact", "COMPRESSION_THRESHOLD": "0"}
+    )
+    assert isinstance(repo.mapper, CompactMapper)
+    json_repo = LeaseRepository()
+
+    lease = create_lease()
+    lease.update_dates(end_date=date.today() + timedelta(days=30))
+    lease.sign_by_tenant()
+    for event in lease.collect_events():
+        stored = repo.mapper.to_stored_event(event)
+        assert stored.state.startswith(
+            (CompactMapper.COMPACT, CompactMapper.COMPRESSED)
+        )
+        assert b"tenant_ids" not in stored.state
+        assert len(stored.state) < len(json_repo.mapper.to_stored_event(event).state)
+        assert repo.mapper.to_domain_event(stored).__dict__ == event.__dict__
+        # Events written before switching encoding can still be read
+        legacy = json_repo.mapper.to_stored_event(event)
+        assert repo.mapper.to_domain_event(legacy).__dict__ == event.__dict__
+    repo.close()
+    json_repo.close()
+
+
+def test_compact_repository_with_snapshots():
+    """Test that aggregates saved with the compact encoding can be read"""
+    repo = LeaseRepository(
+        env={
+            "EVENT_ENCODING": "compact",
+            "TRANSCODER": "orjson",
+            "SNAPSHOTTING_INTERVAL": "2",
+        }
+    )
+    lease = create_lease()
+    lease.sign_by_tenant()
+    repo.create(lease)
+    repo.repository.cache = None
+    saved = repo.get(lease.id)
+    assert saved.tenant_ids == lease.tenant_ids
+    assert saved.end_date == lease.end_date
+    assert repo.get_lease_ids_by_tenant_ids(lease.tenant_ids[:1]) == [[lease.id]]
+    repo.close()
+
+
+class Registered(DomainEvent):
+    name: str
+    email: str
+
+
+class RegisteredWithPhone(DomainEvent):
+    name: str
+    email: str
+    phone: str
+
+
+class RegisteredWithFullName(DomainEvent):
+    full_name: str
+    email: str
+
+
+def test_compact_encoding_detects_changed_fields():
+    """Test that events are decoded after fields are added at the end of their
+    class, but not after fields are renamed"""
+    mapper = CompactMapper(JSONTranscoder())
+    state = {
+        "timestamp": "2025-01-01T00:00:00+00:00",
+        "name": "Jane",
+        "email": "jane@example.com",
+    }
+    data = mapper.encode_state(Registered, dict(state))
+    assert b"email" not in data
+    assert mapper.decode_state(Registered, data) == state
+    assert mapper.decode_state(RegisteredWithPhone, data) == state
+    with pytest.raises(ValueError, match="RegisteredWithFullName"):
+        mapper.decode_state(RegisteredWithFullName, data)
+
+    # Keys which aren't fields aren't mistaken for the value of an added field
+    data = mapper.encode_state(Registered, {**state, "class_version": 2})
+    assert mapper.decode_state(RegisteredWithPhone, data) == {
+        **state,
+        "class_version": 2,
+    }
+
+
+class Unresolvable(DomainEvent):
+    value: "MissingType"  # noqa: F821
+
+
+def test_unresolvable_type_hints_fail():
+    with pytest.raises(TypeError, match="Unresolvable"):
+        CompactMapper(JSONTranscoder()).encode_state(Unresolvable, {"value": 1})
@@ -0,0 +1,72 @@
+from datetime import date, timedelta
+
+from src.domain.models import Unit, Lease
+from src.domain.repositories import RentalApplication
+from src.domain.unit_of_work import UnitOfWork
+
+
+def _count_inserts(monkeypatch, recorder) -> list:
+    inserts = []
+    insert_events = recorder.insert_events
+
+    def counting_insert_events(stored_events, **kwargs):
+        inserts.append(stored_events)
+        return insert_events(stored_events, **kwargs)
+
+    monkeypatch.setattr(recorder, "insert_events", counting_insert_events)
+    return inserts
+
+
+def test_commit_in_one_transaction(monkeypatch):
+    """Test that a unit of work over one event store records in one transaction"""
+    rental_app = RentalApplication()
+    inserts = _count_inserts(monkeypatch, rental_app.recorder)
+
+    unit = Unit.create(address="1 Atomic St", amenities=[])
+    lease = Lease.create(
+        unit_id=unit.id,
+        tenant_ids=[],
+        start_date=date.today(),
+        end_date=date.today() + timedelta(days=365),
+    )
+    unit_of_work = UnitOfWork()
+    unit_of_work.create(rental_app.units, unit)
+    unit_of_work.create(rental_app.leases, lease)
+    unit_of_work.commit()
+
+    assert len(inserts) == 1
+    assert rental_app.leases.get_lease_ids_by_unit_id(unit.id) == [lease.id]
+    assert [u.id for u in rental_app.units.get_all()] == [unit.id]
+
+    lease.sign_by_tenant()
+    unit.mark_as_leased()
+    unit_of_work.save(rental_app.leases, lease)
+    unit_of_work.save(rental_app.units, unit)
+    unit_of_work.commit()
+
+    assert len(inserts) == 2
+    assert rental_app.leases.get(lease.id).signed_by_tenant
+    assert rental_app.units.get(unit.id).is_leased
+    rental_app.close()
+
+
+def test_commit_per_event_store(monkeypatch, unit_repository, lease_repository):
+    """Test that separate repositories each record their own changes"""
+    unit_inserts = _count_inserts(monkeypatch, unit_repository.recorder)
+    lease_inserts = _count_inserts(monkeypatch, lease_repository.recorder)
+
+    unit = Unit.create(address="2 Separate St", amenities=[])
+    lease = Lease.create(
+        unit_id=unit.id,
+        tenant_ids=[],
+        start_date=date.today(),
+        end_date=date.today() + timedelta(days=365),
+    )
+    unit_of_work = UnitOfWork()
+    unit_of_work.create(unit_repository, unit)
+    unit_of_work.create(lease_repository, lease)
+    unit_of_work.commit()
+
+    assert (len(unit_inserts), len(lease_inserts)) == (1, 1)
+    assert unit_repository.get(unit.id) is not None
+    assert lease_repository.get_lease_ids_by_unit_id(unit.id) == [lease.id]
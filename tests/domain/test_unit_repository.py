@@ -1,4 +1,12 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from uuid import uuid4
+
+from src.domain.async_repositories import AsyncUnitRepository
+from src.domain import repositories
 from src.domain.models import Unit
+from src.domain.repositories import UnitRepository
 
 
 def test_save_and_get_unit(unit_repository):
@@ -73,3 +81,285 @@ def test_get_available_units(unit_repository):
     # Verify only the available unit is returned
     assert len(available_units) == 1
     assert available_units[0].address == available_address
+
+
+def test_snapshotting_interval():
+    """Test that units are snapshotted every snapshotting interval events"""
+    repo = UnitRepository(env={"SNAPSHOTTING_INTERVAL": "4"})
+    unit = Unit.create(address="123 Snapshot St")
+    repo.create(unit)
+    for _ in range(2):
+        unit.mark_as_leased()
+        unit.mark_as_available()
+        repo.save(unit)
+
+    snapshots = list(repo.snapshots.get(unit.id))
+    assert [snapshot.originator_version for snapshot in snapshots] == [4]
+    assert repo.get(unit.id).version == 5
+    repo.close()
+
+
+def test_snapshotting_events():
+    """Test that units are snapshotted after configured event types"""
+    repo = UnitRepository(
+        env={"SNAPSHOTTING_INTERVAL": "0", "SNAPSHOTTING_EVENTS": "MarkedAsLeased"}
+    )
+    unit = Unit.create(address="123 Snapshot St")
+    repo.create(unit)
+    unit.mark_as_leased()
+    unit.mark_as_available()
+    repo.save(unit)
+
+    snapshots = list(repo.snapshots.get(unit.id))
+    assert [snapshot.originator_version for snapshot in snapshots] == [2]
+    assert repo.get(unit.id).is_leased is False
+    repo.close()
+
+
+def test_backfill_snapshots():
+    """Test back-filling snapshots of existing units"""
+    repo = UnitRepository(env={"SNAPSHOTTING_INTERVAL": "0"})
+    long_lived = Unit.create(address="123 Long Lived St")
+    repo.create(long_lived)
+    for _ in range(3):
+        long_lived.mark_as_leased()
+        long_lived.mark_as_available()
+        repo.save(long_lived)
+    repo.create(Unit.create(address="456 New St"))
+
+    assert repo.backfill_snapshots(min_events=2) == 1
+    snapshots = list(repo.snapshots.get(long_lived.id))
+    assert [snapshot.originator_version for snapshot in snapshots] == [7]
+
+    # Nothing new to snapshot
+    assert repo.backfill_snapshots(min_events=2) == 0
+    repo.close()
+
+
+def test_aggregate_cache(unit_repository):
+    """Test that units are served from the cache and refreshed when saved"""
+    unit = Unit.create(address="123 Cached St")
+    unit_repository.create(unit)
+
+    first = unit_repository.get(unit.id)
+    first.update_address("Uncommitted change")
+    second = unit_repository.get(unit.id)
+
+    # Cached units are copied, so commands don't corrupt the cache
+    assert second.address == "123 Cached St"
+
+    second.mark_as_leased()
+    unit_repository.save(second)
+    assert unit_repository.get(unit.id).is_leased is True
+
+    stats = unit_repository.cache_stats()
+    assert stats["hits"] == 3
+    assert stats["misses"] == 0
+    assert stats["size"] == 1
+
+
+def test_aggregate_cache_evictions():
+    """Test that the cache is bounded and counts evictions"""
+    repo = UnitRepository(env={"AGGREGATE_CACHE_MAXSIZE": "2"})
+    units = [Unit.create(address=f"{i} Evicted St") for i in range(3)]
+    for unit in units:
+        repo.create(unit)
+
+    assert repo.get(units[0].id).address == "0 Evicted St"
+
+    stats = repo.cache_stats()
+    assert stats["evictions"] == 2
+    assert stats["misses"] == 1
+    assert stats["size"] == 2
+    repo.close()
+
+
+def test_get_many(unit_repository):
+    """Test getting many units in the order of the given IDs"""
+    units = [Unit.create(address=f"{i} Batch St") for i in range(3)]
+    for unit in units:
+        unit_repository.create(unit)
+    units[1].mark_as_leased()
+    unit_repository.save(units[1])
+
+    missing_id = uuid4()
+    retrieved = unit_repository.get_many(
+        [units[2].id, missing_id, str(units[1].id), units[0].id]
+    )
+
+    assert retrieved[1] is None
+    assert [unit.address for unit in retrieved if unit] == [
+        "2 Batch St",
+        "1 Batch St",
+        "0 Batch St",
+    ]
+    assert retrieved[2].is_leased is True
+    # The unit log isn't a unit
+    assert unit_repository.get_many([unit_repository.unit_log.originator_id]) == [None]
+
+
+def test_get_many_from_snapshots_in_chunks():
+    """Test that batched gets use snapshots and select events in chunks"""
+    repo = UnitRepository(env={"SNAPSHOTTING_INTERVAL": "2"})
+    repo.get_many_chunk_size = 2
+    units = [Unit.create(address=f"{i} Snapshot St") for i in range(3)]
+    for unit in units:
+        unit.mark_as_leased()
+        unit.mark_as_available()
+        unit.mark_as_unleasable()
+        repo.create(unit)
+
+    retrieved = repo.get_many(unit.id for unit in units)
+
+    assert [unit.version for unit in retrieved] == [4, 4, 4]
+    assert all(not unit.is_leasable for unit in retrieved)
+    repo.close()
+
+
+def test_get_many_selects_events_after_the_latest_snapshot(monkeypatch):
+    """Test that batched gets only select the latest snapshots and the events
+    after them"""
+    repo = UnitRepository(
+        env={"SNAPSHOTTING_INTERVAL": "2", "AGGREGATE_CACHE_MAXSIZE": ""}
+    )
+    units = [Unit.create(address=f"{i} Latest St") for i in range(2)]
+    for unit in units:
+        unit.mark_as_leased()
+        unit.mark_as_available()
+        unit.mark_as_unleasable()
+        unit.mark_as_leasable()
+        repo.create(unit)
+    selected = []
+    for name in ("select_events_many", "select_last_events_many"):
+
+        def recording_select(*args, _select=getattr(repositories, name), **kwargs):
+            result = _select(*args, **kwargs)
+            selected.append(result)
+            return result
+
+        monkeypatch.setattr(repositories, name, recording_select)
+
+    retrieved = repo.get_many(unit.id for unit in units)
+
+    assert [unit.version for unit in retrieved] == [5, 5]
+    snapshots, events = selected
+    assert [snapshot.originator_version for snapshot in snapshots.values()] == [4, 4]
+    assert [
+        [stored_event.originator_version for stored_event in stored_events]
+        for stored_events in events.values()
+    ] == [[5], [5]]
+    repo.close()
+
+
+def test_get_many_uses_the_aggregate_cache(unit_repository):
+    """Test that batched gets fast-forward cached aggregates, and cache those
+    they reconstruct"""
+    cache = unit_repository.repository.cache
+    cached_unit = Unit.create(address="1 Cached St")
+    unit_repository.create(cached_unit)
+    other_unit = Unit.create(address="2 Uncached St")
+    unit_repository.create(other_unit)
+    cache.get(other_unit.id, evict=True)
+    # Recorded without updating the cache, e.g. by another process
+    changed = unit_repository.get(cached_unit.id)
+    changed.mark_as_leased()
+    unit_repository.events.put(changed.collect_events())
+
+    retrieved = unit_repository.get_many([cached_unit.id, other_unit.id])
+
+    assert retrieved[0].is_leased is True
+    assert retrieved[0] is not cache.get(cached_unit.id)
+    assert cache.get(other_unit.id).address == "2 Uncached St"
+    assert retrieved[1] is not cache.get(other_unit.id)
+
+    # The fast-forwarded unit is cached, so its events aren't applied again
+    assert cache.get(cached_unit.id).version == 2
+    assert cache.get(cached_unit.id).is_leased is True
+    to_domain_event = unit_repository.mapper.to_domain_event
+    decoded = []
+
+    def counting_to_domain_event(stored):
+        decoded.append(stored)
+        return to_domain_event(stored)
+
+    unit_repository.mapper.to_domain_event = counting_to_domain_event
+    assert unit_repository.get_many([cached_unit.id])[0].is_leased is True
+    assert decoded == []
+
+
+def test_available_units_projection(unit_repository):
+    """Test that the available units projection follows unit events"""
+    projection = unit_repository.available_units
+    first = Unit.create(address="1 Projected St")
+    second = Unit.create(address="2 Projected St")
+    unit_repository.create(first)
+    unit_repository.create(second)
+
+    assert projection.get_unit_ids() == [first.id, second.id]
+    position = projection.position
+
+    first.mark_as_leased()
+    second.mark_as_unleasable()
+    unit_repository.save(first)
+    unit_repository.save(second)
+    assert projection.get_unit_ids() == []
+    assert projection.position > position
+
+    second.mark_as_leasable()
+    unit_repository.save(second)
+    assert [unit.id for unit in unit_repository.get_available_units()] == [second.id]
+
+
+def test_async_repository_runs_concurrently(unit_repository, sample_unit):
+    """Test that awaiting the async repository doesn't block the event loop"""
+    sample_unit.mark_as_leasable()
+    unit_repository.save(sample_unit)
+    get_available_units = unit_repository.get_available_units
+
+    def slow_get_available_units():
+        time.sleep(0.1)
+        return get_available_units()
+
+    unit_repository.get_available_units = slow_get_available_units
+
+    async def get_units():
+        with ThreadPoolExecutor(max_workers=10) as executor:
+            repo = AsyncUnitRepository(unit_repository, executor)
+            return await asyncio.gather(
+                *[repo.get_available_units() for _ in range(10)]
+            )
+
+    started = time.monotonic()
+    units = asyncio.run(get_units())
+
+    assert [[unit.id for unit in available] for available in units] == [
+        [sample_unit.id]
+    ] * 10
+    assert time.monotonic() - started < 0.5
+
+
+def test_iter_all_units_in_chunks(unit_repository):
+    """Test that units are reconstructed lazily, a chunk at a time"""
+    unit_repository.get_many_chunk_size = 2
+    units = [Unit.create(address=f"{i} Stream St") for i in range(5)]
+    unit_repository.create_many(units)
+
+    chunks = []
+    get_many = unit_repository.get_many
+
+    def counting_get_many(ids):
+        chunks.append(len(ids))
+        return get_many(ids)
+
+    unit_repository.get_many = counting_get_many
+    iterator = unit_repository.iter_all()
+    assert next(iterator).id == units[0].id
+    assert chunks == [2]
+    assert [unit.id for unit in iterator] == [unit.id for unit in units[1:]]
+    assert chunks == [2, 2, 1]
+
+    async def iter_all():
+        repo = AsyncUnitRepository(unit_repository)
+        return [unit.id async for unit in repo.iter_all(chunk_size=3)]
+
+    assert asyncio.run(iter_all()) == [unit.id for unit in units]
@@ -79,3 +79,37 @@ def lease(client, approved_tenant, unit) -> dict:
     response = client.post("/graphql", json={"query": create_active_lease_query})
     assert response.status_code == 200
     return response.json()["data"]["createLease"]
+
+
+@pytest.fixture
+def store_reads(client, monkeypatch) -> list:
+    """Records the store reads made by the repositories of the app"""
+    from src import main
+    from src.domain import async_persistence, repositories
+
+    reads = []
+    for module in (repositories, async_persistence):
+        for name in ("select_events_many", "select_last_events_many"):
+
+            def counting_select(
+                recorder,
+                originator_ids,
+                *args,
+                _select=getattr(module, name),
+                **kwargs,
+            ):
+                reads.append(list(originator_ids))
+                return _select(recorder, originator_ids, *args, **kwargs)
+
+            monkeypatch.setattr(module, name, counting_select)
+    for name in ("unit_repo", "tenant_repo", "lease_repo"):
+        recorder = main.app_state[name].recorder
+
+        def counting_select_events(originator_id, *args, _recorder=recorder, **kwargs):
+            reads.append([originator_id])
+            return type(_recorder).select_events(
+                _recorder, originator_id, *args, **kwargs
+            )
+
+        monkeypatch.setattr(recorder, "select_events", counting_select_events)
+    return reads
@@ -0,0 +1,62 @@
+import json
+
+from src.domain.models import Unit
+from src.main import app_state
+
+
+def create_units(count):
+    units = [
+        Unit.create(address=f"{i} Export St", amenities=["Pool"]) for i in range(count)
+    ]
+    app_state["unit_repo"].create_many(units)
+    return units
+
+
+def read_ndjson(content):
+    return [json.loads(line) for line in content.decode().splitlines()]
+
+
+def test_export_aggregates(client):
+    """Test streaming the current state of units, resuming from a position"""
+    units = create_units(5)
+    app_state["unit_repo"].get_many_chunk_size = 2
+
+    response = client.get("/export/unit")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    records = read_ndjson(response.content)
+    assert [record["id"] for record in records] == [str(unit.id) for unit in units]
+    assert records[0]["type"] == "Unit"
+    assert records[0]["state"]["address"] == "0 Export St"
+    assert records[0]["state"]["amenities"] == ["Pool"]
+
+    position = records[2]["position"]
+    response = client.get("/export/unit", params={"from_position": position + 1})
+    resumed = read_ndjson(response.content)
+    assert [record["id"] for record in resumed] == [str(unit.id) for unit in units[3:]]
+
+
+def test_export_events_gzipped(client):
+    """Test streaming the events of the notification log, compressed"""
+    units = create_units(3)
+
+    response = client.get(
+        "/export/unit",
+        params={"kind": "events", "gzip": "true", "from_position": 2},
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    # The client decompresses the content
+    records = read_ndjson(response.content)
+    assert [record["position"] for record in records] == list(range(2, 7))
+    created = [record for record in records if record["topic"].endswith("Unit.Created")]
+    assert [record["originator_id"] for record in created] == [
+        str(unit.id) for unit in units[1:]
+    ]
+    assert created[0]["state"]["address"] == "1 Export St"
+
+
+def test_export_unknown_repository(client):
+    assert client.get("/export/building").status_code == 422
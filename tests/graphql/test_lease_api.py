@@ -1,4 +1,14 @@
+import json
 from datetime import date, timedelta
+from uuid import UUID, uuid4
+
+import pytest
+from eventsourcing.persistence import IntegrityError
+from fastapi.testclient import TestClient
+
+from src import main
+from src.domain.repositories import RentalApplication
+from tests.domain.test_encryption import CIPHER_KEY
 
 
 def test_create_lease_mutation(client, unit, approved_tenant):
@@ -67,6 +77,34 @@ def test_sign_lease_mutation(client, lease):
     assert lease_data["signedAt"] is not None
 
 
+def test_sign_lease_retried_after_unit_conflict(client, lease, unit):
+    """Test that a retried signLease doesn't sign the lease again when only the
+    unit's save conflicted"""
+    unit_repo = main.app_state["unit_repo"]
+    save_collected = unit_repo.save_collected
+    conflicts = []
+
+    def conflicting_save_collected(*objs):
+        if not conflicts:
+            conflicts.append(objs)
+            raise IntegrityError("Unit was saved concurrently")
+        save_collected(*objs)
+
+    unit_repo.save_collected = conflicting_save_collected
+    query = f'mutation {{ signLease(id: "{lease["id"]}") {{ signedByTenant }} }}'
+
+    response = client.post("/graphql", json={"query": query})
+
+    assert response.json() == {"data": {"signLease": {"signedByTenant": True}}}
+    assert len(conflicts) == 1
+    lease_events = main.app_state["lease_repo"].repository.event_store.get(
+        UUID(lease["id"])
+    )
+    signed = [e for e in lease_events if type(e).__name__ == "SignedByTenant"]
+    assert len(signed) == 1
+    assert unit_repo.get(UUID(unit["id"])).is_leased
+
+
 def test_active_leases_query(client):
     """Test retrieving active leases through the GraphQL API"""
     # Create a unit via API
@@ -294,3 +332,306 @@ def test_create_lease_validation(client):
     data = response.json()
     # Should have errors due to unapproved tenant
     assert "errors" in data
+
+
+def _create_lease(client, unit_address: str, tenant_id: str) -> dict:
+    create_unit_query = f"""
+    mutation {{
+      createUnit(input: {{ address: "{unit_address}", amenities: [] }}) {{
+        id
+      }}
+    }}
+    """
+    response = client.post("/graphql", json={"query": create_unit_query})
+    unit_id = response.json()["data"]["createUnit"]["id"]
+
+    today = date.today()
+    create_lease_query = f"""
+    mutation {{
+      createLease(input: {{
+        unitId: "{unit_id}",
+        tenantIds: ["{tenant_id}"],
+        startDate: "{today.isoformat()}",
+        endDate: "{(today + timedelta(days=365)).isoformat()}"
+      }}) {{
+        id
+      }}
+    }}
+    """
+    response = client.post("/graphql", json={"query": create_lease_query})
+    data = response.json()
+    assert "errors" not in data
+    return data["data"]["createLease"]
+
+
+def test_leases_query_store_reads_are_batched(client, approved_tenant, store_reads):
+    """Test that listing leases with their units and tenants costs a constant
+    number of store reads, however many leases there are"""
+    query = """
+    query {
+      leases {
+        unit { address leases { id } activeLease { id } }
+        tenants { fullName leases { id } }
+      }
+    }
+    """
+
+    def count_reads() -> int:
+        store_reads.clear()
+        response = client.post("/graphql", json={"query": query})
+        assert "errors" not in response.json()
+        return len(store_reads)
+
+    _create_lease(client, "First Unit", approved_tenant["id"])
+    reads_for_one_lease = count_reads()
+
+    for i in range(4):
+        _create_lease(client, f"Unit {i}", approved_tenant["id"])
+    response = client.post("/graphql", json={"query": query})
+    assert len(response.json()["data"]["leases"]) == 5
+
+    assert count_reads() == reads_for_one_lease
+
+
+def test_lease_tenants_are_fetched_in_one_batch(client, unit, store_reads):
+    """Test that a lease's tenants are read from the store in one batch,
+    skipping tenants that don't exist"""
+    tenant_ids = []
+    for i in range(5):
+        create_tenant_query = f"""
+        mutation {{
+          createTenant(input: {{
+            identificationNumber: "batch-tenant-{i}",
+            firstName: "Tenant",
+            lastName: "{i}",
+            email: "tenant{i}@example.com",
+            phoneNumber: "555-000-000{i}",
+            dob: "1990-01-01"
+          }}) {{
+            id
+          }}
+        }}
+        """
+        response = client.post("/graphql", json={"query": create_tenant_query})
+        tenant_id = response.json()["data"]["createTenant"]["id"]
+        approve_query = f'mutation {{ approveTenant(id: "{tenant_id}") {{ id }} }}'
+        client.post("/graphql", json={"query": approve_query})
+        tenant_ids.append(tenant_id)
+
+    today = date.today()
+    create_lease_query = f"""
+    mutation {{
+      createLease(input: {{
+        unitId: "{unit['id']}",
+        tenantIds: {json.dumps(tenant_ids)},
+        startDate: "{today.isoformat()}",
+        endDate: "{(today + timedelta(days=365)).isoformat()}"
+      }}) {{
+        id
+      }}
+    }}
+    """
+    response = client.post("/graphql", json={"query": create_lease_query})
+    lease_id = response.json()["data"]["createLease"]["id"]
+
+    # A tenant which was never created
+    lease_repo = main.app_state["lease_repo"]
+    lease = lease_repo.get(UUID(lease_id))
+    missing_tenant_id = uuid4()
+    lease.add_tenant(missing_tenant_id)
+    lease_repo.save(lease)
+
+    store_reads.clear()
+    query = f'query {{ lease(id: "{lease_id}") {{ tenants {{ lastName }} }} }}'
+    response = client.post("/graphql", json={"query": query})
+    data = response.json()
+    assert "errors" not in data
+    assert [tenant["lastName"] for tenant in data["data"]["lease"]["tenants"]] == [
+        str(i) for i in range(5)
+    ]
+
+    # The new events of all tenants are selected in one read, and the snapshots
+    # of those which aren't cached in another
+    all_tenant_ids = {UUID(tenant_id) for tenant_id in tenant_ids}
+    all_tenant_ids.add(missing_tenant_id)
+    tenant_reads = [ids for ids in store_reads if all_tenant_ids & set(ids)]
+    assert [set(ids) for ids in tenant_reads] == [{missing_tenant_id}, all_tenant_ids]
+
+
+def test_active_leases_as_of(client, approved_tenant):
+    """Test querying the active leases on a given date"""
+    lease = _create_lease(client, "12 As Of St", approved_tenant["id"])
+    response = client.post(
+        "/graphql",
+        json={"query": f'mutation {{ signLease(id: "{lease["id"]}") {{ id }} }}'},
+    )
+    assert "errors" not in response.json()
+
+    query = """
+    query ActiveLeases($asOf: Date) {
+      activeLeases(asOf: $asOf) {
+        id
+        unit { activeLease(asOf: $asOf) { id } }
+      }
+    }
+    """
+    next_month = (date.today() + timedelta(days=30)).isoformat()
+    response = client.post(
+        "/graphql", json={"query": query, "variables": {"asOf": next_month}}
+    )
+    data = response.json()
+    assert "errors" not in data
+    assert data["data"]["activeLeases"] == [
+        {"id": lease["id"], "unit": {"activeLease": {"id": lease["id"]}}}
+    ]
+
+    next_decade = (date.today() + timedelta(days=3650)).isoformat()
+    response = client.post(
+        "/graphql", json={"query": query, "variables": {"asOf": next_decade}}
+    )
+    assert response.json()["data"]["activeLeases"] == []
+
+
+def test_sign_lease_single_application(monkeypatch):
+    """Test the lease flow with all aggregates hosted by one application"""
+    monkeypatch.setenv("SINGLE_APPLICATION", "y")
+    with TestClient(main.app) as client:
+        assert isinstance(main.app_state["unit_repo"].host, RentalApplication)
+
+        response = client.post(
+            "/graphql",
+            json={
+                "query": """
+                mutation {
+                  createTenant(input: {
+                    identificationNumber: "single-app-tenant",
+                    firstName: "Single",
+                    lastName: "Tenant",
+                    email: "single@example.com",
+                    phoneNumber: "555-000-0000",
+                    dob: "1990-01-01"
+                  }) { id }
+                }
+                """
+            },
+        )
+        tenant_id = response.json()["data"]["createTenant"]["id"]
+        client.post(
+            "/graphql",
+            json={"query": f'mutation {{ approveTenant(id: "{tenant_id}") {{ id }} }}'},
+        )
+        lease = _create_lease(client, "1 Single App St", tenant_id)
+
+        query = f"""
+        mutation {{
+          signLease(id: "{lease['id']}") {{
+            signedByTenant
+            unit {{ isLeased activeLease {{ id }} }}
+            tenants {{ id }}
+          }}
+        }}
+        """
+        response = client.post("/graphql", json={"query": query})
+        data = response.json()
+        assert "errors" not in data
+        assert data["data"]["signLease"] == {
+            "signedByTenant": True,
+            "unit": {"isLeased": True, "activeLease": {"id": lease["id"]}},
+            "tenants": [{"id": tenant_id}],
+        }
+
+
+@pytest.mark.parametrize(
+    "env",
+    [
+        {"TRANSCODER": "orjson"},
+        {"TRANSCODER": "orjson", "EVENT_ENCODING": "compact"},
+        {
+            "CIPHER_MODE": "fields",
+            "CIPHER_KEY": CIPHER_KEY,
+            "CIPHER_TOPIC": "tests.domain.test_encryption:XorCipher",
+        },
+    ],
+)
+def test_sign_lease_with_typed_mappers(monkeypatch, env):
+    """Test the lease flow when the mapper decodes IDs as UUIDs"""
+    for key, value in {**env, "AGGREGATE_CACHE_MAXSIZE": ""}.items():
+        monkeypatch.setenv(key, value)
+    with TestClient(main.app) as client:
+        response = client.post(
+            "/graphql",
+            json={
+                "query": """
+                mutation {
+                  createTenant(input: {
+                    identificationNumber: "typed-mapper-tenant",
+                    firstName: "Typed",
+                    lastName: "Tenant",
+                    email: "typed@example.com",
+                    phoneNumber: "555-000-0001",
+                    dob: "1990-01-01"
+                  }) { id }
+                }
+                """
+            },
+        )
+        tenant_id = response.json()["data"]["createTenant"]["id"]
+        client.post(
+            "/graphql",
+            json={"query": f'mutation {{ approveTenant(id: "{tenant_id}") {{ id }} }}'},
+        )
+        lease = _create_lease(client, "1 Typed Mapper St", tenant_id)
+
+        query = f"""
+        mutation {{
+          signLease(id: "{lease['id']}") {{
+            signedByTenant
+            unit {{ isLeased }}
+          }}
+        }}
+        """
+        response = client.post("/graphql", json={"query": query})
+        data = response.json()
+        assert "errors" not in data
+        assert data["data"]["signLease"] == {
+            "signedByTenant": True,
+            "unit": {"isLeased": True},
+        }
+
+
+def test_create_leases_mutation(client, unit, approved_tenant):
+    """Test creating many leases in one mutation, validating them all first"""
+    today = date.today()
+    lease_inputs = ", ".join(
+        f"""{{
+          unitId: "{unit['id']}",
+          tenantIds: ["{approved_tenant['id']}"],
+          startDate: "{(today + timedelta(days=365 * i)).isoformat()}",
+          endDate: "{(today + timedelta(days=365 * (i + 1) - 1)).isoformat()}"
+        }}"""
+        for i in range(3)
+    )
+    query = f"mutation {{ createLeases(inputs: [{lease_inputs}]) {{ id }} }}"
+    response = client.post("/graphql", json={"query": query})
+    data = response.json()
+    assert "errors" not in data
+    lease_ids = [lease["id"] for lease in data["data"]["createLeases"]]
+    assert len(lease_ids) == 3
+
+    query = f'query {{ unit(id: "{unit["id"]}") {{ leases {{ id }} }} }}'
+    response = client.post("/graphql", json={"query": query})
+    leases = response.json()["data"]["unit"]["leases"]
+    assert [lease["id"] for lease in leases] == lease_ids
+
+    query = f"""
+    mutation {{
+      createLeases(inputs: [{{
+        unitId: "{uuid4()}",
+        tenantIds: ["{approved_tenant['id']}"],
+        startDate: "{today.isoformat()}",
+        endDate: "{(today + timedelta(days=30)).isoformat()}"
+      }}]) {{ id }}
+    }}
+    """
+    response = client.post("/graphql", json={"query": query})
+    assert "not found" in response.json()["errors"][0]["message"]
@@ -0,0 +1,94 @@
+import time
+from datetime import date, timedelta
+
+from src.domain.models import Unit
+from src.main import app_state
+
+
+def subscribe(websocket, query):
+    websocket.send_json({"type": "connection_init"})
+    assert websocket.receive_json()["type"] == "connection_ack"
+    websocket.send_json({"id": "1", "type": "subscribe", "payload": {"query": query}})
+    # Wait until the subscriber receives new events
+    events = app_state["events"]
+    deadline = time.monotonic() + 5
+    while not (events.subscribers and events.reads):
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def receive_event(websocket):
+    message = websocket.receive_json()
+    assert message["type"] == "next", message
+    assert "errors" not in message["payload"]
+    return next(iter(message["payload"]["data"].values()))
+
+
+def test_unit_events_subscription(client):
+    """Test that new unit events are streamed to a subscriber"""
+    unit = Unit.create(address="1 Subscribed St")
+    app_state["unit_repo"].create(unit)
+    app_state["events"].interval = 0.01
+
+    with client.websocket_connect(
+        "/graphql", subprotocols=["graphql-transport-ws"]
+    ) as websocket:
+        subscribe(
+            websocket,
+            f'subscription {{ unitEvents(unitId: "{unit.id}") {{ aggregateId version type data }} }}',
+        )
+        # Other units' events aren't streamed
+        app_state["unit_repo"].create(Unit.create(address="2 Other St"))
+        unit.mark_as_leased()
+        app_state["unit_repo"].save(unit)
+
+        event = receive_event(websocket)
+        assert event["aggregateId"] == str(unit.id)
+        assert event["version"] == 2
+        assert event["type"] == "Unit.MarkedAsLeased"
+        assert event["data"] == {}
+
+
+def test_lease_events_subscription(client, unit, approved_tenant):
+    """Test that the events of the leases of a unit are streamed, for leases
+    created through the API"""
+    app_state["events"].interval = 0.01
+    start_date = date.today()
+    end_date = start_date + timedelta(days=365)
+
+    with client.websocket_connect(
+        "/graphql", subprotocols=["graphql-transport-ws"]
+    ) as websocket:
+        subscribe(
+            websocket,
+            f'subscription {{ leaseEvents(unitId: "{unit["id"]}") {{ aggregateId type data }} }}',
+        )
+        response = client.post(
+            "/graphql",
+            json={
+                "query": f"""
+                mutation {{
+                  createLease(input: {{
+                    unitId: "{unit["id"]}",
+                    tenantIds: ["{approved_tenant["id"]}"],
+                    startDate: "{start_date.isoformat()}",
+                    endDate: "{end_date.isoformat()}"
+                  }}) {{ id }}
+                }}
+                """
+            },
+        )
+        lease_id = response.json()["data"]["createLease"]["id"]
+        response = client.post(
+            "/graphql",
+            json={"query": f'mutation {{ signLease(id: "{lease_id}") {{ id }} }}'},
+        )
+        assert "errors" not in response.json()
+
+        created = receive_event(websocket)
+        assert created["type"] == "Lease.Created"
+        assert created["data"]["unit_id"] == unit["id"]
+        assert created["data"]["start_date"] == start_date.isoformat()
+        signed = receive_event(websocket)
+        assert signed["aggregateId"] == lease_id
+        assert signed["type"] == "Lease.SignedByTenant"
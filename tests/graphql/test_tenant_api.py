@@ -256,3 +256,48 @@ def test_approved_tenants_query(client):
             break
 
     assert found_approved is True
+
+
+def test_create_tenants_mutation(client, tenant):
+    """Test that tenants are created together, or not at all if any
+    identification number is taken"""
+    query = """
+    mutation {
+      createTenants(inputs: [
+        { identificationNumber: "bulk-1", firstName: "A", lastName: "One",
+          email: "a@example.com", phoneNumber: "555-000-0001", dob: "1990-01-01" },
+        { identificationNumber: "bulk-2", firstName: "B", lastName: "Two",
+          email: "b@example.com", phoneNumber: "555-000-0002", dob: "1990-01-01" }
+      ]) {
+        identificationNumber
+      }
+    }
+    """
+    response = client.post("/graphql", json={"query": query})
+    data = response.json()
+    assert "errors" not in data
+    assert data["data"]["createTenants"] == [
+        {"identificationNumber": "bulk-1"},
+        {"identificationNumber": "bulk-2"},
+    ]
+
+    query = f"""
+    mutation {{
+      createTenants(inputs: [
+        {{ identificationNumber: "bulk-3", firstName: "C", lastName: "Three",
+          email: "c@example.com", phoneNumber: "555-000-0003", dob: "1990-01-01" }},
+        {{ identificationNumber: "{tenant['identificationNumber']}", firstName: "D",
+          lastName: "Four", email: "d@example.com", phoneNumber: "555-000-0004",
+          dob: "1990-01-01" }}
+      ]) {{
+        id
+      }}
+    }}
+    """
+    response = client.post("/graphql", json={"query": query})
+    data = response.json()
+    assert "already exist" in data["errors"][0]["message"]
+
+    query = 'query { tenantByIdentification(identificationNumber: "bulk-3") { id } }'
+    response = client.post("/graphql", json={"query": query})
+    assert response.json()["data"]["tenantByIdentification"] is None
@@ -361,3 +361,98 @@ def test_available_units_query(client):
     # Leased unit should not be in results
     addresses = [unit["address"] for unit in units_data]
     assert "Leased Unit" not in addresses
+
+
+def test_units_connection_pagination(client):
+    """Test paging through units with cursors"""
+    addresses = [f"{i} Paginated St" for i in range(5)]
+    for address in addresses:
+        query = f"""
+        mutation {{
+          createUnit(input: {{ address: "{address}", amenities: [] }}) {{
+            id
+          }}
+        }}
+        """
+        response = client.post("/graphql", json={"query": query})
+        assert response.status_code == 200
+
+    def get_page(arguments: str) -> dict:
+        query = f"""
+        query {{
+          unitsConnection({arguments}) {{
+            edges {{ cursor node {{ address }} }}
+            pageInfo {{ hasNextPage hasPreviousPage startCursor endCursor }}
+          }}
+        }}
+        """
+        response = client.post("/graphql", json={"query": query})
+        data = response.json()
+        assert "errors" not in data
+        return data["data"]["unitsConnection"]
+
+    def page_addresses(page: dict) -> list:
+        return [edge["node"]["address"] for edge in page["edges"]]
+
+    # Page forwards
+    page = get_page("first: 2")
+    assert page_addresses(page) == addresses[:2]
+    assert page["pageInfo"]["hasNextPage"] is True
+    assert page["pageInfo"]["hasPreviousPage"] is False
+
+    page = get_page(f'first: 2, after: "{page["pageInfo"]["endCursor"]}"')
+    assert page_addresses(page) == addresses[2:4]
+    assert page["pageInfo"]["hasPreviousPage"] is True
+
+    page = get_page(f'first: 2, after: "{page["pageInfo"]["endCursor"]}"')
+    assert page_addresses(page) == addresses[4:]
+    assert page["pageInfo"]["hasNextPage"] is False
+
+    # Page backwards
+    page = get_page("last: 2")
+    assert page_addresses(page) == addresses[3:]
+    assert page["pageInfo"]["hasPreviousPage"] is True
+    assert page["pageInfo"]["hasNextPage"] is False
+
+    page = get_page(f'last: 2, before: "{page["pageInfo"]["startCursor"]}"')
+    assert page_addresses(page) == addresses[1:3]
+    assert page["pageInfo"]["hasNextPage"] is True
+
+
+def test_units_connection_invalid_cursor(client):
+    """Test that malformed cursors are rejected"""
+    query = """
+    query {
+      unitsConnection(first: 2, after: "not-a-cursor") {
+        edges { cursor }
+      }
+    }
+    """
+    response = client.post("/graphql", json={"query": query})
+    assert "errors" in response.json()
+
+
+def test_create_units_mutation(client):
+    """Test creating many units in one mutation"""
+    query = """
+    mutation {
+      createUnits(inputs: [
+        { address: "1 Bulk St", amenities: ["Pool"] },
+        { address: "2 Bulk St", builtIn: 2001 }
+      ]) {
+        id
+        address
+        builtIn
+      }
+    }
+    """
+    response = client.post("/graphql", json={"query": query})
+    data = response.json()
+    assert "errors" not in data
+    units = data["data"]["createUnits"]
+    assert [unit["address"] for unit in units] == ["1 Bulk St", "2 Bulk St"]
+    assert units[1]["builtIn"] == 2001
+
+    response = client.post("/graphql", json={"query": "query { units { address } }"})
+    addresses = [unit["address"] for unit in response.json()["data"]["units"]]
+    assert addresses == ["1 Bulk St", "2 Bulk St"]